@@ -1,17 +1,38 @@
 # agent_config.py
 import os
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langchain_mistralai import ChatMistralAI, MistralAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import PromptTemplate
 import traceback
+from embedding.embedding_cache import get_embeddings
+from embedding.vector_index import search_by_vector, search_by_vectors
+from embedding.store import load_store
+from embedding.snapshots import SNAPSHOT_POLL_S, current_snapshot, snapshot_dir
+from embedding.lexical import (
+    LEXICAL_ENABLED, HYBRID_CANDIDATES, lexical_search, any_terms_query, keyword_lookup, reciprocal_rank_fusion
+)
+from agent.query_cache import QueryEmbeddingCache
+from agent.answer_cache import SemanticAnswerCache
+from agent.memory import ConversationMemory
+from agent.context import pack_context, estimate_tokens
 
 load_dotenv()
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-small-latest ")
+MISTRAL_EMBED_MODEL = os.getenv("MISTRAL_EMBED_MODEL", "mistral-embed")
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "./faiss_index")
 TOP_K = int(os.getenv("TOP_K", 4))
+# Threads for FAISS / SQLite work of async chats (the API calls themselves are awaited)
+AGENT_SEARCH_THREADS = int(os.getenv("AGENT_SEARCH_THREADS", 8))
+# Batch chat: LLM calls in flight at once, and questions per request
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 8))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 256))
 
 if not MISTRAL_API_KEY:
     raise ValueError("MISTRAL_API_KEY is required")
@@ -23,17 +44,21 @@ def build_agent():
     # ---------------------------
     # Load FAISS vector store
     # ---------------------------
-    def load_vector_store():
-        if not os.path.exists(FAISS_INDEX_PATH):
-            raise FileNotFoundError(f"FAISS index not found at {FAISS_INDEX_PATH}")
+    def load_vector_store(snapshot):
+        index_dir = snapshot_dir(FAISS_INDEX_PATH, snapshot)
+        if not os.path.exists(index_dir):
+            raise FileNotFoundError(f"FAISS index not found at {index_dir}")
 
-        embeddings = MistralAIEmbeddings(api_key=MISTRAL_API_KEY, model="mistral-embed")
-        vector_store = FAISS.load_local(
-            FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True
+        embeddings = get_embeddings(MISTRAL_EMBED_MODEL)
+        # Memory-mapped, read-only: pages load on demand instead of at startup.
+        # The sidecar check fails fast if the index was built with another model.
+        vector_store = load_store(
+            index_dir, embeddings, read_only=True, embedding_model=MISTRAL_EMBED_MODEL
         )
         return vector_store
 
-    vector_store = load_vector_store()
+    snapshot = current_snapshot(FAISS_INDEX_PATH)
+    vector_store = load_vector_store(snapshot)
 
     # ---------------------------F
     # Initialize Mistral chat LLM
@@ -63,54 +88,381 @@ def build_agent():
 
     prompt = PromptTemplate(input_variables=["context", "question"], template=prompt_template)
 
+    class Response:
+        def __init__(self, text, cached=False, similarity=None, context=None):
+            self.text = text
+            self.debug = None
+            self.cached = cached  # served from the answer cache
+            self.similarity = similarity
+            self.context = context  # packing stats (prompt tokens before / after)
+
     # ---------------------------
     # Simple Agent with similarity search
     # ---------------------------
     class SimpleAgent:
-        def __init__(self, vector_store, llm, prompt, top_k=TOP_K):
+        def __init__(self, vector_store, llm, prompt, top_k=TOP_K, snapshot=None):
             self.vector_store = vector_store
+            self.snapshot = snapshot
+            self._reload_lock = threading.Lock()
             self.llm = llm
             self.prompt = prompt
             self.top_k = top_k
-            self.chat_history = []
+            # Repeated questions skip the embedding call
+            self.query_cache = QueryEmbeddingCache()
+            # Near-identical questions on the same snapshot reuse the earlier answer
+            self.answer_cache = SemanticAnswerCache()
+            # Per-user recent turns, bounded (see agent/memory.py)
+            self.memory = ConversationMemory()
+            self._search_executor = None
+
+        def reload_index(self):
+            """
+            Switch to the current index snapshot if a build published a new one.
+            The new store is loaded first and then swapped in with one assignment,
+            so requests in flight finish on the snapshot they started with.
+            """
+            with self._reload_lock:
+                snapshot = current_snapshot(FAISS_INDEX_PATH)
+                if snapshot == self.snapshot:
+                    return False
+                vector_store = load_vector_store(snapshot)
+                self.vector_store, self.snapshot = vector_store, snapshot
+                dropped = self.answer_cache.invalidate(snapshot)
+                print(f"🔄 Agent switched to index snapshot {snapshot} ({dropped} cached answers dropped)")
+                return True
+
+        def watch_index(self, interval=SNAPSHOT_POLL_S):
+            """Poll for new snapshots in a daemon thread"""
+            def loop():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.reload_index()
+                    except Exception as e:
+                        print(f"⚠️ Could not load new index snapshot: {e}")
+
+            threading.Thread(target=loop, name="index-watcher", daemon=True).start()
+
+        def retrieve(self, user_message, nprobe=None, ef_search=None, vector_store=None, query_vector=None):
+            """
+            Top-k documents for the message; nprobe / ef_search tune IVF / HNSW for this call.
+            With a lexical index, vector and BM25 rankings are fused (reciprocal rank fusion).
+            """
+            vector_store = vector_store or self.vector_store  # one snapshot for the whole search
+            if query_vector is None:
+                query_vector = self.query_cache.embed_query(vector_store.embeddings, user_message)
+            n_candidates = self.top_k * HYBRID_CANDIDATES
+            lexical = lexical_search(vector_store, any_terms_query(user_message), n_candidates) \
+                if LEXICAL_ENABLED else None
+            if not lexical:
+                hits = search_by_vector(vector_store, query_vector, self.top_k, nprobe=nprobe, ef_search=ef_search)
+                return [doc for doc, _ in hits]
+            hits = search_by_vector(vector_store, query_vector, n_candidates, nprobe=nprobe, ef_search=ef_search)
+            return reciprocal_rank_fusion([[doc for doc, _ in hits], [doc for doc, _ in lexical]], self.top_k)
+
+        def retrieve_batch(self, questions, query_vectors, vector_store, nprobe=None, ef_search=None):
+            """retrieve() for several questions with one multi-query vector search"""
+            n_candidates = self.top_k * HYBRID_CANDIDATES
+            lexical = [lexical_search(vector_store, any_terms_query(q), n_candidates) if LEXICAL_ENABLED else None
+                       for q in questions]
+            k = n_candidates if any(lexical) else self.top_k
+            all_hits = search_by_vectors(vector_store, query_vectors, k, nprobe=nprobe, ef_search=ef_search)
+            results = []
+            for hits, lex in zip(all_hits, lexical):
+                if not lex:
+                    results.append([doc for doc, _ in hits[:self.top_k]])
+                else:
+                    results.append(reciprocal_rank_fusion([[doc for doc, _ in hits], [doc for doc, _ in lex]],
+                                                          self.top_k))
+            return results
+
+        def prepare(self, user_message, nprobe=None, ef_search=None):
+            """
+            Everything before the LLM call, shared by run and stream: a dict with
+            "docs", "retrieval" ("lexical", "semantic" or "cache"), "cached"
+            ((answer, similarity) from the answer cache, or None), the
+            "scope" / "query_vector" to store the answer under, and (unless
+            cached) the packed "context" with its "context_stats".
+            """
+            # Snapshot before store: during a reload an answer can only be
+            # filed under the older snapshot, which the reload then drops
+            snapshot = self.snapshot
+            vector_store = self.vector_store
+            scope = (snapshot, nprobe, ef_search)
+
+            # ---------------------------
+            # Keyword lookups (course codes, rooms, emails) need no embedding
+            # ---------------------------
+            docs = keyword_lookup(vector_store, user_message, self.top_k)
+            if docs is not None:
+                return self.with_context(user_message, vector_store, {
+                    "docs": docs, "retrieval": "lexical", "cached": None, "scope": scope, "query_vector": None
+                })
+
+            query_vector = self.query_cache.embed_query(vector_store.embeddings, user_message)
+
+            # ---------------------------
+            # Answer cache
+            # ---------------------------
+            cached = self.answer_cache.lookup(scope, query_vector)
+            if cached is not None:
+                return {"docs": [], "retrieval": "cache", "cached": cached, "scope": scope, "query_vector": query_vector}
 
-        def run(self, user_message, user_id=None):
+            # ---------------------------
+            # Fetch top-k relevant documents
+            # ---------------------------
+            docs = self.retrieve(user_message, nprobe=nprobe, ef_search=ef_search,
+                                 vector_store=vector_store, query_vector=query_vector)
+            return self.with_context(user_message, vector_store, {
+                "docs": docs, "retrieval": "semantic", "cached": None, "scope": scope, "query_vector": query_vector
+            })
+
+        def with_context(self, user_message, vector_store, prepared):
+            """Add the packed "context" for the retrieved docs and its "context_stats" (prompt tokens before / after)"""
+            context, stats = pack_context(vector_store, prepared["docs"])
+            prompt_tokens = estimate_tokens(self.prompt.format(context="", question=user_message))
+            stats["prompt_tokens_before"] = prompt_tokens + stats["context_tokens_before"]
+            stats["prompt_tokens_after"] = prompt_tokens + stats["context_tokens_after"]
+            print(f"📦 Context: {stats['chunks']} chunks -> {stats['passages']} passages, "
+                  f"~{stats['prompt_tokens_before']} -> ~{stats['prompt_tokens_after']} prompt tokens")
+            prepared["context"], prepared["context_stats"] = context, stats
+            return prepared
+
+        def prompt_for(self, user_message, prepared):
+            return self.prompt.format(context=prepared["context"], question=user_message)
+
+        def retrieval_info(self, prepared):
+            """What a streaming client is told before the first token"""
+            return {
+                "retrieval": prepared["retrieval"],
+                "cached": prepared["cached"] is not None,
+                "snapshot": prepared["scope"][0],
+                "sources": list(dict.fromkeys(doc.metadata.get("source") for doc in prepared["docs"])),
+                "context": prepared.get("context_stats")
+            }
+
+        def remember(self, user_message, answer, prepared=None, user_id=None):
+            """Record the exchange in the user's memory (and the answer cache when it came from the LLM)"""
+            self.memory.append(user_id, user_message, answer)
+            if prepared and prepared["cached"] is None and prepared["query_vector"] is not None:
+                self.answer_cache.store(prepared["scope"], user_message, prepared["query_vector"], answer)
+
+        def remember_streamed(self, user_message, answer, prepared, user_id=None):
+            """remember() for a stream that finished; an empty answer is not put in the answer cache"""
+            self.remember(user_message, answer, prepared if answer.strip() else None, user_id=user_id)
+
+        def run(self, user_message, user_id=None, nprobe=None, ef_search=None):
             """Process user message via similarity search + LLM"""
             try:
-                # ---------------------------
-                # Fetch top-k relevant documents
-                # ---------------------------
-                docs = self.vector_store.similarity_search(user_message, k=self.top_k)
-                context = "\n\n".join([doc.page_content for doc in docs])
+                prepared = self.prepare(user_message, nprobe=nprobe, ef_search=ef_search)
+                if prepared["cached"] is not None:
+                    answer, similarity = prepared["cached"]
+                    self.remember(user_message, answer, user_id=user_id)
+                    return Response(answer, cached=True, similarity=similarity)
 
                 # ---------------------------
                 # Fill prompt and query LLM
                 # ---------------------------
-                prompt_text = self.prompt.format(context=context, question=user_message)
-                response = self.llm.invoke(prompt_text)
+                response = self.llm.invoke(self.prompt_for(user_message, prepared))
 
-                # ---------------------------
-                # Update chat history
-                # ---------------------------
-                self.chat_history.append({"role": "user", "content": user_message})
-                self.chat_history.append({"role": "assistant", "content": response.content})
-                if len(self.chat_history) > 20:
-                    self.chat_history = self.chat_history[-20:]
+                self.remember(user_message, response.content, prepared, user_id=user_id)
+                return Response(response.content, context=prepared["context_stats"])
 
-                class Response:
-                    def __init__(self, text):
-                        self.text = text
-                        self.debug = None
+            except Exception as e:
+                print(f"Error in agent run: {str(e)}")
+                traceback.print_exc()
+                return Response(f"Error: {str(e)}")
 
-                return Response(response.content)
+        def stream(self, user_message, user_id=None, nprobe=None, ef_search=None):
+            """
+            Like run, as a generator of (event, data) pairs: "retrieval" (sources,
+            retrieval path, cache flag) first, then one "token" per generated
+            chunk, then "done". Closing the generator (client gone) stops the
+            LLM stream, and with it the generation.
+            """
+            prepared = self.prepare(user_message, nprobe=nprobe, ef_search=ef_search)
+            yield "retrieval", self.retrieval_info(prepared)
 
+            if prepared["cached"] is not None:
+                answer, similarity = prepared["cached"]
+                self.remember(user_message, answer, user_id=user_id)
+                yield "token", {"text": answer}
+                yield "done", {"cached": True, "similarity": similarity}
+                return
+
+            parts = []
+            llm_stream = self.llm.stream(self.prompt_for(user_message, prepared))
+            try:
+                for chunk in llm_stream:
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield "token", {"text": chunk.content}
+            except GeneratorExit:
+                # Client gone: closing the LLM stream drops the HTTP connection to the API
+                llm_stream.close()
+                print(f"⏹️ Generation cancelled after {len(parts)} chunks")
+                raise
             except Exception as e:
-                print(f"Error in agent run: {str(e)}")
+                # Nothing is remembered or cached: the answer is incomplete
+                llm_stream.close()
+                print(f"Error in agent stream after {len(parts)} chunks: {e}")
+                raise
+
+            self.remember_streamed(user_message, "".join(parts), prepared, user_id)
+            yield "done", {"cached": False}
+
+        def run_batch(self, questions, user_id=None, nprobe=None, ef_search=None, concurrency=BATCH_LLM_CONCURRENCY):
+            """
+            Answer a list of questions; Responses come back in the same order.
+            Uncached questions are embedded in one API call and searched with one
+            multi-query index search, then the LLM is called for up to
+            `concurrency` questions at a time.
+            """
+            snapshot = self.snapshot
+            vector_store = self.vector_store
+            scope = (snapshot, nprobe, ef_search)
+            prepared = [None] * len(questions)
+
+            # Keyword lookups need no embedding
+            pending = []
+            for n, question in enumerate(questions):
+                docs = keyword_lookup(vector_store, question, self.top_k)
+                if docs is not None:
+                    prepared[n] = {"docs": docs, "retrieval": "lexical", "cached": None, "scope": scope,
+                                   "query_vector": None}
+                else:
+                    pending.append(n)
+
+            vectors = self.query_cache.embed_queries(vector_store.embeddings, [questions[n] for n in pending])
+            to_search = []
+            for n, vector in zip(pending, vectors):
+                cached = self.answer_cache.lookup(scope, vector)
+                prepared[n] = {"docs": [], "retrieval": "cache" if cached else "semantic", "cached": cached,
+                               "scope": scope, "query_vector": vector}
+                if cached is None:
+                    to_search.append(n)
+
+            all_docs = self.retrieve_batch([questions[n] for n in to_search],
+                                           [prepared[n]["query_vector"] for n in to_search],
+                                           vector_store, nprobe=nprobe, ef_search=ef_search)
+            for n, docs in zip(to_search, all_docs):
+                prepared[n]["docs"] = docs
+
+            responses = [None] * len(questions)
+            to_ask = []
+            for n, question in enumerate(questions):
+                if prepared[n]["cached"] is not None:
+                    answer, similarity = prepared[n]["cached"]
+                    self.remember(question, answer, user_id=user_id)
+                    responses[n] = Response(answer, cached=True, similarity=similarity)
+                else:
+                    self.with_context(question, vector_store, prepared[n])
+                    to_ask.append(n)
+
+            # ---------------------------
+            # LLM calls, `concurrency` at a time; a failed call fails its question only
+            # ---------------------------
+            prompts = [self.prompt_for(questions[n], prepared[n]) for n in to_ask]
+            answers = self.llm.batch(prompts, config={"max_concurrency": max(1, concurrency)},
+                                     return_exceptions=True) if prompts else []
+            for n, answer in zip(to_ask, answers):
+                if isinstance(answer, Exception):
+                    print(f"Error in agent run_batch: {str(answer)}")
+                    responses[n] = Response(f"Error: {str(answer)}")
+                    continue
+                self.remember(questions[n], answer.content, prepared[n], user_id=user_id)
+                responses[n] = Response(answer.content, context=prepared[n]["context_stats"])
+            return responses
+
+        # ---------------------------
+        # Async API (ASGI): API calls are awaited; searches, cache and memory I/O run on a small thread pool
+        # ---------------------------
+        async def _in_executor(self, fn, *args, **kwargs):
+            if self._search_executor is None:
+                self._search_executor = ThreadPoolExecutor(
+                    max_workers=AGENT_SEARCH_THREADS, thread_name_prefix="agent-search"
+                )
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._search_executor, partial(fn, *args, **kwargs))
+
+        async def aprepare(self, user_message, nprobe=None, ef_search=None):
+            """
+            prepare() with the embedding call awaited, and everything that can block
+            (FAISS / SQLite searches, the answer cache, the embedding cache's SQLite)
+            off the event loop
+            """
+            snapshot = self.snapshot
+            vector_store = self.vector_store
+            scope = (snapshot, nprobe, ef_search)
+
+            docs = await self._in_executor(keyword_lookup, vector_store, user_message, self.top_k)
+            if docs is not None:
+                return await self._in_executor(self.with_context, user_message, vector_store, {
+                    "docs": docs, "retrieval": "lexical", "cached": None, "scope": scope, "query_vector": None
+                })
+
+            query_vector = await self.query_cache.aembed_query(vector_store.embeddings, user_message)
+
+            cached = await self._in_executor(self.answer_cache.lookup, scope, query_vector)
+            if cached is not None:
+                return {"docs": [], "retrieval": "cache", "cached": cached, "scope": scope, "query_vector": query_vector}
+
+            docs = await self._in_executor(self.retrieve, user_message, nprobe=nprobe, ef_search=ef_search,
+                                           vector_store=vector_store, query_vector=query_vector)
+            return await self._in_executor(self.with_context, user_message, vector_store, {
+                "docs": docs, "retrieval": "semantic", "cached": None, "scope": scope, "query_vector": query_vector
+            })
+
+        async def arun(self, user_message, user_id=None, nprobe=None, ef_search=None):
+            """run() for asyncio: waiting on Mistral holds no thread"""
+            try:
+                prepared = await self.aprepare(user_message, nprobe=nprobe, ef_search=ef_search)
+                if prepared["cached"] is not None:
+                    answer, similarity = prepared["cached"]
+                    await self._in_executor(self.remember, user_message, answer, user_id=user_id)
+                    return Response(answer, cached=True, similarity=similarity)
+
+                response = await self.llm.ainvoke(self.prompt_for(user_message, prepared))
+                await self._in_executor(self.remember, user_message, response.content, prepared, user_id=user_id)
+                return Response(response.content, context=prepared["context_stats"])
+
+            except Exception as e:
+                print(f"Error in agent arun: {str(e)}")
                 traceback.print_exc()
-                class Response:
-                    def __init__(self, text):
-                        self.text = text
-                        self.debug = None
                 return Response(f"Error: {str(e)}")
 
-    return SimpleAgent(vector_store, llm, prompt)
+        async def astream(self, user_message, user_id=None, nprobe=None, ef_search=None):
+            """stream() as an async generator; closing it (or cancelling its task) stops the generation"""
+            prepared = await self.aprepare(user_message, nprobe=nprobe, ef_search=ef_search)
+            yield "retrieval", self.retrieval_info(prepared)
+
+            if prepared["cached"] is not None:
+                answer, similarity = prepared["cached"]
+                await self._in_executor(self.remember, user_message, answer, user_id=user_id)
+                yield "token", {"text": answer}
+                yield "done", {"cached": True, "similarity": similarity}
+                return
+
+            parts = []
+            llm_stream = self.llm.astream(self.prompt_for(user_message, prepared))
+            try:
+                async for chunk in llm_stream:
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield "token", {"text": chunk.content}
+            except (GeneratorExit, asyncio.CancelledError):
+                await llm_stream.aclose()
+                print(f"⏹️ Generation cancelled after {len(parts)} chunks")
+                raise
+            except Exception as e:
+                await llm_stream.aclose()
+                print(f"Error in agent astream after {len(parts)} chunks: {e}")
+                raise
+
+            await self._in_executor(self.remember_streamed, user_message, "".join(parts), prepared, user_id)
+            yield "done", {"cached": False}
+
+    agent = SimpleAgent(vector_store, llm, prompt, snapshot=snapshot)
+    if SNAPSHOT_POLL_S > 0:
+        agent.watch_index()
+    return agent
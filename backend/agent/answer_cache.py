@@ -0,0 +1,128 @@
+# answer_cache.py
+# Semantic answer cache: a question whose embedding is close enough (cosine
+# similarity >= ANSWER_CACHE_THRESHOLD) to one answered earlier gets the stored
+# answer without retrieval or an LLM call. Entries belong to the index snapshot
+# they were answered from; switching snapshots drops them. Bounded by entry
+# count and by memory, least recently used first.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000))
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", 64))
+
+# Rough per-entry bookkeeping on top of the vector and the strings
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe store of (scope, question vector) -> answer, where scope is the
+    index snapshot plus anything else that changes the answer (search params).
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 max_bytes=int(ANSWER_CACHE_MAX_MB * 1024 * 1024), enabled=ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled and max_entries > 0
+        self._entries = OrderedDict()  # id -> entry dict, oldest first
+        self._matrices = {}  # scope -> (ids, unit vectors), rebuilt after changes
+        self._next_id = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _matrix(self, scope):
+        cached = self._matrices.get(scope)
+        if cached is None:
+            ids = [i for i, e in self._entries.items() if e["scope"] == scope]
+            vectors = np.stack([self._entries[i]["vector"] for i in ids]) if ids else None
+            cached = self._matrices[scope] = (ids, vectors)
+        return cached
+
+    def lookup(self, scope, vector):
+        """(answer, similarity) of the closest cached question in scope above the threshold, or None."""
+        if not self.enabled:
+            return None
+        q = self._unit(vector)
+        with self._lock:
+            ids, vectors = self._matrix(scope)
+            if vectors is not None:
+                sims = vectors @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry_id = ids[best]
+                    self._entries.move_to_end(entry_id)
+                    entry = self._entries[entry_id]
+                    entry["hits"] += 1
+                    self.hits += 1
+                    return entry["answer"], float(sims[best])
+            self.misses += 1
+            return None
+
+    def store(self, scope, question, vector, answer):
+        if not self.enabled:
+            return
+        v = self._unit(vector)
+        size = v.nbytes + len(question.encode("utf-8")) + len(answer.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[self._next_id] = {
+                "scope": scope, "question": question, "vector": v, "answer": answer,
+                "size": size, "hits": 0, "created_at": time.time()
+            }
+            self._next_id += 1
+            self._bytes += size
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old["size"]
+                self._matrices.pop(old["scope"], None)
+                self.evictions += 1
+
+    def invalidate(self, snapshot=None):
+        """Drop entries not answered from snapshot (all entries when snapshot is None)."""
+        with self._lock:
+            stale = [i for i, e in self._entries.items() if snapshot is None or e["scope"][0] != snapshot]
+            for i in stale:
+                self._bytes -= self._entries.pop(i)["size"]
+            self._matrices.clear()
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "threshold": self.threshold,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,200 @@
+# context.py
+# Context packing for the agent's prompt. Retrieved chunks overlap (the
+# splitter repeats CHUNK_OVERLAP characters between neighbours) and often come
+# from the same stretch of a file, so joining them verbatim pays for the same
+# text several times. pack_context merges chunks of the same source that
+# overlap or nearly touch into one passage, drops text already in the
+# context, and fills CONTEXT_TOKEN_BUDGET best-ranked passage first.
+
+import os
+import re
+from dotenv import load_dotenv
+from embedding.shards import iter_stores
+
+load_dotenv()
+
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "True").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))  # tokens of context, 0 = no limit
+CONTEXT_MERGE_GAP = int(os.getenv("CONTEXT_MERGE_GAP", 100))  # chars between chunks still merged
+# No tokenizer is bundled for Mistral; ~4 characters per token for the estimate
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", 4))
+
+SEPARATOR = "\n\n"
+MIN_TEXT_OVERLAP = 20  # chars a chunk's end and the next chunk's start must share to be merged
+MIN_DUPLICATE_LINE = 60  # shorter lines (and table rows) are kept even when repeated
+MIN_PARTIAL_TOKENS = 50  # a passage cut to fit the budget keeps at least this much
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN + 0.999) if text else 0
+
+
+def _source(doc):
+    return doc.metadata.get("source")
+
+
+def _spans(vector_store, ids):
+    """{id: (docstore, doc_id, start, end)} for chunks stored as spans of a document."""
+    found = {}
+    for store in iter_stores(vector_store):
+        lookup = getattr(store.docstore, "spans", None)
+        if lookup is None:
+            continue
+        for id_, (doc_id, start, end) in lookup(ids).items():
+            found[id_] = (store.docstore, doc_id, start, end)
+    return found
+
+
+def _merge_spans(passages, gap):
+    """Merge span passages of the same document that overlap or are at most gap chars apart."""
+    groups = {}
+    for p in passages:
+        groups.setdefault((id(p["docstore"]), p["doc_id"]), []).append(p)
+    merged = []
+    for group in groups.values():
+        group.sort(key=lambda p: p["start"])
+        current = group[0]
+        for p in group[1:]:
+            if p["start"] <= current["end"] + gap:
+                current["end"] = max(current["end"], p["end"])
+                current["rank"] = min(current["rank"], p["rank"])
+                current["chunks"] += p["chunks"]
+            else:
+                merged.append(current)
+                current = p
+        merged.append(current)
+    for p in merged:
+        if p["chunks"] > 1:
+            document = p["docstore"].document(p["doc_id"])
+            if document is not None:
+                p["text"] = document[p["start"]:p["end"]]
+    return merged
+
+
+def _text_overlap(a, b):
+    """Length of the longest end of a that b starts with (at least MIN_TEXT_OVERLAP), else 0."""
+    if len(a) < MIN_TEXT_OVERLAP or len(b) < MIN_TEXT_OVERLAP:
+        return 0
+    head = b[:MIN_TEXT_OVERLAP]
+    pos = a.find(head, max(0, len(a) - len(b)))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(head, pos + 1)
+    return 0
+
+
+def _merge_texts(passages):
+    """Chain passages of the same source whose text overlaps end-to-start (chunks without spans)."""
+    merged = True
+    while merged:
+        merged = False
+        for a in passages:
+            for b in passages:
+                if a is b or a["source"] != b["source"]:
+                    continue
+                n = _text_overlap(a["text"], b["text"])
+                if n:
+                    a["text"] += b["text"][n:]
+                    a["rank"] = min(a["rank"], b["rank"])
+                    a["chunks"] += b["chunks"]
+                    passages.remove(b)
+                    merged = True
+                    break
+            if merged:
+                break
+    return passages
+
+
+def _normalized(text):
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+def _drop_redundant(passages):
+    """
+    Drop passages contained in a better-ranked one, and repeated long lines
+    (page headers, footers, boilerplate). Returns (passages, chars dropped).
+    """
+    kept, seen_lines, dropped = [], set(), 0
+    for p in passages:
+        norm = _normalized(p["text"])
+        if any(norm in k["norm"] for k in kept):
+            dropped += len(p["text"])
+            continue
+        lines = []
+        for line in p["text"].split("\n"):
+            key = _normalized(line)
+            if len(key) >= MIN_DUPLICATE_LINE and not key.startswith("|"):
+                if key in seen_lines:
+                    dropped += len(line) + 1
+                    continue
+                seen_lines.add(key)
+            lines.append(line)
+        p["text"] = "\n".join(lines).strip()
+        p["norm"] = norm
+        if p["text"]:
+            kept.append(p)
+    return kept, dropped
+
+
+def _cut(text, max_chars):
+    """text shortened to max_chars, at a line or sentence end when there is one in the second half."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    for sep in ("\n", ". "):
+        pos = cut.rfind(sep)
+        if pos >= max_chars // 2:
+            return cut[:pos + 1].rstrip()
+    return cut.rstrip()
+
+
+def pack_context(vector_store, docs, budget=CONTEXT_TOKEN_BUDGET, gap=CONTEXT_MERGE_GAP, enabled=CONTEXT_PACKING):
+    """
+    The context string for docs (best first) and a stats dict: chunk and
+    passage counts, characters dropped, and context tokens before / after.
+    """
+    verbatim = SEPARATOR.join(doc.page_content for doc in docs)
+    stats = {"chunks": len(docs), "passages": len(docs), "dropped_chars": 0, "truncated": False,
+             "context_tokens_before": estimate_tokens(verbatim), "budget": budget}
+    if not enabled or not docs:
+        stats["context_tokens_after"] = stats["context_tokens_before"]
+        return verbatim, stats
+
+    spans = _spans(vector_store, [doc.id for doc in docs if doc.id])
+    span_passages, text_passages = [], []
+    for rank, doc in enumerate(docs):
+        p = {"text": doc.page_content, "rank": rank, "source": _source(doc), "chunks": 1}
+        if doc.id in spans:
+            p["docstore"], p["doc_id"], p["start"], p["end"] = spans[doc.id]
+            span_passages.append(p)
+        else:
+            text_passages.append(p)
+    passages = _merge_spans(span_passages, gap) + _merge_texts(text_passages)
+    passages.sort(key=lambda p: p["rank"])
+    passages, dropped = _drop_redundant(passages)
+
+    # Best-ranked passages first; the first that does not fit is cut to the rest of the budget
+    packed, used = [], 0
+    max_chars = budget * CHARS_PER_TOKEN if budget > 0 else None
+    for p in passages:
+        text = p["text"]
+        needed = len(text) + (len(SEPARATOR) if packed else 0)
+        if max_chars is not None and used + needed > max_chars:
+            room = max_chars - used - (len(SEPARATOR) if packed else 0)
+            if room >= MIN_PARTIAL_TOKENS * CHARS_PER_TOKEN:
+                packed.append(_cut(text, int(room)))
+            stats["truncated"] = True
+            break
+        packed.append(text)
+        used += needed
+
+    context = SEPARATOR.join(packed)
+    stats.update({
+        "passages": len(packed),
+        "dropped_chars": dropped,
+        "context_tokens_after": estimate_tokens(context)
+    })
+    return context, stats
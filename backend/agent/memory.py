@@ -0,0 +1,266 @@
+# memory.py
+# Per-user conversation memory for the agent. Each user's turns live in a
+# fixed-size ring buffer; sessions idle longer than MEMORY_TTL_S, past
+# MEMORY_MAX_SESSIONS or past MEMORY_MAX_MB are evicted least recently used
+# first, so memory stays flat however many users the service sees. With
+# MEMORY_SPILL_PATH set, evicted sessions are written to SQLite and loaded
+# back when their user returns; spilled sessions older than
+# MEMORY_SPILL_TTL_S or past MEMORY_SPILL_MAX_SESSIONS are purged, oldest
+# first, at most every MEMORY_SPILL_PURGE_S.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", 10))  # user + assistant message pairs per user
+MEMORY_TTL_S = float(os.getenv("MEMORY_TTL_S", 3600))  # 0 = sessions never go idle
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", 10000))
+MEMORY_MAX_MB = float(os.getenv("MEMORY_MAX_MB", 32))
+MEMORY_SPILL_PATH = os.getenv("MEMORY_SPILL_PATH", "")  # empty = evicted sessions are dropped
+MEMORY_SPILL_TTL_S = float(os.getenv("MEMORY_SPILL_TTL_S", 7 * 24 * 3600))
+MEMORY_SPILL_MAX_SESSIONS = int(os.getenv("MEMORY_SPILL_MAX_SESSIONS", 100000))  # 0 = no cap
+MEMORY_SPILL_PURGE_S = float(os.getenv("MEMORY_SPILL_PURGE_S", 60))  # min seconds between spill purges
+
+# Requests without a user_id share one session, as the old single history did
+ANONYMOUS_USER = "anonymous"
+# Rough per-message / per-session bookkeeping on top of the strings
+MESSAGE_OVERHEAD_BYTES = 120
+SESSION_OVERHEAD_BYTES = 600
+
+
+def _message_size(message):
+    return len(message["content"].encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+class _Session:
+    __slots__ = ("messages", "size", "last_used")
+
+    def __init__(self, max_messages, messages=()):
+        self.messages = deque(maxlen=max_messages)
+        self.size = SESSION_OVERHEAD_BYTES
+        self.last_used = time.monotonic()
+        for message in messages:
+            self.append(message)
+
+    def append(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            self.size -= _message_size(self.messages[0])
+        self.messages.append(message)
+        self.size += _message_size(message)
+
+
+class ConversationMemory:
+    """Thread-safe user_id -> last turns, bounded by turns per user, idle time, sessions and bytes."""
+
+    def __init__(self, max_turns=MEMORY_MAX_TURNS, ttl_s=MEMORY_TTL_S, max_sessions=MEMORY_MAX_SESSIONS,
+                 max_bytes=int(MEMORY_MAX_MB * 1024 * 1024), spill_path=MEMORY_SPILL_PATH,
+                 spill_ttl_s=MEMORY_SPILL_TTL_S, spill_max_sessions=MEMORY_SPILL_MAX_SESSIONS,
+                 spill_purge_s=MEMORY_SPILL_PURGE_S):
+        self.max_messages = max(2 * max_turns, 2)
+        self.ttl_s = ttl_s
+        self.max_sessions = max(max_sessions, 1)
+        self.max_bytes = max_bytes
+        self.spill_ttl_s = spill_ttl_s
+        self.spill_max_sessions = spill_max_sessions
+        self.spill_purge_s = spill_purge_s
+        self._last_purge = 0.0
+        self._sessions = OrderedDict()  # user_id -> _Session, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.spilled = 0
+        self.restored = 0
+        self.spill_purged = 0
+        self._conn = None
+        if spill_path:
+            self._conn = sqlite3.connect(spill_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "user_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            self._conn.commit()
+            self._purge_spill()
+
+    # ---------------------------
+    # Spill (called with the lock held)
+    # ---------------------------
+    def _spill(self, user_id, session):
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (user_id, messages, updated_at) VALUES (?, ?, ?)",
+            (user_id, json.dumps(list(session.messages), ensure_ascii=False), time.time())
+        )
+        self._conn.commit()
+        self.spilled += 1
+        self._maybe_purge_spill()
+
+    def _restore(self, user_id):
+        if self._conn is None:
+            return None
+        self._maybe_purge_spill()
+        row = self._conn.execute(
+            "SELECT messages, updated_at FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        self._conn.commit()
+        if self.spill_ttl_s > 0 and time.time() - row[1] > self.spill_ttl_s:
+            return None
+        self.restored += 1
+        return _Session(self.max_messages, json.loads(row[0]))
+
+    def _purge_spill(self):
+        """Delete spilled sessions past spill_ttl_s, then the oldest past spill_max_sessions."""
+        if self._conn is None:
+            return
+        purged = 0
+        if self.spill_ttl_s > 0:
+            purged += self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.spill_ttl_s,)
+            ).rowcount
+        if self.spill_max_sessions > 0:
+            purged += self._conn.execute(
+                "DELETE FROM sessions WHERE user_id IN ("
+                "SELECT user_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.spill_max_sessions,)
+            ).rowcount
+        self._conn.commit()
+        self.spill_purged += purged
+        self._last_purge = time.monotonic()
+
+    def _maybe_purge_spill(self):
+        if time.monotonic() - self._last_purge >= self.spill_purge_s:
+            self._purge_spill()
+
+    # ---------------------------
+    # Eviction (called with the lock held)
+    # ---------------------------
+    def _evict(self, user_id):
+        session = self._sessions.pop(user_id)
+        self._bytes -= session.size
+        self._spill(user_id, session)
+        return session
+
+    def _expire(self):
+        if self.ttl_s <= 0:
+            return
+        cutoff = time.monotonic() - self.ttl_s
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            self._evict(user_id)
+            self.expirations += 1
+
+    def _enforce_limits(self, keep=None):
+        while len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+            user_id = next(iter(self._sessions))
+            if user_id == keep:
+                break
+            self._evict(user_id)
+            self.evictions += 1
+
+    def _session(self, user_id, create):
+        session = self._sessions.get(user_id)
+        if session is not None and self.ttl_s > 0 and time.monotonic() - session.last_used > self.ttl_s:
+            self._evict(user_id)
+            self.expirations += 1
+            session = None
+        if session is None:
+            session = self._restore(user_id)
+            if session is None and not create:
+                return None
+            session = session or _Session(self.max_messages)
+            self._sessions[user_id] = session
+            self._bytes += session.size
+        self._sessions.move_to_end(user_id)
+        session.last_used = time.monotonic()
+        return session
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def append(self, user_id, user_message, answer):
+        """Record one exchange for user_id (None = the shared anonymous session)."""
+        user_id = str(user_id) if user_id is not None else ANONYMOUS_USER
+        with self._lock:
+            self._expire()
+            session = self._session(user_id, create=True)
+            before = session.size
+            session.append({"role": "user", "content": user_message})
+            session.append({"role": "assistant", "content": answer})
+            self._bytes += session.size - before
+            self._enforce_limits(keep=user_id)
+
+    def history(self, user_id):
+        """The user's recent messages, oldest first ({"role", "content"} dicts)."""
+        user_id = str(user_id) if user_id is not None else ANONYMOUS_USER
+        with self._lock:
+            self._expire()
+            session = self._session(user_id, create=False)
+            if session is None:
+                return []
+            self._enforce_limits(keep=user_id)
+            return list(session.messages)
+
+    def clear(self, user_id=None):
+        """Forget one user (also on disk), or every session when user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._sessions.clear()
+                self._bytes = 0
+                if self._conn is not None:
+                    self._conn.execute("DELETE FROM sessions")
+                    self._conn.commit()
+                return
+            user_id = str(user_id)
+            session = self._sessions.pop(user_id, None)
+            if session is not None:
+                self._bytes -= session.size
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+                self._conn.commit()
+
+    def close(self):
+        """Spill every live session (when spilling is on) and drop old spilled ones."""
+        with self._lock:
+            if self._conn is None:
+                return
+            for user_id in list(self._sessions):
+                self._evict(user_id)
+            self._purge_spill()
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            stats = {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "max_turns": self.max_messages // 2,
+                "ttl_s": self.ttl_s,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "spill": self._conn is not None
+            }
+            if self._conn is not None:
+                self._purge_spill()
+                stats["spilled"] = self.spilled
+                stats["restored"] = self.restored
+                stats["spill_purged"] = self.spill_purged
+                stats["spill_max_sessions"] = self.spill_max_sessions
+                stats["spilled_sessions"] = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return stats
@@ -0,0 +1,113 @@
+# query_cache.py
+# In-process LRU + TTL cache of question -> query vector for the agent's
+# retrieval path. Questions are normalized (Unicode form, case, whitespace,
+# trailing punctuation) so "Exam dates?" and "exam dates" share one entry; a
+# hit skips the embedding call, including the persistent cache lookup behind it.
+
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))  # 0 disables
+QUERY_CACHE_TTL_S = float(os.getenv("QUERY_CACHE_TTL_S", 3600))
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACE_RE.sub(" ", text).strip().rstrip("?!.;: ")
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of normalized question -> vector; entries expire after ttl_s seconds."""
+
+    def __init__(self, capacity=QUERY_CACHE_SIZE, ttl_s=QUERY_CACHE_TTL_S):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, question):
+        """Cached vector for the question, or None."""
+        if self.capacity <= 0:
+            return None
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_s > 0 and time.monotonic() - entry[1] > self.ttl_s:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question, vector):
+        if self.capacity <= 0:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def embed_query(self, embeddings, question):
+        """The question's vector from the cache, or from embeddings (then cached)."""
+        vector = self.get(question)
+        if vector is None:
+            vector = embeddings.embed_query(question)
+            self.put(question, vector)
+        return vector
+
+    async def aembed_query(self, embeddings, question):
+        """embed_query for async callers: awaits embeddings.aembed_query on a miss."""
+        vector = self.get(question)
+        if vector is None:
+            vector = await embeddings.aembed_query(question)
+            self.put(question, vector)
+        return vector
+
+    def embed_queries(self, embeddings, questions):
+        """Vectors for several questions; the uncached ones are embedded in one batched call."""
+        vectors = [self.get(q) for q in questions]
+        missing = list(dict.fromkeys(q for q, v in zip(questions, vectors) if v is None))
+        if missing:
+            computed = dict(zip(missing, embeddings.embed_documents(missing)))
+            for q, vector in computed.items():
+                self.put(q, vector)
+            vectors = [v if v is not None else computed[q] for q, v in zip(questions, vectors)]
+        return vectors
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "ttl_s": self.ttl_s
+            }
@@ -1,8 +1,15 @@
-from flask import Flask, request, jsonify ,send_from_directory
+from flask import Flask, Response, request, jsonify ,send_from_directory
 from flask_cors import CORS
-from agent.agent_config import build_agent
-from embedding.build_index import build_index
+from agent.agent_config import build_agent, BATCH_MAX_QUESTIONS, BATCH_LLM_CONCURRENCY
+from embedding.build_index import build_index, remove_files, compact_index
+from embedding.build_jobs import BuildQueue
+from embedding.extraction_cache import prefetch_extraction, extraction_cache_stats
+from embedding.embedding_cache import embedding_cache_stats
+from embedding.scheduler import is_rate_limit_error
+from embedding.store import IndexMismatchError
+from request_params import optional_bool, optional_positive_int, search_overrides
 import os
+import json
 from werkzeug.utils import secure_filename
 from files_manager.files_utils import *
 from insert_db import process_file_and_insert, process_multiple_files, process_folder
@@ -31,62 +38,193 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Cache counters and other runtime stats"""
+    return jsonify({
+        "embedding_cache": embedding_cache_stats(),
+        "query_embedding_cache": agent.query_cache.stats(),
+        "answer_cache": agent.answer_cache.stats(),
+        "conversation_memory": agent.memory.stats(),
+        "extraction_cache": extraction_cache_stats()
+    }), 200
+
+
 @app.route("/api/chat", methods=["POST"])
 def chat():
     """Chat endpoint - process user messages"""
-    data = request.json
+    data = request.json or {}
     user_msg = data.get("message", "")
     user_id = data.get("user_id")  # for per-user memory if you want
-    
+    # nprobe / ef_search optionally tune approximate (IVF / HNSW) indexes per request
+    nprobe, ef_search, error = search_overrides(data)
+    if error:
+        return jsonify({"error": error}), 400
+
     # ask the agent to handle the message and return answer
-    response = agent.run(user_message=user_msg, user_id=user_id)
+    response = agent.run(
+        user_message=user_msg,
+        user_id=user_id,
+        nprobe=nprobe,
+        ef_search=ef_search
+    )
     return jsonify({
         "reply": response.text, 
-        "thoughts": response.debug if hasattr(response, "debug") else None
+        "thoughts": response.debug if hasattr(response, "debug") else None,
+        "cached": response.cached,
+        "context": response.context
+    }), 200
+
+@app.route("/api/chat/batch", methods=["POST"])
+def chat_batch():
+    """Answer a list of questions in one call (FAQ generation, evaluations); replies keep the input order"""
+    data = request.json or {}
+    questions = data.get("questions")
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) for q in questions):
+        return jsonify({"error": "questions must be a non-empty list of strings"}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_QUESTIONS} questions per batch"}), 400
+    concurrency, error = optional_positive_int(data, "concurrency", maximum=BATCH_LLM_CONCURRENCY)
+    nprobe, ef_search, search_error = search_overrides(data)
+    error = error or search_error
+    if error:
+        return jsonify({"error": error}), 400
+
+    responses = agent.run_batch(
+        questions,
+        user_id=data.get("user_id"),
+        nprobe=nprobe,
+        ef_search=ef_search,
+        concurrency=concurrency or BATCH_LLM_CONCURRENCY
+    )
+    return jsonify({
+        "answers": [
+            {"question": q, "reply": r.text, "cached": r.cached, "context": r.context}
+            for q, r in zip(questions, responses)
+        ]
     }), 200
 
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """Chat as server-sent events: a "retrieval" event, then "token" events as the answer is generated, then "done" """
+    data = request.json or {}
+    user_msg = data.get("message", "")
+    user_id = data.get("user_id")
+    nprobe, ef_search, error = search_overrides(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    def events():
+        stream = agent.stream(
+            user_message=user_msg,
+            user_id=user_id,
+            nprobe=nprobe,
+            ef_search=ef_search
+        )
+        try:
+            for event, payload in stream:
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            # Runs when the client disconnects too: stops the generation
+            stream.close()
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def run_build_job(params, progress):
+    """
+    Index job body: a build, or with action "remove" the removal of files'
+    vectors, then switch the agent to the new snapshot
+    """
+    if params.get("action") == "remove":
+        progress(stage="removing", files_total=len(params["filenames"]))
+        result = remove_files(params["filenames"])
+    else:
+        print(f"Building index from: {params['folder_path']}")
+        result = build_index(progress=progress, **params)
+    # The watcher would pick the new snapshot up too; switch now so the
+    # caller's next chat already sees it
+    if result.get("snapshot"):
+        agent.reload_index()
+    return result
+
+
+def classify_build_error(e):
+    if isinstance(e, IndexMismatchError):
+        # Existing index was embedded with another model; refuse to mix vectors
+        return "index_mismatch"
+    if is_rate_limit_error(e):
+        # Still throttled after the embedding scheduler's retries
+        return "rate_limited"
+    return "error"
+
+
+build_jobs = BuildQueue(run_build_job, classify_error=classify_build_error)
+
+
 @app.route("/api/build-index", methods=["POST"])
 def build_index_endpoint():
-    """Build FAISS index from uploaded documents"""
+    """Queue an index build from uploaded documents; poll the returned job for progress"""
+    data = request.json or {}
+    folder_path = data.get("folder_path", UPLOAD_FOLDER)
+    # Files indexed earlier but missing from folder_path are dropped from the
+    # index unless the caller only uploads new files (e.g. a temp folder); a
+    # string "false" would be truthy, so only a JSON boolean is accepted
+    prune_removed, error = optional_bool(data, "prune_removed", True)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if not os.path.isdir(folder_path):
+        return jsonify({"error": f"Folder not found: {folder_path}"}), 404
+
+    # Builds run one at a time; a request for a folder that already has a build
+    # waiting joins that build
+    job = build_jobs.submit(folder_path=folder_path, prune_removed=prune_removed)
+    return jsonify({
+        "job_id": job["job_id"],
+        "state": job["state"],
+        "coalesced": job["requests"] > 1,
+        "status_url": f"/api/build-index/{job['job_id']}"
+    }), 202
+
+
+@app.route("/api/build-index/<string:job_id>", methods=["GET"])
+def build_index_status(job_id):
+    """Stage, files done and chunks embedded of a build job, and its result once finished"""
+    job = build_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/api/build-index/jobs", methods=["GET"])
+def build_index_jobs():
+    """Recent build jobs, newest first"""
+    return jsonify(build_jobs.list()), 200
+
+
+@app.route("/api/index/compact", methods=["POST"])
+def compact_index_endpoint():
+    """Rewrite the index without orphaned / duplicate entries; reports vectors and bytes reclaimed"""
+    data = request.json or {}
+    # bool("false") is True: a string would turn a dry run into a real one
+    dry_run, error = optional_bool(data, "dry_run", False)
+    delete_backups, backups_error = optional_bool(data, "delete_backups", False)
+    if error or backups_error:
+        return jsonify({"error": error or backups_error}), 400
     try:
-        data = request.json or {}
-        folder_path = data.get("folder_path", UPLOAD_FOLDER)
-        
-        print(f"Building index from: {folder_path}")
-        
-        # Call build_index function from build_index.py
-        # This is a long-running operation, so we set a longer timeout
-        result = build_index(folder_path=folder_path)
-        
-        if result["success"]:
-            return jsonify({
-                "message": "Index built successfully",
-                "chunks_created": result["chunks_created"],
-                "documents_processed": result["documents_processed"]
-            }), 200
-        else:
-            error_msg = result.get("error", "Failed to build index")
-            # Check if it's a quota error
-            status_code = 429 if "quota" in error_msg.lower() or "429" in error_msg else 400
-            return jsonify({
-                "error": error_msg
-            }), status_code
-    
-    except Exception as e:
-        error_str = str(e)
-        print(f"Error in build_index_endpoint: {error_str}")
-        import traceback
-        traceback.print_exc()
-        
-        # Check if it's a quota error
-        if "quota" in error_str.lower() or "429" in error_str:
-            return jsonify({
-                "error": error_str
-            }), 429
-        else:
-            return jsonify({
-                "error": error_str
-            }), 500
+        result = compact_index(dry_run=dry_run, delete_backups=delete_backups)
+    except IndexMismatchError as e:
+        return jsonify({"error": str(e)}), 409
+    if not result.get("success"):
+        return jsonify(result), 404 if result.get("message") == "Index not found" else 500
+    if result.get("snapshot"):
+        agent.reload_index()
+    return jsonify(result), 200
 
 
 # FEEDING FILES MANAGEMENT END POINTS #####################
@@ -98,6 +236,7 @@ def upload_files():
 
     files = request.files.getlist("files")
     response = []
+    saved = []
 
     for file in files:
         filename = secure_filename(file.filename)
@@ -112,12 +251,17 @@ def upload_files():
 
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         file.save(file_path)
+        saved.append(file_path)
 
         response.append({
             "name": filename,
             "status": "uploaded"
         })
 
+    # Convert to Markdown now, in the background, so index builds and SQL
+    # inserts of these files find the text already extracted
+    prefetch_extraction(saved)
+
     return jsonify(response), 201
 
 # ---------- GET: List Files ----------
@@ -133,6 +277,19 @@ def list_files():
     return jsonify(files), 200
 
 # ---------- DELETE: Remove File ----------
+def remove_from_index(filenames):
+    """
+    Queue the removal of the files' vectors. It runs on the build worker, after
+    any build already queued, so the request does not wait for the index lock.
+    """
+    job = build_jobs.submit(action="remove", filenames=sorted(filenames))
+    return {
+        "job_id": job["job_id"],
+        "state": job["state"],
+        "status_url": f"/api/build-index/{job['job_id']}"
+    }
+
+
 @app.route("/api/files/<string:filename>", methods=["DELETE"])
 def delete_file(filename):
     filename = secure_filename(filename)
@@ -142,7 +299,37 @@ def delete_file(filename):
         return jsonify({"error": "File not found"}), 404
 
     os.remove(file_path)
-    return jsonify({"message": f"{filename} deleted successfully"}), 200
+    # Poll the job for chunks_removed
+    return jsonify({
+        "message": f"{filename} deleted; removal from the index queued",
+        "index_job": remove_from_index([filename])
+    }), 202
+
+# ---------- POST: Bulk Remove Files ----------
+@app.route("/api/files/delete", methods=["POST"])
+def delete_files():
+    """Delete several files; their vectors are removed in one queued index update"""
+    data = request.json or {}
+    filenames = data.get("filenames", [])
+    if not filenames or not isinstance(filenames, list) or not all(isinstance(n, str) for n in filenames):
+        return jsonify({"error": "filenames must be a non-empty list"}), 400
+
+    filenames = [secure_filename(name) for name in filenames]
+    deleted, missing = [], []
+    for filename in filenames:
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            deleted.append(filename)
+        else:
+            missing.append(filename)
+
+    # Files no longer on disk may still be indexed (e.g. built from another folder)
+    return jsonify({
+        "deleted": deleted,
+        "missing": missing,
+        "index_job": remove_from_index(filenames)
+    }), 202
 
 # DOWLOAD FILE END POINT
 @app.route("/api/files/<string:filename>/download", methods=["GET"])
@@ -0,0 +1,83 @@
+# asgi.py
+# ASGI entry point: the chat endpoints run on the agent's async API, so a chat
+# waiting on Mistral holds no thread; every other route is the Flask app
+# (app.py), mounted as WSGI. Both share one agent.
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+import os
+import json
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from app import app as flask_app, agent
+from request_params import search_overrides
+
+# Threads for the mounted Flask routes (uploads, builds, SQL ingest)
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", 10))
+
+cors = [Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+
+
+async def chat(request):
+    """Async /api/chat: same request and response as the Flask endpoint"""
+    data = await request.json() or {}
+    nprobe, ef_search, error = search_overrides(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    response = await agent.arun(
+        user_message=data.get("message", ""),
+        user_id=data.get("user_id"),
+        nprobe=nprobe,
+        ef_search=ef_search
+    )
+    return JSONResponse({
+        "reply": response.text,
+        "thoughts": getattr(response, "debug", None),
+        "cached": response.cached,
+        "context": response.context
+    })
+
+
+async def chat_stream(request):
+    """Async /api/chat/stream: server-sent "retrieval", "token" and "done" events"""
+    data = await request.json() or {}
+    nprobe, ef_search, error = search_overrides(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    async def events():
+        stream = agent.astream(
+            user_message=data.get("message", ""),
+            user_id=data.get("user_id"),
+            nprobe=nprobe,
+            ef_search=ef_search
+        )
+        try:
+            async for event, payload in stream:
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            # Starlette cancels this generator when the client disconnects
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+app = Starlette(routes=[
+    Route("/api/chat", chat, methods=["POST"], middleware=cors),
+    Route("/api/chat/stream", chat_stream, methods=["POST"], middleware=cors),
+    Mount("/", app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=5000)
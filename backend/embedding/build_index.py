@@ -1,19 +1,35 @@
 # Updated build_index.py fully compatible with Mistral AI
 
 import os
-import time
+import threading
 from uuid import uuid4
-import faiss
 from pathlib import Path
 from dotenv import load_dotenv
-from markitdown import MarkItDown
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_mistralai import MistralAIEmbeddings
-from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 import traceback
 import shutil
+from embedding.embedding_cache import get_embeddings, embedding_cache_stats, embedding_dimension
+from embedding.extraction_cache import iter_extracted_cached, extract_cached, extraction_cache_stats
+from embedding.pipeline import run_ingest
+from embedding.scheduler import EmbeddingScheduler
+from embedding.vector_index import (
+    FAISS_INDEX_TYPE, FAISS_VECTOR_CODEC, create_faiss_index, exact_vectors,
+    ensure_index_type, add_vectors, delete_vectors, store_summary
+)
+from embedding.docstore import SQLiteDocstore
+from embedding.chunking import SpanSplitter
+from embedding.store import store_exists, load_store, save_store, read_index_meta, check_index_meta
+from embedding.shards import FAISS_SHARDS, ShardedVectorStore, iter_stores
+from embedding.snapshots import (
+    current_index_dir, new_snapshot_dir, publish_snapshot, gc_snapshots, quarantine_current, restore_previous
+)
+from embedding.manifest import (
+    file_hash, load_manifest, save_manifest, empty_manifest,
+    diff_manifest, record_file, forget_file, referenced_chunk_ids
+)
+from embedding.dedup import DEDUP_ENABLED, deduper_for_store, update_sources
+from embedding.maintenance import compact_store, verify_store, dir_size, find_backups, remove_backups
 
 load_dotenv()
 
@@ -29,34 +45,45 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "./faiss_index")
 DOCS_FOLDER = os.getenv("DOCS_FOLDER", "../docs")
 
+# Builds and file removals each publish a snapshot from the current one: one at a time
+_index_write_lock = threading.RLock()
+
 
 def extract_text_from_document(file_path):
-    md = MarkItDown(enable_plugins=True)
-    result = md.convert(file_path)
-    return result.text_content
+    return extract_cached(file_path)
+
+
+# One splitter for every document; it only returns offsets into the text
+splitter = SpanSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    separators=["\n\n", "\n", ". ", " ", ""]
+)
+
+
+def chunk_metadata(source):
+    return {"source": source, "candidate": os.path.splitext(source)[0]}
+
+
+def split_text_into_spans(text, source):
+    """(start, end, metadata) of each chunk of text; the chunks share one metadata dict."""
+    metadata = chunk_metadata(source)
+    return [(start, end, metadata) for start, end in splitter.split_spans(text)]
 
 
 def split_text_into_chunks(text, source):
-    candidate_name = os.path.splitext(source)[0]
-    document = Document(
-        page_content=text,
-        metadata={"source": source, "candidate": candidate_name}
-    )
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    return splitter.split_documents([document])
+    return [
+        Document(page_content=text[start:end], metadata=chunk_metadata(source))
+        for start, end in splitter.split_spans(text)
+    ]
 
 
 def init_embeddings():
     try:
         print(f"🔤 Initializing Mistral embeddings: {MISTRAL_EMBED_MODEL}")
-        embeddings = MistralAIEmbeddings(api_key=MISTRAL_API_KEY, model=MISTRAL_EMBED_MODEL)
-        test_vec = embeddings.embed_query("test")
-        print(f"✓ Mistral embedding dimension: {len(test_vec)}")
+        # The build's embedding calls go through EmbeddingScheduler, which does the retrying
+        embeddings = get_embeddings(MISTRAL_EMBED_MODEL, client_retries=False)
+        print(f"✓ Mistral embedding dimension: {embedding_dimension(MISTRAL_EMBED_MODEL) or 'unknown'}")
         return embeddings
     except Exception as e:
         print(f"✗ Error initializing embeddings: {e}")
@@ -64,16 +91,38 @@ def init_embeddings():
         raise
 
 
-def create_new_faiss_index(embeddings):
+def index_meta():
+    """Build settings recorded in the index sidecar."""
+    return {
+        "embedding_model": MISTRAL_EMBED_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP
+    }
+
+
+def create_new_faiss_index(embeddings, n_shards=1):
+    if n_shards > 1:
+        shards = [create_new_faiss_index(embeddings) for _ in range(n_shards)]
+        for shard in shards:
+            shard.dirty = True
+        return ShardedVectorStore(shards, embeddings)
+
     print("🏗️ Creating new FAISS index...")
-    dim = len(embeddings.embed_query("test"))
-    index = faiss.IndexFlatL2(dim)
-    return FAISS(
+    dim = embedding_dimension(MISTRAL_EMBED_MODEL)
+    if dim is None:
+        # Unknown model and no EMBEDDING_DIM: probe once (the sidecar records it afterwards)
+        dim = len(embeddings.embed_query("test"))
+    # IVF / PQ start as an exact flat index and are trained once enough vectors exist
+    index = create_faiss_index(dim, FAISS_INDEX_TYPE, FAISS_VECTOR_CODEC)
+    vector_store = FAISS(
         embedding_function=embeddings,
         index=index,
-        docstore=InMemoryDocstore(),
+        # Chunk text goes to a scratch SQLite file, not RAM, while building
+        docstore=SQLiteDocstore.scratch(),
         index_to_docstore_id={}
     )
+    vector_store.raw_index = None
+    return vector_store
 
 
 def create_and_populate_new_index(chunks, embeddings):
@@ -84,74 +133,427 @@ def create_and_populate_new_index(chunks, embeddings):
     return vector_store
 
 
-def add_to_faiss_index(chunks, embeddings):
-    if os.path.exists(FAISS_INDEX_PATH):
+def reshard(vector_store, n_shards, embeddings, batch_size=1000):
+    """
+    Redistribute a store's chunks over n_shards (1 = a single plain store)
+    from the stored vectors and text, without re-embedding.
+    """
+    print(f"🔀 Resharding index into {n_shards} shards...")
+    target = create_new_faiss_index(embeddings, n_shards)
+    for store in iter_stores(vector_store):
+        vectors = exact_vectors(store)
+        positions = sorted(store.index_to_docstore_id.items())
+        for start in range(0, len(positions), batch_size):
+            rows = positions[start:start + batch_size]
+            docs = [store.docstore.search(id_) for _, id_ in rows]
+            kept = [(i, id_, doc) for (i, id_), doc in zip(rows, docs) if isinstance(doc, Document)]
+            add_vectors(
+                target,
+                [doc.page_content for _, _, doc in kept],
+                vectors[[i for i, _, _ in kept]],
+                [doc.metadata for _, _, doc in kept],
+                [id_ for _, id_, _ in kept]
+            )
+        target.docstore.add_signatures(store.docstore.signatures())
+    target.index_meta = vector_store.index_meta
+    target.resharded = True
+    return target
+
+
+def load_or_create_faiss_index(embeddings):
+    """
+    Load the current snapshot of the index at FAISS_INDEX_PATH, or start a new one.
+    Returns (vector_store, loaded) where loaded is False for a fresh store.
+    A snapshot that fails to load is moved to <index>/backups/ and the previous
+    one is tried instead. A store saved with a different shard count is
+    resharded to FAISS_SHARDS.
+    """
+    while True:
+        index_dir = current_index_dir(FAISS_INDEX_PATH)
+        if not store_exists(index_dir):
+            break
+        # A model mismatch is not corruption: fail instead of replacing the index
+        check_index_meta(read_index_meta(index_dir), MISTRAL_EMBED_MODEL, embedding_dimension(MISTRAL_EMBED_MODEL))
         try:
-            existing_store = FAISS.load_local(FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-            if chunks:
-                new_store = create_new_faiss_index(embeddings)
-                ids = [str(uuid4()) for _ in chunks]
-                new_store.add_documents(documents=chunks, ids=ids)
-                existing_store.merge_from(new_store)
-            return existing_store
+            existing_store = load_store(index_dir, embeddings)
         except Exception as e:
-            backup = f"faiss_index_backup_{int(time.time())}"
-            shutil.move(FAISS_INDEX_PATH, backup)
-            return create_and_populate_new_index(chunks, embeddings)
-    else:
-        return create_and_populate_new_index(chunks, embeddings)
+            backup = quarantine_current(FAISS_INDEX_PATH)
+            print(f"⚠️ Could not load index ({e}), moved it to {backup}")
+            previous = restore_previous(FAISS_INDEX_PATH)
+            if previous is None:
+                break
+            print(f"↩️ Falling back to index snapshot {previous}")
+            continue
+        if len(iter_stores(existing_store)) != FAISS_SHARDS:
+            existing_store = reshard(existing_store, FAISS_SHARDS, embeddings)
+        return existing_store, True
+    return create_new_faiss_index(embeddings, FAISS_SHARDS), False
 
 
-def load_documents_from_folder(folder_path):
-    documents = []
+def publish_index(vector_store, manifest, meta=None):
+    """
+    Save the store and manifest as a new immutable snapshot, make it current,
+    and delete snapshots retired longer than the grace period.
+    Returns the snapshot name.
+    """
+    name, snapshot_dir = new_snapshot_dir(FAISS_INDEX_PATH)
+    try:
+        save_store(vector_store, snapshot_dir, meta=meta)
+        save_manifest(manifest, snapshot_dir)
+    except Exception:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        raise
+    publish_snapshot(FAISS_INDEX_PATH, name)
+    gc_snapshots(FAISS_INDEX_PATH)
+    return name
+
+
+def release_file(vector_store, manifest, rel_path):
+    """
+    Forget a file from the manifest and delete its chunks, except chunks other
+    files still share (deduplicated ones), which only lose it as a source.
+    Returns the number of chunks deleted.
+    """
+    ids = forget_file(manifest, rel_path)
+    shared = referenced_chunk_ids(manifest) & set(ids)
+    for chunk_id in shared:
+        update_sources(vector_store.docstore, chunk_id, remove=[os.path.basename(rel_path)])
+    return delete_vectors(vector_store, [id_ for id_ in ids if id_ not in shared])
+
+
+def seed_manifest(vector_store, manifest, hashes):
+    """
+    Record the files of an index built before the manifest existed, matched by
+    their "source" metadata (the file name) as remove_files does, so the build
+    treats them as unchanged instead of embedding them a second time.
+    Returns the number of files recorded.
+    """
+    seeded = 0
+    for rel_path, digest in hashes.items():
+        ids = vector_store.docstore.ids_for_source(os.path.basename(rel_path))
+        if ids:
+            record_file(manifest, rel_path, digest, ids)
+            seeded += 1
+    return seeded
+
+
+def add_to_faiss_index(chunks, embeddings, ids=None, vector_store=None):
+    if vector_store is None:
+        vector_store, _ = load_or_create_faiss_index(embeddings)
+    if chunks:
+        ids = ids or [str(uuid4()) for _ in chunks]
+        texts = [chunk.page_content for chunk in chunks]
+        add_vectors(vector_store, texts, embeddings.embed_documents(texts), [chunk.metadata for chunk in chunks], ids)
+    return vector_store
+
+
+def list_document_files(folder_path):
+    """Supported files under folder_path as {relative posix path: Path}."""
     folder = Path(folder_path)
     supported_formats = ['*.txt', '*.pdf', '*.md', '*.docx', '*.html']
+    files = {}
     for pattern in supported_formats:
         for file_path in folder.glob(f"**/{pattern}"):
-            try:
-                content = extract_text_from_document(str(file_path))
-                if content.strip():
-                    documents.append({
-                        "file_name": file_path.name,
-                        "file_path": str(file_path),
-                        "content": content,
-                        "char_count": len(content)
-                    })
-            except Exception as e:
-                print(f"Error processing {file_path.name}: {e}")
-    return documents
-
-
-def build_index(folder_path=None):
+            files[file_path.relative_to(folder).as_posix()] = file_path
+    return files
+
+
+def load_documents_from_folder(folder_path, only=None):
+    """
+    Extract every supported file, or only the relative paths listed in `only`,
+    in parallel worker processes.
+    Returns (documents, failures); failures are {"file_name", "file_path", "error"}.
+    """
+    files = [
+        (rel_path, str(file_path))
+        for rel_path, file_path in list_document_files(folder_path).items()
+        if only is None or rel_path in only
+    ]
+    documents = []
+    failures = []
+    for res in iter_extracted_cached(files):
+        file_name = os.path.basename(res["file_path"])
+        if res["error"]:
+            print(f"Error processing {file_name}: {res['error']}")
+            failures.append({"file_name": file_name, "file_path": res["file_path"], "error": res["error"]})
+        elif res["content"].strip():
+            documents.append({
+                "file_name": file_name,
+                "file_path": res["file_path"],
+                "rel_path": res["key"],
+                "content": res["content"],
+                "char_count": len(res["content"])
+            })
+    return documents, failures
+
+
+def build_index(folder_path=None, prune_removed=True, progress=None):
+    """
+    Incrementally sync the index with a folder.
+
+    Only new or changed files (by content hash) are extracted and embedded;
+    chunks of changed files, and of files gone from the folder when
+    prune_removed is set, are removed from the index.
+    progress, if given, is called with keyword fields ("stage", "files_total",
+    "files_done", "chunks_embedded") as the build advances.
+    """
+    with _index_write_lock:
+        return _build_index(folder_path, prune_removed, progress or (lambda **fields: None))
+
+
+def _build_index(folder_path, prune_removed, progress):
     folder = folder_path or DOCS_FOLDER
     print(f"Building index from folder: {folder}")
+    if not os.path.isdir(folder):
+        # Treating a missing folder as empty would prune every indexed file
+        return {
+            "success": False,
+            "message": f"Folder not found: {folder}",
+            "error_kind": "folder_not_found",
+            "chunks_created": 0,
+            "documents_processed": 0
+        }
+
+    progress(stage="scanning")
+    files = list_document_files(folder)
+    hashes = {rel_path: file_hash(p) for rel_path, p in files.items()}
+
+    embeddings = init_embeddings()
+    vector_store, loaded = load_or_create_faiss_index(embeddings)
+    manifest = load_manifest(current_index_dir(FAISS_INDEX_PATH)) if loaded else empty_manifest()
+    seeded = 0
+    if loaded and not manifest["files"]:
+        # Legacy index (no manifest): its chunks are only known by file name
+        seeded = seed_manifest(vector_store, manifest, hashes)
+        if seeded:
+            print(f"📋 No manifest: matched {seeded} files to chunks already in the index")
+
+    diff = diff_manifest(manifest, hashes, prune_removed=prune_removed)
+    to_index = diff["new"] + diff["changed"]
+    print(f"📋 {len(diff['new'])} new, {len(diff['changed'])} changed, "
+          f"{len(diff['unchanged'])} unchanged, {len(diff['removed'])} removed")
 
-    documents = load_documents_from_folder(folder)
-    if not documents:
+    if not files and not diff["removed"]:
+        # Nothing to add or prune: a build job counts this as done, not failed
         return {
             "success": False,
+            "noop": True,
             "message": "No documents found",
             "chunks_created": 0,
             "documents_processed": 0
         }
 
-    all_chunks = []
-    for doc in documents:
-        chunks = split_text_into_chunks(doc['content'], doc['file_name'])
-        all_chunks.extend(chunks)
+    progress(stage="removing", files_total=len(to_index))
+    chunks_removed = 0
+    for rel_path in diff["changed"] + diff["removed"]:
+        chunks_removed += release_file(vector_store, manifest, rel_path)
 
-    embeddings = init_embeddings()
-    vector_store = add_to_faiss_index(all_chunks, embeddings)
+    failures = []
+
+    def on_file_done(res):
+        record_file(manifest, res["key"], hashes[res["key"]], res["chunk_ids"])
+
+    def on_file_failed(res):
+        file_name = os.path.basename(res["file_path"])
+        print(f"Error processing {file_name}: {res['error']}")
+        failures.append({"file_name": file_name, "file_path": res["file_path"], "error": res["error"]})
 
-    os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
-    vector_store.save_local(FAISS_INDEX_PATH)
+    # Near-duplicates of chunks kept in this or earlier builds are not embedded again
+    dedup = deduper_for_store(vector_store) if DEDUP_ENABLED and to_index else None
+
+    # extract -> split -> embed -> add, streamed through bounded queues
+    progress(stage="embedding")
+    scheduler = EmbeddingScheduler(embeddings)
+    stats = run_ingest(
+        iter_extracted_cached([(rel_path, str(files[rel_path])) for rel_path in to_index], digests=hashes),
+        vector_store,
+        embeddings,
+        split_fn=split_text_into_spans,
+        make_ids=lambda n: [str(uuid4()) for _ in range(n)],
+        on_file_done=on_file_done,
+        on_file_failed=on_file_failed,
+        scheduler=scheduler,
+        on_progress=lambda s: progress(
+            files_done=s["documents_processed"] + s["documents_failed"],
+            chunks_embedded=s["chunks_created"]
+        ),
+        dedup=dedup
+    )
+    chunks_created = stats["chunks_created"]
+    if dedup is not None:
+        vector_store.docstore.add_signatures(dedup.new_signatures)
+        for chunk_id, sources in dedup.extra_sources.items():
+            update_sources(vector_store.docstore, chunk_id, add=sources)
+        if dedup.dropped:
+            print(f"♻️ Dropped {dedup.dropped} near-duplicate chunks")
+    progress(stage="converting")
+    rebuilt = ensure_index_type(vector_store)
+    resharded = getattr(vector_store, "resharded", False)
+
+    changed = bool(stats["documents_processed"] or chunks_removed or diff["removed"] or rebuilt or resharded
+                   or seeded) or not loaded
+    snapshot = None
+    if changed:
+        progress(stage="saving")
+        snapshot = publish_index(vector_store, manifest, meta=index_meta())
 
     return {
     "success": True,
-    "message": "Index built successfully",
-    "chunks_created": len(all_chunks),
-    "documents_processed": len(documents),
-    "index_path": FAISS_INDEX_PATH
+    "message": "Index built successfully" if changed else "Index already up to date",
+    "chunks_created": chunks_created,
+    "chunks_deduplicated": stats["chunks_deduplicated"],
+    "chunks_removed": chunks_removed,
+    "documents_processed": stats["documents_processed"],
+    "documents_skipped": len(diff["unchanged"]),
+    "documents_removed": len(diff["removed"]),
+    "failed_files": failures,
+    "index_path": FAISS_INDEX_PATH,
+    "snapshot": snapshot,
+    **store_summary(vector_store),
+    "embedding": scheduler.stats(),
+    "embedding_cache": embedding_cache_stats().get(MISTRAL_EMBED_MODEL),
+    "extraction_cache": extraction_cache_stats()
+    }
+
+
+def matching_manifest_keys(manifest, source):
+    """Manifest keys for a file given by relative path or by file name."""
+    if source in manifest["files"]:
+        return [source]
+    return [key for key in manifest["files"] if os.path.basename(key) == source]
+
+
+def remove_files(sources):
+    """
+    Remove the vectors of the given files (relative paths or file names) from the
+    index without re-embedding anything. Chunk ids come from the manifest; files
+    indexed before the manifest existed are matched by their "source" metadata.
+    """
+    with _index_write_lock:
+        return _remove_files(sources)
+
+
+def _remove_files(sources):
+    index_dir = current_index_dir(FAISS_INDEX_PATH)
+    if not store_exists(index_dir):
+        # Nothing indexed, so nothing to remove: a job counts this as done
+        return {"success": False, "noop": True, "message": "Index not found", "chunks_removed": 0}
+
+    embeddings = init_embeddings()
+    check_index_meta(read_index_meta(index_dir), MISTRAL_EMBED_MODEL)
+    vector_store = load_store(index_dir, embeddings)
+    manifest = load_manifest(index_dir)
+
+    removed, not_indexed = [], []
+    chunks_removed = 0
+    for source in sources:
+        keys = matching_manifest_keys(manifest, source)
+        if keys:
+            for key in keys:
+                chunks_removed += release_file(vector_store, manifest, key)
+            removed.append(source)
+            continue
+        ids = vector_store.docstore.ids_for_source(os.path.basename(source))
+        if ids:
+            chunks_removed += delete_vectors(vector_store, ids)
+            removed.append(source)
+        else:
+            not_indexed.append(source)
+
+    snapshot = None
+    if removed:
+        # Keep the recorded build settings; indexes from before the sidecar get the current ones
+        snapshot = publish_index(vector_store, manifest, meta=None if vector_store.index_meta else index_meta())
+    print(f"🗑️ Removed {chunks_removed} chunks of {len(removed)} files from the index")
+
+    return {
+        "success": True,
+        "removed_files": removed,
+        "not_indexed": not_indexed,
+        "chunks_removed": chunks_removed,
+        "vector_count": sum(s.index.ntotal for s in iter_stores(vector_store)),
+        "snapshot": snapshot
+    }
+
+
+def compact_index(dry_run=False, delete_backups=False):
+    """
+    Rewrite the current index into a compact, freshly laid-out snapshot:
+    drop vectors without chunks, chunks without vectors and repeated copies of
+    a chunk, retrain IVF / PQ on the kept vectors, and check the docstore <->
+    vector mapping. Manifest entries that lost chunks are released so the next
+    build re-embeds those files. Backups of snapshots that failed to load (see
+    maintenance.find_backups) are reported, and deleted with delete_backups. With dry_run nothing is written.
+    """
+    with _index_write_lock:
+        return _compact_index(dry_run, delete_backups)
+
+
+def _compact_index(dry_run, delete_backups):
+    index_dir = current_index_dir(FAISS_INDEX_PATH)
+    if not store_exists(index_dir):
+        return {"success": False, "message": "Index not found"}
+
+    embeddings = init_embeddings()
+    check_index_meta(read_index_meta(index_dir), MISTRAL_EMBED_MODEL)
+    vector_store = load_store(index_dir, embeddings)
+    manifest = load_manifest(index_dir)
+    bytes_before = dir_size(index_dir)
+
+    totals = {"vectors_before": 0, "vectors_after": 0, "dangling_vectors": 0,
+              "duplicate_chunks": 0, "orphaned_chunks": 0}
+    remap = {}
+    for store in iter_stores(vector_store):
+        stats, store_remap = compact_store(store)
+        store.dirty = True
+        remap.update(store_remap)
+        for key in totals:
+            totals[key] += stats[key]
+
+    # Point the manifest at the kept copies; files whose chunks are gone get re-embedded next build
+    present = {id_ for s in iter_stores(vector_store) for id_ in s.index_to_docstore_id.values()}
+    reindex = []
+    for rel_path, entry in manifest["files"].items():
+        ids = list(dict.fromkeys(remap.get(id_, id_) for id_ in entry.get("chunk_ids", [])))
+        entry["chunk_ids"] = [id_ for id_ in ids if id_ in present]
+        if len(entry["chunk_ids"]) < len(ids):
+            reindex.append(rel_path)
+    for rel_path in reindex:
+        chunks_removed = release_file(vector_store, manifest, rel_path)
+        totals["vectors_after"] -= chunks_removed
+
+    problems = [p for s in iter_stores(vector_store) for p in verify_store(s)]
+    if problems:
+        # Not published: the previous snapshot stays current
+        print(f"❌ Compacted index failed verification: {problems}")
+        return {"success": False, "message": "Compacted index failed verification", "problems": problems, **totals}
+
+    snapshot, bytes_after = None, None
+    if not dry_run:
+        snapshot = publish_index(vector_store, manifest, meta=None if vector_store.index_meta else index_meta())
+        bytes_after = dir_size(current_index_dir(FAISS_INDEX_PATH))
+
+    backups = find_backups(FAISS_INDEX_PATH)
+    backup_bytes = sum(dir_size(p) for p in backups)
+    if delete_backups and not dry_run:
+        remove_backups(backups)
+
+    print(f"🧹 Compacted index: {totals['vectors_before']} → {totals['vectors_after']} vectors"
+          + (f", {bytes_before - bytes_after} bytes reclaimed" if bytes_after is not None else " (dry run)"))
+    return {
+        "success": True,
+        "dry_run": dry_run,
+        "snapshot": snapshot,
+        **totals,
+        "vectors_reclaimed": totals["vectors_before"] - totals["vectors_after"],
+        "reindex_files": reindex,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": bytes_before - bytes_after if bytes_after is not None else None,
+        "backups": [os.path.basename(p) for p in backups],
+        "backup_bytes": backup_bytes,
+        "backups_removed": bool(backups) and delete_backups and not dry_run,
+        **store_summary(vector_store)
     }
 
 
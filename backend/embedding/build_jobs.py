@@ -0,0 +1,117 @@
+# build_jobs.py
+# Background build jobs: /api/build-index enqueues a job and returns its id,
+# a single worker thread runs builds one at a time, and callers poll the job
+# for progress. A request for a folder that already has a queued build joins
+# that job instead of queuing another rebuild. File deletes queue the removal
+# of their vectors the same way, so no request waits on the index lock.
+
+import os
+import time
+import threading
+from uuid import uuid4
+from collections import deque, OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BUILD_JOBS_HISTORY = int(os.getenv("BUILD_JOBS_HISTORY", 100))
+
+
+class BuildQueue:
+    """
+    Serializes calls to `run_build(params, progress)` on one worker thread.
+
+    Jobs are dicts (copied on read) with "job_id", "state" (queued, running,
+    done, failed), the build params, progress fields ("stage", "files_total",
+    "files_done", "chunks_embedded"), "requests" (how many submissions were
+    coalesced into the job), timestamps, and "result" or "error" with an
+    "error_kind". A result with "noop" set (nothing to build) counts as done.
+    """
+
+    def __init__(self, run_build, history=BUILD_JOBS_HISTORY, classify_error=None):
+        self.run_build = run_build
+        self.history = history
+        self.classify_error = classify_error
+        self._jobs = OrderedDict()
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def submit(self, **params):
+        """Queue a build, or join the queued (not yet started) one with the same params."""
+        with self._cond:
+            for job_id in self._pending:
+                job = self._jobs[job_id]
+                if job["params"] == params:
+                    job["requests"] += 1
+                    return dict(job)
+
+            job = {
+                "job_id": str(uuid4()),
+                "state": "queued",
+                "params": params,
+                "stage": None,
+                "files_total": 0,
+                "files_done": 0,
+                "chunks_embedded": 0,
+                "requests": 1,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "error_kind": None
+            }
+            self._jobs[job["job_id"]] = job
+            self._pending.append(job["job_id"])
+            self._trim()
+            self._ensure_worker()
+            self._cond.notify()
+            return dict(job)
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._cond:
+            return [dict(job) for job in reversed(self._jobs.values())]
+
+    def _trim(self):
+        # Forget the oldest finished jobs beyond the history size
+        finished = [j for j, job in self._jobs.items() if job["state"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="build-worker", daemon=True)
+            self._worker.start()
+
+    def _update(self, job, **fields):
+        with self._cond:
+            job.update(fields)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._jobs[self._pending.popleft()]
+                job.update(state="running", started_at=time.time())
+
+            try:
+                result = self.run_build(job["params"], lambda **fields: self._update(job, **fields))
+                if result.get("success") or result.get("noop"):
+                    self._update(job, state="done", stage="done", result=result)
+                else:
+                    self._update(job, state="failed", stage="done", result=result,
+                                 error=result.get("message") or result.get("error") or "Build failed",
+                                 error_kind=result.get("error_kind", "error"))
+            except Exception as e:
+                print(f"Build job {job['job_id']} failed: {e}")
+                kind = self.classify_error(e) if self.classify_error else "error"
+                self._update(job, state="failed", error=str(e), error_kind=kind)
+            finally:
+                self._update(job, finished_at=time.time())
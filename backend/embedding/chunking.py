@@ -0,0 +1,102 @@
+# chunking.py
+# Recursive character chunking that returns (start, end) offsets into the
+# document text instead of copied chunk strings. It follows
+# RecursiveCharacterTextSplitter (keep_separator=True, strip_whitespace=True,
+# length = len), so chunk boundaries are the same; the docstore keeps one copy
+# of each document's text and slices chunks out of it on retrieval.
+
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+
+class SpanSplitter:
+    """Splits text into overlapping chunks given as (start, end) character offsets."""
+
+    def __init__(self, chunk_size=1000, chunk_overlap=200, separators=None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+        self._patterns = {s: re.compile(re.escape(s)) for s in self.separators if s}
+
+    def split_spans(self, text):
+        """(start, end) offsets of the chunks of text, in order."""
+        return self._split(text, 0, len(text), self.separators)
+
+    def _pieces(self, text, start, end, separator):
+        """Split text[start:end] before every separator occurrence (the separator starts the next piece)."""
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+        bounds = [start]
+        bounds += [m.start() for m in self._patterns[separator].finditer(text, start, end)]
+        bounds.append(end)
+        return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def _split(self, text, start, end, separators):
+        separator = separators[-1]
+        remaining = []
+        for i, s in enumerate(separators):
+            if not s:
+                separator = s
+                break
+            if self._patterns[s].search(text, start, end):
+                separator = s
+                remaining = separators[i + 1:]
+                break
+
+        chunks = []
+        good = []
+        for a, b in self._pieces(text, start, end, separator):
+            if b - a < self.chunk_size:
+                good.append((a, b))
+                continue
+            if good:
+                chunks.extend(self._merge(text, good))
+                good = []
+            if not remaining:
+                chunks.append((a, b))
+            else:
+                chunks.extend(self._split(text, a, b, remaining))
+        if good:
+            chunks.extend(self._merge(text, good))
+        return chunks
+
+    def _merge(self, text, pieces):
+        """Combine adjacent pieces into chunks of up to chunk_size with chunk_overlap."""
+        chunks = []
+        current = []
+        total = 0
+        for a, b in pieces:
+            length = b - a
+            if total + length > self.chunk_size:
+                if total > self.chunk_size:
+                    logger.warning("Created a chunk of size %d, which is longer than the specified %d",
+                                   total, self.chunk_size)
+                if current:
+                    span = self._strip(text, current[0][0], current[-1][1])
+                    if span is not None:
+                        chunks.append(span)
+                    # Drop pieces from the front down to the overlap
+                    while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                        total -= current[0][1] - current[0][0]
+                        current = current[1:]
+            current.append((a, b))
+            total += length
+        if current:
+            span = self._strip(text, current[0][0], current[-1][1])
+            if span is not None:
+                chunks.append(span)
+        return chunks
+
+    @staticmethod
+    def _strip(text, start, end):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if end > start else None
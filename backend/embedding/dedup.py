@@ -0,0 +1,158 @@
+# dedup.py
+# Near-duplicate chunk elimination before embedding. Each chunk gets a 64-bit
+# SimHash over word shingles; a chunk whose SimHash is within the configured
+# similarity of an already kept chunk is dropped and its source is recorded on
+# that canonical chunk instead. Signatures are stored in the docstore so later
+# incremental builds dedup against chunks already in the index.
+
+import os
+import re
+import hashlib
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from embedding.shards import iter_stores
+
+load_dotenv()
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "True").lower() == "true"
+# Fraction of equal SimHash bits (1 - hamming / 64) at which chunks count as duplicates
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.9))
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", 3))
+
+SIMHASH_BITS = 64
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_BIT_VALUES = np.uint64(1) << np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+def shingles(text, size=DEDUP_SHINGLE_WORDS):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text, size=DEDUP_SHINGLE_WORDS):
+    """64-bit SimHash of the text's word shingles (as an unsigned int)."""
+    features = shingles(text, size)
+    if not features:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in features],
+        dtype=np.uint64
+    )
+    # +1 for every set bit, -1 for every clear bit, summed over features
+    bits = (hashes[:, None] & _BIT_VALUES) != 0
+    weights = bits.sum(axis=0) * 2 - len(features)
+    return int(_BIT_VALUES[weights > 0].sum()) if (weights > 0).any() else 0
+
+
+def max_distance(threshold=DEDUP_THRESHOLD):
+    """Largest Hamming distance that still meets the similarity threshold."""
+    return max(0, int((1.0 - threshold) * SIMHASH_BITS + 1e-9))
+
+
+class SimHashIndex:
+    """
+    Near-duplicate lookup over SimHashes. With distance d, two hashes that match
+    must agree exactly on at least one of d + 1 bit bands (pigeonhole), so only
+    hashes sharing a band are compared.
+    """
+
+    def __init__(self, distance=None):
+        self.distance = max_distance() if distance is None else distance
+        n_bands = self.distance + 1
+        edges = np.linspace(0, SIMHASH_BITS, n_bands + 1).astype(int)
+        self.bands = [(int(a), (1 << int(b - a)) - 1) for a, b in zip(edges[:-1], edges[1:])]
+        self.tables = [{} for _ in self.bands]
+        self.hashes = {}
+
+    def _keys(self, h):
+        return [(h >> shift) & mask for shift, mask in self.bands]
+
+    def add(self, key, h):
+        self.hashes[key] = h
+        for table, band in zip(self.tables, self._keys(h)):
+            table.setdefault(band, []).append(key)
+
+    def find(self, h):
+        """Key of a stored hash within the distance, or None."""
+        for table, band in zip(self.tables, self._keys(h)):
+            for key in table.get(band, ()):
+                if bin(self.hashes[key] ^ h).count("1") <= self.distance:
+                    return key
+        return None
+
+
+class ChunkDeduper:
+    """
+    Build-time filter: check() returns the canonical chunk id a new chunk
+    duplicates, or None if the chunk is kept (and becomes a canonical itself).
+    Sources of dropped chunks are collected in extra_sources for update_sources().
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, existing=None):
+        self.index = SimHashIndex(max_distance(threshold))
+        self.new_signatures = {}
+        self.extra_sources = {}
+        self.dropped = 0
+        for chunk_id, h in (existing or {}).items():
+            self.index.add(chunk_id, h)
+
+    def check(self, text, chunk_id, source):
+        h = simhash(text)
+        canonical = self.index.find(h)
+        if canonical is None:
+            self.index.add(chunk_id, h)
+            self.new_signatures[chunk_id] = h
+            return None
+        self.dropped += 1
+        if source:
+            self.extra_sources.setdefault(canonical, set()).add(source)
+        return canonical
+
+
+def deduper_for_store(vector_store, threshold=DEDUP_THRESHOLD):
+    """
+    ChunkDeduper seeded with the signatures of every chunk already in the store;
+    chunks indexed before dedup existed get theirs computed (once) from their text.
+    """
+    docstore = vector_store.docstore
+    known = docstore.signatures()
+    backfill = {}
+    for store in iter_stores(vector_store):
+        for chunk_id in store.index_to_docstore_id.values():
+            if chunk_id in known:
+                continue
+            doc = store.docstore.search(chunk_id)
+            if isinstance(doc, Document):
+                backfill[chunk_id] = simhash(doc.page_content)
+    if backfill:
+        docstore.add_signatures(backfill)
+        known.update(backfill)
+    return ChunkDeduper(threshold, existing=known)
+
+
+def chunk_sources(metadata):
+    """All sources of a chunk: "sources" when it was deduplicated, else its "source"."""
+    return list(metadata.get("sources") or [metadata.get("source")])
+
+
+def update_sources(docstore, chunk_id, add=(), remove=()):
+    """Rewrite a chunk's "source" / "sources" metadata; returns False if the chunk is gone."""
+    doc = docstore.search(chunk_id)
+    if not isinstance(doc, Document):
+        return False
+    sources = [s for s in chunk_sources(doc.metadata) if s not in set(remove)]
+    sources += sorted(s for s in add if s not in sources)
+    if not sources:
+        return False
+    metadata = dict(doc.metadata)
+    metadata["source"] = sources[0]
+    metadata["candidate"] = os.path.splitext(sources[0])[0]
+    if len(sources) > 1:
+        metadata["sources"] = sources
+    else:
+        metadata.pop("sources", None)
+    docstore.update_metadata(chunk_id, metadata)
+    return True
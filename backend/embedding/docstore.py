@@ -0,0 +1,439 @@
+# docstore.py
+# SQLite-backed docstore for the FAISS vector store. Text (optionally
+# zlib-compressed) and metadata live on disk and are read only for the hits a
+# search returns; the FAISS position -> chunk id map is stored alongside, so
+# nothing has to be unpickled at startup. Chunks are either stored as their
+# own text or, as the build does, as (doc_id, start, end) spans over one copy
+# of their document's text. A contentless FTS5 table indexes every chunk's
+# words for BM25 keyword search (see lexical.py) without a second text copy.
+
+import os
+import json
+import zlib
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+load_dotenv()
+
+DOCSTORE_FILE = "docstore.sqlite3"
+DOCSTORE_COMPRESS = os.getenv("DOCSTORE_COMPRESS", "True").lower() == "true"
+DOCSTORE_COMPRESS_MIN_CHARS = int(os.getenv("DOCSTORE_COMPRESS_MIN_CHARS", 256))
+DOCSTORE_DOCUMENT_CACHE = int(os.getenv("DOCSTORE_DOCUMENT_CACHE", 8))  # decoded documents kept for slicing
+
+_SCHEMA = (
+    # content is empty for span chunks (doc_id, span_start, span_end set)
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    " id TEXT PRIMARY KEY,"
+    " content BLOB NOT NULL,"
+    " compressed INTEGER NOT NULL,"
+    " metadata TEXT NOT NULL,"
+    " doc_id TEXT,"
+    " span_start INTEGER,"
+    " span_end INTEGER)",
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " doc_id TEXT PRIMARY KEY,"
+    " content BLOB NOT NULL,"
+    " compressed INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS positions ("
+    " position INTEGER PRIMARY KEY,"
+    " id TEXT NOT NULL)",
+    # Near-duplicate signatures (SimHash) of chunks, see dedup.py
+    "CREATE TABLE IF NOT EXISTS signatures ("
+    " id TEXT PRIMARY KEY,"
+    " simhash INTEGER NOT NULL)",
+)
+# BM25 inverted index: FTS5 needs integer rowids, lexical_ids maps them to chunk ids
+_LEXICAL_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS lexical_ids ("
+    " n INTEGER PRIMARY KEY,"
+    " id TEXT UNIQUE NOT NULL)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lexical USING fts5("
+    " text, content='', tokenize='unicode61 remove_diacritics 2')",
+)
+# Columns added to chunks after the first docstore files were written
+_CHUNK_COLUMNS = (("doc_id", "TEXT"), ("span_start", "INTEGER"), ("span_end", "INTEGER"))
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore on a SQLite file.
+
+    read_only opens the file without write access (query time). temporary
+    marks a scratch working copy that is deleted when the store is closed.
+    """
+
+    def __init__(self, path, read_only=False, temporary=False, compress=DOCSTORE_COMPRESS):
+        self.path = path
+        self.read_only = read_only
+        self.temporary = temporary
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._documents = OrderedDict()
+        if read_only:
+            uri = f"file:{os.path.abspath(path)}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self._ensure_schema()
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")}
+        self._has_spans = "doc_id" in columns
+        self._has_lexical = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'lexical'"
+        ).fetchone() is not None
+
+    def _ensure_schema(self):
+        for stmt in _SCHEMA:
+            self.conn.execute(stmt)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")}
+        for name, kind in _CHUNK_COLUMNS:
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE chunks ADD COLUMN {name} {kind}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id)")
+        self.conn.commit()
+        self._has_spans = True
+
+        had_lexical = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'lexical'").fetchone()
+        try:
+            for stmt in _LEXICAL_SCHEMA:
+                self.conn.execute(stmt)
+            self.conn.commit()
+            self._has_lexical = True
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: keyword search is unavailable
+            print(f"⚠️ Lexical index disabled: {e}")
+            self._has_lexical = False
+        if self._has_lexical and not had_lexical:
+            # Docstores from before the lexical index: index their chunks once
+            with self._lock:
+                ids = [r[0] for r in self.conn.execute("SELECT id FROM chunks")]
+                self._lexical_add([(id_, self._chunk(id_).page_content) for id_ in ids])
+                self.conn.commit()
+
+    @classmethod
+    def scratch(cls, source=None):
+        """A temporary writable store, optionally starting as a copy of `source`."""
+        fd, path = tempfile.mkstemp(prefix="docstore_", suffix=".sqlite3")
+        os.close(fd)
+        store = cls(path, temporary=True)
+        if source is not None:
+            src = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+            try:
+                src.backup(store.conn)
+            finally:
+                src.close()
+            store._ensure_schema()
+        return store
+
+    def _encode(self, text):
+        data = text.encode("utf-8")
+        if self.compress and len(text) >= DOCSTORE_COMPRESS_MIN_CHARS:
+            return zlib.compress(data, 6), 1
+        return data, 0
+
+    @staticmethod
+    def _decode(blob, compressed):
+        data = zlib.decompress(blob) if compressed else blob
+        return data.decode("utf-8")
+
+    def _document(self, doc_id):
+        """Decoded text of a stored document (caller holds the lock)."""
+        text = self._documents.get(doc_id)
+        if text is not None:
+            self._documents.move_to_end(doc_id)
+            return text
+        row = self.conn.execute("SELECT content, compressed FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        text = self._decode(*row)
+        self._documents[doc_id] = text
+        while len(self._documents) > DOCSTORE_DOCUMENT_CACHE:
+            self._documents.popitem(last=False)
+        return text
+
+    def _chunk(self, search):
+        """The chunk as a Document, or None (caller holds the lock)."""
+        if self._has_spans:
+            row = self.conn.execute(
+                "SELECT content, compressed, metadata, doc_id, span_start, span_end FROM chunks WHERE id = ?",
+                (search,)
+            ).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT content, compressed, metadata, NULL, NULL, NULL FROM chunks WHERE id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return None
+        content, compressed, metadata, doc_id, start, end = row
+        if doc_id is not None:
+            document = self._document(doc_id)
+            if document is None:
+                return None
+            text = document[start:end]
+        else:
+            text = self._decode(content, compressed)
+        return Document(id=search, page_content=text, metadata=json.loads(metadata))
+
+    def search(self, search):
+        with self._lock:
+            doc = self._chunk(search)
+        return doc if doc is not None else f"ID {search} not found."
+
+    def spans(self, ids):
+        """{id: (doc_id, start, end)} for the span chunks among ids."""
+        ids = list(ids)
+        if not self._has_spans or not ids:
+            return {}
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, doc_id, span_start, span_end FROM chunks"
+                f" WHERE doc_id IS NOT NULL AND id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {id_: (doc_id, start, end) for id_, doc_id, start, end in rows}
+
+    def document(self, doc_id):
+        """Full text of a stored document, or None."""
+        with self._lock:
+            return self._document(doc_id)
+
+    def _lexical_add(self, items):
+        """Index [(id, text)] for keyword search (caller holds the lock)."""
+        if not self._has_lexical:
+            return
+        for id_, text in items:
+            n = self.conn.execute("INSERT INTO lexical_ids (id) VALUES (?)", (id_,)).lastrowid
+            self.conn.execute("INSERT INTO lexical (rowid, text) VALUES (?, ?)", (n, text))
+
+    def _lexical_remove(self, ids):
+        """
+        Unindex chunks before they are replaced or deleted (caller holds the
+        lock): a contentless FTS5 table deletes a row given its original text.
+        """
+        if not self._has_lexical:
+            return
+        for id_ in ids:
+            row = self.conn.execute("SELECT n FROM lexical_ids WHERE id = ?", (id_,)).fetchone()
+            if row is None:
+                continue
+            doc = self._chunk(id_)
+            if doc is not None:
+                self.conn.execute(
+                    "INSERT INTO lexical (lexical, rowid, text) VALUES ('delete', ?, ?)", (row[0], doc.page_content)
+                )
+            self.conn.execute("DELETE FROM lexical_ids WHERE n = ?", row)
+
+    def lexical_search(self, match, k):
+        """
+        Top-k (id, BM25 score, higher is better) for an FTS5 MATCH expression,
+        or None when this docstore has no lexical index.
+        """
+        if not self._has_lexical:
+            return None
+        with self._lock:
+            try:
+                rows = self.conn.execute(
+                    "SELECT lexical_ids.id, bm25(lexical) AS score FROM lexical"
+                    " JOIN lexical_ids ON lexical_ids.n = lexical.rowid"
+                    " WHERE lexical MATCH ? ORDER BY score LIMIT ?", (match, k)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # Not a valid query for FTS5
+                return []
+        return [(id_, -score) for id_, score in rows]
+
+    def add(self, texts):
+        rows = []
+        for id_, doc in texts.items():
+            blob, compressed = self._encode(doc.page_content)
+            rows.append((id_, blob, compressed, json.dumps(doc.metadata, ensure_ascii=False)))
+        with self._lock:
+            self._lexical_remove(texts.keys())
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, content, compressed, metadata) VALUES (?, ?, ?, ?)", rows
+            )
+            self._lexical_add((id_, doc.page_content) for id_, doc in texts.items())
+            self.conn.commit()
+
+    def add_document(self, doc_id, text):
+        """Store a document's full text once; its chunks are added with add_spans."""
+        blob, compressed = self._encode(text)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, content, compressed) VALUES (?, ?, ?)",
+                (doc_id, blob, compressed)
+            )
+            self.conn.commit()
+
+    def add_spans(self, spans):
+        """Add chunks as {id: (doc_id, start, end, metadata)} slices of stored documents."""
+        rows = [
+            (id_, b"", 0, json.dumps(metadata, ensure_ascii=False), doc_id, start, end)
+            for id_, (doc_id, start, end, metadata) in spans.items()
+        ]
+        with self._lock:
+            self._lexical_remove(spans.keys())
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, content, compressed, metadata, doc_id, span_start, span_end)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._lexical_add(
+                (id_, self._document(doc_id)[start:end]) for id_, (doc_id, start, end, _) in spans.items()
+            )
+            self.conn.commit()
+
+    def update_metadata(self, id_, metadata):
+        """Replace a chunk's metadata, leaving its text as stored. Returns False if the id is not here."""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE chunks SET metadata = ? WHERE id = ?", (json.dumps(metadata, ensure_ascii=False), id_)
+            )
+            self.conn.commit()
+        return cur.rowcount > 0
+
+    def delete(self, ids):
+        ids = list(ids)
+        rows = [(i,) for i in ids]
+        with self._lock:
+            self._lexical_remove(ids)
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", rows)
+            self.conn.executemany("DELETE FROM signatures WHERE id = ?", rows)
+            # Documents go with their last chunk
+            self.conn.execute(
+                "DELETE FROM documents WHERE doc_id NOT IN"
+                " (SELECT doc_id FROM chunks WHERE doc_id IS NOT NULL)"
+            )
+            self.conn.commit()
+            self._documents.clear()
+
+    def add_signatures(self, signatures):
+        """
+        Store 64-bit chunk signatures ({id: unsigned int}) of chunks in this
+        docstore; others are skipped. Returns the number stored.
+        """
+        # SQLite integers are signed 64-bit
+        rows = [(id_, h - (1 << 64) if h >= 1 << 63 else h, id_) for id_, h in signatures.items()]
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO signatures (id, simhash)"
+                " SELECT ?, ? WHERE EXISTS (SELECT 1 FROM chunks WHERE id = ?)", rows
+            )
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def signatures(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT id, simhash FROM signatures").fetchall()
+        return {id_: h & ((1 << 64) - 1) for id_, h in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def ids(self):
+        with self._lock:
+            return [r[0] for r in self.conn.execute("SELECT id FROM chunks")]
+
+    def ids_for_source(self, source):
+        """Chunk ids whose "source" (or deduplicated "sources") metadata has the given file name."""
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT id FROM chunks WHERE json_extract(metadata, '$.source') = ?"
+                " OR EXISTS (SELECT 1 FROM json_each(metadata, '$.sources') WHERE value = ?)",
+                (source, source)
+            )]
+
+    def vacuum(self):
+        """Drop signatures and documents no chunk uses, then rewrite the file without free pages."""
+        with self._lock:
+            self.conn.execute("DELETE FROM signatures WHERE id NOT IN (SELECT id FROM chunks)")
+            if self._has_lexical:
+                self.conn.execute("DELETE FROM lexical_ids WHERE id NOT IN (SELECT id FROM chunks)")
+                self.conn.execute("INSERT INTO lexical (lexical) VALUES ('optimize')")
+            self.conn.execute(
+                "DELETE FROM documents WHERE doc_id NOT IN"
+                " (SELECT doc_id FROM chunks WHERE doc_id IS NOT NULL)"
+            )
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+            self._documents.clear()
+
+    def load_positions(self):
+        """The stored FAISS position -> chunk id map as a dict."""
+        with self._lock:
+            return dict(self.conn.execute("SELECT position, id FROM positions"))
+
+    def write_positions(self, index_to_docstore_id):
+        """Replace the stored FAISS position -> chunk id map."""
+        with self._lock:
+            self.conn.execute("DELETE FROM positions")
+            self.conn.executemany(
+                "INSERT INTO positions (position, id) VALUES (?, ?)",
+                ((int(i), id_) for i, id_ in index_to_docstore_id.items())
+            )
+            self.conn.commit()
+
+    def save_to(self, path, index_to_docstore_id):
+        """Write this store plus the position map to a new SQLite file at path."""
+        self.write_positions(index_to_docstore_id)
+        with self._lock:
+            dest = sqlite3.connect(path)
+            try:
+                self.conn.backup(dest)
+            finally:
+                dest.close()
+
+    def close(self):
+        self.conn.close()
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def copy_from(self, docstore, ids):
+        """Copy documents from another docstore (e.g. a legacy InMemoryDocstore)."""
+        batch = {}
+        for id_ in ids:
+            doc = docstore.search(id_)
+            if isinstance(doc, Document):
+                batch[id_] = doc
+            if len(batch) >= 1000:
+                self.add(batch)
+                batch = {}
+        if batch:
+            self.add(batch)
+        return self
+
+
+class SQLiteIdMap(Mapping):
+    """Read-only, lazily queried FAISS position -> chunk id map."""
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    def __getitem__(self, position):
+        with self.docstore._lock:
+            row = self.docstore.conn.execute(
+                "SELECT id FROM positions WHERE position = ?", (int(position),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __iter__(self):
+        with self.docstore._lock:
+            positions = [r[0] for r in self.docstore.conn.execute("SELECT position FROM positions ORDER BY position")]
+        return iter(positions)
+
+    def __len__(self):
+        with self.docstore._lock:
+            return self.docstore.conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
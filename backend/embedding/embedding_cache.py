@@ -0,0 +1,244 @@
+# embedding_cache.py
+# Persistent SQLite cache in front of an Embeddings model, keyed by
+# (model name, text hash), with a size cap and LRU eviction.
+
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_mistralai import MistralAIEmbeddings
+
+load_dotenv()
+
+MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+MISTRAL_EMBED_MODEL = os.getenv("MISTRAL_EMBED_MODEL", "mistral-embed")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", 512))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 0))
+
+# Output sizes of known models, so nothing has to be embedded just to learn them
+KNOWN_DIMENSIONS = {"mistral-embed": 1024}
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts it has never seen to the model."""
+
+    def __init__(self, embeddings, model_name, cache_path=EMBEDDING_CACHE_PATH,
+                 max_bytes=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        """Return {key: vector} for the cached keys and refresh their LRU time."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite caps the number of bound parameters, so query in slices
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items):
+        """Insert {key: vector} and evict least recently used rows over the cap."""
+        now = time.time()
+        rows = [
+            (key, self.model_name, np.asarray(vec, dtype=np.float32).tobytes(), now)
+            for key, vec in items.items()
+        ]
+        with self._lock:
+            # A replaced row (the same text embedded again, e.g. by a concurrent
+            # caller) frees its old vector's bytes
+            replaced = 0
+            keys = [r[0] for r in rows]
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._size += sum(len(r[2]) for r in rows) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Other instances (build / chat, other processes) write to the same
+        # file: recount before deciding how much to free
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        # Trim to 90% of the cap so we don't evict on every insert
+        to_free = self._size - int(self.max_bytes * 0.9)
+        victims = []
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ):
+            if to_free <= 0:
+                break
+            victims.append((key,))
+            to_free -= size
+            self._size -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        cached = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        # Repeats inside one batch are embedded once, so they count as hits
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        return [cached[k] for k in keys]
+
+    def _cached_query(self, key):
+        """The cached vector for a query key (or None), counted as a hit or miss."""
+        cached = self._lookup([key])
+        with self._lock:
+            if key in cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return cached.get(key)
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self._cached_query(key)
+        if vector is not None:
+            return vector
+        vector = self.embeddings.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    async def aembed_query(self, text):
+        """
+        embed_query that awaits the model instead of blocking a thread on it.
+        The SQLite reads and writes run in a worker thread: a build holding the
+        cache lock during an eviction must not stall the event loop.
+        """
+        key = self._key(text)
+        vector = await asyncio.to_thread(self._cached_query, key)
+        if vector is not None:
+            return vector
+        vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self._store, {key: vector})
+        return vector
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes
+        }
+
+
+def embedding_dimension(model=MISTRAL_EMBED_MODEL):
+    """Vector size for a model from EMBEDDING_DIM or the known-models table, else None."""
+    return EMBEDDING_DIM or KNOWN_DIMENSIONS.get(model)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_embeddings(model=MISTRAL_EMBED_MODEL, client_retries=True):
+    """
+    Mistral embeddings behind the shared on-disk cache, one instance per model.
+    client_retries=False is for index builds: EmbeddingScheduler retries with
+    a backoff that adapts to 429s, so the client's own retries (fixed 30 s
+    wait) are turned off there. Chat-time calls keep them.
+    """
+    key = (model, client_retries)
+    with _shared_lock:
+        if key not in _shared:
+            options = {} if client_retries else {"max_retries": None}
+            embeddings = MistralAIEmbeddings(api_key=MISTRAL_API_KEY, model=model, **options)
+            if EMBEDDING_CACHE_ENABLED:
+                embeddings = CachedEmbeddings(embeddings, model)
+            _shared[key] = embeddings
+        return _shared[key]
+
+
+def embedding_cache_stats():
+    """Cache counters per model (build and chat instances added up)."""
+    stats = {}
+    for (model, _), emb in _shared.items():
+        if not isinstance(emb, CachedEmbeddings):
+            continue
+        current = emb.stats()
+        merged = stats.get(model)
+        if merged is None:
+            stats[model] = current
+            continue
+        for name in ("hits", "misses", "evictions"):
+            merged[name] += current[name]
+        total = merged["hits"] + merged["misses"]
+        merged["hit_rate"] = round(merged["hits"] / total, 4) if total else 0.0
+        merged["size_bytes"] = max(merged["size_bytes"], current["size_bytes"])
+    return stats
@@ -0,0 +1,235 @@
+# extraction.py
+# Parallel MarkItDown extraction: a pool of long-lived worker processes, each
+# with its own converter, a per-file timeout and a per-worker memory limit.
+# Single-file conversions (extract_one) reuse idle workers between calls.
+
+import os
+import sys
+import time
+import types
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, timeouts still apply
+    resource = None
+
+load_dotenv()
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACT_TIMEOUT_S = float(os.getenv("EXTRACT_TIMEOUT_S", 120))
+EXTRACT_MEMORY_MB = int(os.getenv("EXTRACT_MEMORY_MB", 2048))
+
+# Workers are never forked from the server process, which has live threads
+# (Flask requests, embedding pool, prefetch) whose locks a fork could copy
+# held: they come from a single-threaded fork server, or are spawned (Windows)
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_start_lock = threading.Lock()
+# Workers kept by extract_one between calls (at most EXTRACT_WORKERS)
+_idle_workers = []
+_idle_lock = threading.Lock()
+
+
+def _limit_memory(memory_mb):
+    """Cap the worker's address space at its current size + memory_mb."""
+    if resource is None or not memory_mb:
+        return
+    current = 0
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    limit = current + memory_mb * 1024 * 1024
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Could not set extraction memory limit: {e}")
+
+
+def _worker_main(conn, memory_mb):
+    """Worker loop: one MarkItDown per process, one file per message."""
+    from markitdown import MarkItDown
+    converter = MarkItDown(enable_plugins=True)
+    _limit_memory(memory_mb)
+
+    while True:
+        try:
+            file_path = conn.recv()
+        except EOFError:
+            break
+        if file_path is None:
+            break
+        try:
+            conn.send(("ok", converter.convert(file_path).text_content or ""))
+        except MemoryError:
+            conn.send(("error", f"memory limit of {memory_mb} MB exceeded"))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    conn.close()
+
+
+def _context():
+    ctx = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == "forkserver":
+        # The fork server imports only what the workers need, not the app
+        ctx.set_forkserver_preload(["embedding.extraction", "markitdown"])
+    return ctx
+
+
+def _start(process):
+    """
+    Start a worker without the parent's __main__: spawn / forkserver children
+    re-run the main script (app.py would build a whole agent in every worker),
+    and _worker_main lives in this module anyway.
+    """
+    with _start_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            process.start()
+        finally:
+            sys.modules["__main__"] = main
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb):
+        self.memory_mb = memory_mb
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+        _start(self.process)
+        child_conn.close()
+        self.task = None
+        self.started_at = None
+
+    def submit(self, task):
+        self.task = task
+        self.started_at = time.monotonic()
+        self.conn.send(task[1])
+
+    def done(self):
+        task, self.task, self.started_at = self.task, None, None
+        return task
+
+    def stop(self, force=False):
+        try:
+            if force:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+            self.process.join(timeout=5)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+def iter_extracted(files, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT_S,
+                   memory_mb=EXTRACT_MEMORY_MB):
+    """
+    Extract files in parallel and yield one result per file as it completes.
+
+    :param files: iterable of (key, file_path) pairs, e.g. (relative path, path)
+    :return: generator of dicts {"key", "file_path", "content", "error"};
+             content is None when error is set (failure, timeout or crash)
+    """
+    pending = list(files)
+    if not pending:
+        return
+    pending.reverse()
+
+    ctx = _context()
+    pool = [_Worker(ctx, memory_mb) for _ in range(max(1, min(workers, len(pending))))]
+
+    def result(task, content=None, error=None):
+        return {"key": task[0], "file_path": task[1], "content": content, "error": error}
+
+    try:
+        while True:
+            for w in pool:
+                if w is not None and w.task is None and pending:
+                    w.submit(pending.pop())
+            busy = [w for w in pool if w is not None and w.task is not None]
+            if not busy:
+                break
+
+            now = time.monotonic()
+            next_deadline = min(w.started_at + timeout for w in busy)
+            ready = wait([w.conn for w in busy], timeout=max(0.0, next_deadline - now))
+
+            for i, w in enumerate(pool):
+                if w is None or w.task is None:
+                    continue
+                if w.conn in ready:
+                    try:
+                        status, payload = w.conn.recv()
+                    except (EOFError, OSError):
+                        # Worker died mid-file (e.g. killed by the OOM killer)
+                        code = w.process.exitcode
+                        task = w.done()
+                        w.stop(force=True)
+                        pool[i] = _Worker(ctx, memory_mb) if pending else None
+                        yield result(task, error=f"worker crashed (exit code {code})")
+                        continue
+                    task = w.done()
+                    if status == "ok":
+                        yield result(task, content=payload)
+                    else:
+                        yield result(task, error=payload)
+                elif time.monotonic() - w.started_at >= timeout:
+                    task = w.done()
+                    w.stop(force=True)
+                    pool[i] = _Worker(ctx, memory_mb) if pending else None
+                    yield result(task, error=f"timed out after {timeout:g}s")
+    finally:
+        for w in pool:
+            if w is not None:
+                w.stop(force=w.task is not None)
+
+
+def extract_one(file_path, timeout=EXTRACT_TIMEOUT_S, memory_mb=EXTRACT_MEMORY_MB):
+    """
+    (content, error) for one file, converted on an idle worker left by an
+    earlier call when there is one, so callers converting files one by one do
+    not start a process (and load MarkItDown) per file.
+    """
+    with _idle_lock:
+        worker = _idle_workers.pop() if _idle_workers else None
+    if worker is None or worker.memory_mb != memory_mb or not worker.process.is_alive():
+        if worker is not None:
+            worker.stop(force=True)
+        worker = _Worker(_context(), memory_mb)
+
+    worker.submit((file_path, file_path))
+    if not worker.conn.poll(timeout):
+        worker.stop(force=True)
+        return None, f"timed out after {timeout:g}s"
+    try:
+        status, payload = worker.conn.recv()
+    except (EOFError, OSError):
+        code = worker.process.exitcode
+        worker.stop(force=True)
+        return None, f"worker crashed (exit code {code})"
+    worker.done()
+
+    with _idle_lock:
+        if len(_idle_workers) < EXTRACT_WORKERS:
+            _idle_workers.append(worker)
+            worker = None
+    if worker is not None:
+        worker.stop()
+    return (payload, None) if status == "ok" else (None, payload)
+
+
+def iter_extracted_reused(files, timeout=EXTRACT_TIMEOUT_S, memory_mb=EXTRACT_MEMORY_MB):
+    """iter_extracted one file at a time with extract_one, for callers that convert a file or two per call."""
+    for key, file_path in files:
+        content, error = extract_one(file_path, timeout, memory_mb)
+        yield {"key": key, "file_path": file_path, "content": content, "error": error}
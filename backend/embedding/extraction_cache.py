@@ -0,0 +1,204 @@
+# extraction_cache.py
+# On-disk cache of MarkItDown output keyed by file content hash, shared by the
+# vector index build and the SQL ingest (insert_db). Each version of a document
+# is converted once: <hash><ext>.md holds the Markdown, <hash><ext>.json its
+# metadata. Uploads warm the cache in the background.
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from embedding.manifest import file_hash
+from embedding.extraction import iter_extracted, iter_extracted_reused
+
+load_dotenv()
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "True").lower() == "true"
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "./extraction_cache")
+EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", 1024))
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extract-prefetch")
+_stats = {"hits": 0, "misses": 0}  # updated under _inflight_lock
+
+
+def cache_key(file_path, digest=None):
+    """Content hash plus extension: the converter MarkItDown picks depends on both."""
+    digest = digest or file_hash(file_path)
+    return digest + os.path.splitext(file_path)[1].lower()
+
+
+def _paths(key):
+    folder = os.path.join(EXTRACTION_CACHE_DIR, key[:2])
+    return os.path.join(folder, key + ".md"), os.path.join(folder, key + ".json")
+
+
+def get_cached(key):
+    """Cached Markdown for key, or None."""
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    text_path, _ = _paths(key)
+    try:
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(text_path)  # recency for eviction
+    return text
+
+
+def put_cached(key, text, file_path, seconds=None):
+    if not EXTRACTION_CACHE_ENABLED:
+        return
+    text_path, meta_path = _paths(key)
+    os.makedirs(os.path.dirname(text_path), exist_ok=True)
+    meta = {
+        "file_name": os.path.basename(file_path),
+        "key": key,
+        "chars": len(text),
+        "extracted_at": int(time.time()),
+        "extract_seconds": round(seconds, 3) if seconds is not None else None
+    }
+    for path, write in ((text_path, lambda f: f.write(text)), (meta_path, lambda f: json.dump(meta, f, indent=2))):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+
+def _claim(key):
+    """(True, event) if the caller extracts key now, (False, event) if another thread already is."""
+    with _inflight_lock:
+        event = _inflight.get(key)
+        if event is not None:
+            return False, event
+        event = _inflight[key] = threading.Event()
+        return True, event
+
+
+def _count(name):
+    with _inflight_lock:
+        _stats[name] += 1
+
+
+def _release(key):
+    with _inflight_lock:
+        event = _inflight.pop(key, None)
+    if event is not None:
+        event.set()
+
+
+def iter_extracted_cached(files, digests=None, extract=iter_extracted, **extract_kwargs):
+    """
+    iter_extracted with the cache in front: cached files are yielded without
+    conversion, the rest are converted in the worker pool and stored. Files
+    another thread is already converting are waited for instead of converted twice.
+
+    :param files: iterable of (key, file_path) pairs
+    :param digests: optional {key: content hash} already computed by the caller
+    :param extract: the converter, iter_extracted or iter_extracted_reused
+    """
+    digests = digests or {}
+    to_extract, waiting, owned = [], [], {}
+
+    for key, file_path in files:
+        ckey = cache_key(file_path, digests.get(key))
+        text = get_cached(ckey)
+        if text is not None:
+            _count("hits")
+            yield {"key": key, "file_path": file_path, "content": text, "error": None}
+            continue
+        mine, event = _claim(ckey)
+        if mine:
+            owned[key] = ckey
+            to_extract.append((key, file_path))
+        else:
+            waiting.append((key, file_path, ckey, event))
+
+    try:
+        started = time.monotonic()
+        for res in extract(to_extract, **extract_kwargs):
+            ckey = owned.pop(res["key"])
+            _count("misses")
+            if not res["error"]:
+                put_cached(ckey, res["content"], res["file_path"], time.monotonic() - started)
+            _release(ckey)
+            started = time.monotonic()
+            yield res
+    finally:
+        for ckey in owned.values():
+            _release(ckey)
+
+    for key, file_path, ckey, event in waiting:
+        event.wait()
+        text = get_cached(ckey)
+        if text is not None:
+            _count("hits")
+            yield {"key": key, "file_path": file_path, "content": text, "error": None}
+        else:
+            # The other conversion failed: try once more here
+            yield from iter_extracted_cached([(key, file_path)], extract=extract, **extract_kwargs)
+
+    if to_extract:
+        prune_extraction_cache()
+
+
+def extract_cached(file_path):
+    """Markdown of one file, from the cache or converted (and cached) now; raises on failure."""
+    # Called once per file (insert_db, extract_text_from_document): keep the worker between calls
+    for res in iter_extracted_cached([(file_path, file_path)], extract=iter_extracted_reused):
+        if res["error"]:
+            raise RuntimeError(res["error"])
+        return res["content"]
+
+
+def prefetch_extraction(file_paths):
+    """Convert files into the cache in the background (one batch at a time)."""
+    if not EXTRACTION_CACHE_ENABLED or not file_paths:
+        return None
+
+    def run():
+        for res in iter_extracted_cached([(p, p) for p in file_paths]):
+            if res["error"]:
+                print(f"⚠️ Background extraction of {os.path.basename(res['file_path'])} failed: {res['error']}")
+        print(f"📝 Pre-extracted {len(file_paths)} uploaded files")
+
+    return _prefetcher.submit(run)
+
+
+def prune_extraction_cache(max_mb=EXTRACTION_CACHE_MAX_MB):
+    """Delete least recently used entries until the cache is under max_mb."""
+    if not EXTRACTION_CACHE_ENABLED or not os.path.isdir(EXTRACTION_CACHE_DIR):
+        return 0
+    entries, total = [], 0
+    for folder, _, names in os.walk(EXTRACTION_CACHE_DIR):
+        for name in names:
+            if name.endswith(".md"):
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+    limit = max_mb * 1024 * 1024
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        for p in (path, path[:-3] + ".json"):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def extraction_cache_stats():
+    with _inflight_lock:
+        return {"enabled": EXTRACTION_CACHE_ENABLED, **_stats}
@@ -0,0 +1,95 @@
+# lexical.py
+# Keyword retrieval over the BM25 (FTS5) index kept in each docstore, and
+# reciprocal rank fusion with the vector results. Keyword-like questions
+# (course codes, room numbers, emails) are answered from the lexical index
+# alone, without an embedding call; other questions fuse both rankings.
+
+import os
+import re
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from embedding.shards import iter_stores
+
+load_dotenv()
+
+LEXICAL_ENABLED = os.getenv("LEXICAL_ENABLED", "True").lower() == "true"
+LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "True").lower() == "true"
+LEXICAL_FAST_PATH_MAX_WORDS = int(os.getenv("LEXICAL_FAST_PATH_MAX_WORDS", 4))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 3))  # candidates per ranking = top_k * this
+RRF_K = int(os.getenv("RRF_K", 60))
+
+MAX_QUERY_TERMS = 32
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+# Letters and digits mixed (CS101, B204), long numbers, emails
+_IDENTIFIER_RE = re.compile(r"\S+@\S+\.\w+|\b(?=\w*\d)(?=\w*[^\W\d_])\w+\b|\b\d{3,}\b", re.UNICODE)
+
+
+def terms(text):
+    return [t.lower() for t in _TERM_RE.findall(text)][:MAX_QUERY_TERMS]
+
+
+def identifiers(question):
+    """Identifier-like tokens of a question."""
+    return _IDENTIFIER_RE.findall(question)
+
+
+def is_keyword_query(question):
+    """Short and containing an identifier: a lookup rather than a question in prose."""
+    return len(question.split()) <= LEXICAL_FAST_PATH_MAX_WORDS and bool(identifiers(question))
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def any_terms_query(question):
+    """FTS5 expression matching chunks with any of the question's words (ranked by BM25)."""
+    return " OR ".join(_quote(t) for t in dict.fromkeys(terms(question)))
+
+
+def identifier_query(question):
+    """FTS5 expression requiring every identifier (each as a phrase, e.g. an email's parts in order)."""
+    phrases = [" ".join(terms(ident)) for ident in identifiers(question)]
+    return " AND ".join(_quote(p) for p in dict.fromkeys(phrases) if p)
+
+
+def lexical_search(vector_store, match, k):
+    """
+    Top-k (Document, BM25 score) over all shards, or None when the store has
+    no lexical index (e.g. a legacy snapshot not rebuilt since).
+    """
+    if not match:
+        return []
+    hits = []
+    for store in iter_stores(vector_store):
+        search = getattr(store.docstore, "lexical_search", None)
+        found = search(match, k) if search else None
+        if found is None:
+            return None
+        hits += [(score, store, id_) for id_, score in found]
+    hits.sort(key=lambda h: -h[0])
+    results = []
+    for score, store, id_ in hits[:k]:
+        doc = store.docstore.search(id_)
+        if isinstance(doc, Document):
+            results.append((doc, score))
+    return results
+
+
+def keyword_lookup(vector_store, question, k):
+    """Documents for a keyword-like question from the lexical index alone, or None to fall back."""
+    if not (LEXICAL_ENABLED and LEXICAL_FAST_PATH and is_keyword_query(question)):
+        return None
+    hits = lexical_search(vector_store, identifier_query(question), k)
+    return [doc for doc, _ in hits] if hits else None
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """Merge ranked Document lists: score = sum of 1 / (rrf_k + rank) over the lists a chunk is in."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.id or id(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return [docs[key] for key in sorted(scores, key=lambda key: -scores[key])[:k]]
@@ -0,0 +1,125 @@
+# maintenance.py
+# Index compaction: checks that every FAISS position maps to a chunk in the
+# docstore and back, drops what does not (vectors without chunks, chunks
+# without vectors, repeated copies of the same chunk), and re-creates the
+# index from the kept vectors so IVF / PQ structures are retrained on the
+# current data. build_index.compact_index publishes the result as a snapshot.
+
+import os
+import glob
+import json
+import shutil
+import hashlib
+from langchain_core.documents import Document
+from embedding.vector_index import FAISS_INDEX_TYPE, FAISS_VECTOR_CODEC, rebuild_index
+from embedding.snapshots import SNAPSHOTS_DIR, BACKUPS_DIR
+
+# Failed loads used to move the whole index here, next to it or in the cwd
+BACKUP_PATTERN = "faiss_index_backup_*"
+
+
+def dir_size(path, skip=(SNAPSHOTS_DIR, BACKUPS_DIR)):
+    """Bytes of the files under path (not following the snapshots / backups folders of a legacy root)."""
+    total = 0
+    for folder, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if not (folder == path and d in skip)]
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+    return total
+
+
+def _content_key(doc):
+    """Same text from the same file(s) = the same chunk."""
+    sources = doc.metadata.get("sources") or [doc.metadata.get("source")]
+    return hashlib.sha1((json.dumps(sources) + "\0" + doc.page_content).encode("utf-8")).digest()
+
+
+def compact_store(vector_store, index_type=FAISS_INDEX_TYPE, codec=FAISS_VECTOR_CODEC):
+    """
+    Compact one (unsharded) store in place.
+    Returns a stats dict and {dropped duplicate id: kept id} for the manifest.
+    """
+    stats = {"vectors_before": vector_store.index.ntotal, "dangling_vectors": 0,
+             "duplicate_chunks": 0, "orphaned_chunks": 0}
+    docstore = vector_store.docstore
+    keep, kept_ids, doomed, remap, seen = [], set(), set(), {}, {}
+
+    for position, id_ in sorted(vector_store.index_to_docstore_id.items()):
+        doc = docstore.search(id_) if position < vector_store.index.ntotal else None
+        if not isinstance(doc, Document):
+            # Position past the end of the index, or a chunk the docstore lost
+            stats["dangling_vectors"] += 1
+            continue
+        if id_ in kept_ids:
+            stats["duplicate_chunks"] += 1
+            continue
+        key = _content_key(doc)
+        if key in seen:
+            stats["duplicate_chunks"] += 1
+            remap[id_] = seen[key]
+            doomed.add(id_)
+            continue
+        seen[key] = id_
+        kept_ids.add(id_)
+        keep.append(position)
+    # Vectors at positions missing from the map are dropped by the rebuild as well
+    mapped = sum(1 for p in vector_store.index_to_docstore_id if p < vector_store.index.ntotal)
+    stats["dangling_vectors"] += vector_store.index.ntotal - mapped
+
+    orphaned = [id_ for id_ in docstore.ids() if id_ not in kept_ids and id_ not in doomed]
+    stats["orphaned_chunks"] = len(orphaned)
+    docstore.delete(list(doomed) + orphaned)
+
+    # Fresh layout for the configured type/codec, retrained on the kept vectors
+    rebuild_index(vector_store, index_type, codec, keep=keep)
+    docstore.vacuum()
+    stats["vectors_after"] = vector_store.index.ntotal
+    return stats, remap
+
+
+def verify_store(vector_store):
+    """List of mapping problems (empty when every position has a chunk and every chunk a position)."""
+    problems = []
+    positions = vector_store.index_to_docstore_id
+    if len(positions) != vector_store.index.ntotal:
+        problems.append(f"{vector_store.index.ntotal} vectors but {len(positions)} mapped positions")
+    if sorted(positions) != list(range(len(positions))):
+        problems.append("positions are not contiguous")
+    ids = list(positions.values())
+    if len(set(ids)) != len(ids):
+        problems.append("chunk ids mapped to several positions")
+    if set(ids) != set(vector_store.docstore.ids()):
+        problems.append("docstore chunks and mapped ids differ")
+    raw = getattr(vector_store, "raw_index", None)
+    if raw is not None and raw.ntotal != vector_store.index.ntotal:
+        problems.append(f"raw index has {raw.ntotal} vectors, index {vector_store.index.ntotal}")
+    return problems
+
+
+def find_backups(index_path):
+    """
+    Snapshots set aside by failed loads (<index>/backups/*), and the
+    faiss_index_backup_<ts> folders older versions left next to the index or
+    in the cwd.
+    """
+    folders = {os.getcwd(), os.path.dirname(os.path.abspath(index_path))}
+    found = {p for p in glob.glob(os.path.join(index_path, BACKUPS_DIR, "*")) if os.path.isdir(p)}
+    for folder in folders:
+        found.update(p for p in glob.glob(os.path.join(folder, BACKUP_PATTERN)) if os.path.isdir(p))
+    return sorted(found)
+
+
+def remove_backups(paths):
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+    from embedding.build_index import compact_index
+
+    result = compact_index(dry_run="--dry-run" in sys.argv, delete_backups="--delete-backups" in sys.argv)
+    print(json.dumps(result, indent=2))
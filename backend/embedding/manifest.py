@@ -0,0 +1,96 @@
+# manifest.py
+# Tracks which files are in the FAISS index (content hash + chunk ids per file)
+# so build_index only re-embeds what actually changed.
+
+import os
+import json
+import time
+import hashlib
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """sha256 of the file bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def load_manifest(index_path):
+    """Load the manifest stored next to the index, or an empty one."""
+    path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return empty_manifest()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read manifest {path}: {e}")
+        return empty_manifest()
+    if manifest.get("version") != MANIFEST_VERSION:
+        return empty_manifest()
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(manifest, index_path):
+    """Write the manifest atomically (tmp file + rename)."""
+    os.makedirs(index_path, exist_ok=True)
+    path = os.path.join(index_path, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def diff_manifest(manifest, current_hashes, prune_removed=True):
+    """
+    Compare the manifest with the files currently on disk.
+
+    :param current_hashes: {relative path: content hash} of the folder being indexed
+    :param prune_removed: treat manifest entries missing from the folder as removed
+    :return: dict with "new", "changed", "unchanged" and "removed" lists of paths
+    """
+    known = manifest["files"]
+    diff = {"new": [], "changed": [], "unchanged": [], "removed": []}
+
+    for rel_path, digest in current_hashes.items():
+        entry = known.get(rel_path)
+        if entry is None:
+            diff["new"].append(rel_path)
+        elif entry.get("hash") != digest:
+            diff["changed"].append(rel_path)
+        else:
+            diff["unchanged"].append(rel_path)
+
+    if prune_removed:
+        diff["removed"] = [p for p in known if p not in current_hashes]
+
+    return diff
+
+
+def record_file(manifest, rel_path, digest, chunk_ids):
+    manifest["files"][rel_path] = {
+        "hash": digest,
+        "chunk_ids": list(chunk_ids),
+        "indexed_at": int(time.time())
+    }
+
+
+def forget_file(manifest, rel_path):
+    """Drop a file from the manifest and return the chunk ids it owned."""
+    entry = manifest["files"].pop(rel_path, None)
+    return entry.get("chunk_ids", []) if entry else []
+
+
+def referenced_chunk_ids(manifest):
+    """Chunk ids used by any file (deduplicated chunks can be shared by several)."""
+    return {id_ for entry in manifest["files"].values() for id_ in entry.get("chunk_ids", [])}
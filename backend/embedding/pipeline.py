@@ -0,0 +1,175 @@
+# pipeline.py
+# Streaming ingest: extract -> split -> embed in batches -> add to FAISS.
+# Stages are generators joined by bounded queues, so memory stays at a few
+# batches whatever the folder size, and extraction of the next files overlaps
+# embedding of the current ones.
+
+import os
+import queue
+import threading
+from dotenv import load_dotenv
+from embedding.vector_index import add_vectors, add_document
+
+load_dotenv()
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 2))
+
+_DONE = object()
+
+
+def prefetch(iterable, maxsize=PIPELINE_QUEUE_SIZE):
+    """
+    Run `iterable` in a background thread, buffering at most `maxsize` items.
+    Exceptions are re-raised in the consumer; closing the consumer stops the producer.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((None, item)):
+                    break
+        except BaseException as e:
+            put((e, None))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None and stop.is_set():
+                close()
+            put((None, _DONE))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            error, item = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+
+def iter_batches(extracted, split_fn, make_ids, batch_size=EMBED_BATCH_SIZE, dedup=None):
+    """
+    Split extracted files into chunks and group them into embedding batches.
+    With a dedup.ChunkDeduper, near-duplicates of already kept chunks are
+    dropped here, before embedding; the file then references the canonical chunk.
+
+    split_fn(text, source) returns (start, end, metadata) spans. Each batch is a
+    dict with "texts" (sliced for embedding only), "spans" ((doc_id, start, end)
+    per text), "metadatas", "ids", "documents" ({doc_id: full text} to store once,
+    in the batch holding the document's first kept chunk), plus "completed"
+    (files whose last chunk is in this batch) and "failed" (extraction errors),
+    so the consumer can update the manifest once a file is fully stored.
+    """
+    batch = _new_batch()
+
+    for res in extracted:
+        if res["error"]:
+            batch["failed"].append(res)
+            continue
+
+        source = os.path.basename(res["file_path"])
+        content = res["content"]
+        spans = split_fn(content, source) if content.strip() else []
+        ids = make_ids(len(spans))
+        doc_id = make_ids(1)[0]
+        stored = False
+        res = {"key": res["key"], "file_path": res["file_path"], "chunk_ids": [], "char_count": len(content)}
+
+        for (start, end, metadata), chunk_id in zip(spans, ids):
+            text = content[start:end]
+            if dedup is not None:
+                canonical = dedup.check(text, chunk_id, source)
+                if canonical is not None:
+                    if canonical not in res["chunk_ids"]:
+                        res["chunk_ids"].append(canonical)
+                    continue
+            if not stored:
+                batch["documents"][doc_id] = content
+                stored = True
+            res["chunk_ids"].append(chunk_id)
+            batch["texts"].append(text)
+            batch["spans"].append((doc_id, start, end))
+            batch["metadatas"].append(metadata)
+            batch["ids"].append(chunk_id)
+            if len(batch["texts"]) >= batch_size:
+                yield batch
+                batch = _new_batch()
+        batch["completed"].append(res)
+
+    if batch["texts"] or batch["completed"] or batch["failed"]:
+        yield batch
+
+
+def _new_batch():
+    return {"texts": [], "spans": [], "metadatas": [], "ids": [], "documents": {}, "completed": [], "failed": []}
+
+
+def embed_batches(batches, embeddings):
+    """Attach "vectors" to every batch (empty batches skip the API)."""
+    for batch in batches:
+        batch["vectors"] = embeddings.embed_documents(batch["texts"]) if batch["texts"] else []
+        yield batch
+
+
+def run_ingest(extracted, vector_store, embeddings, split_fn, make_ids,
+               on_file_done=None, on_file_failed=None, batch_size=EMBED_BATCH_SIZE,
+               scheduler=None, on_progress=None, dedup=None):
+    """
+    Drive the pipeline to completion, adding vectors to `vector_store` on the calling thread.
+
+    :param extracted: iterator of extraction results (see extraction.iter_extracted)
+    :param on_file_done: callback(result) once all of a file's chunks are in the store;
+                         result has "key", "file_path", "chunk_ids", "char_count"
+    :param on_file_failed: callback(result) for files that failed extraction
+    :param scheduler: optional EmbeddingScheduler for concurrent, rate-limit-aware embedding
+    :param on_progress: callback(stats) after every batch is stored
+    :param dedup: optional dedup.ChunkDeduper to drop near-duplicate chunks before embedding
+    :return: {"chunks_created", "chunks_deduplicated", "documents_processed", "documents_failed"}
+    """
+    stats = {"chunks_created": 0, "chunks_deduplicated": 0, "documents_processed": 0, "documents_failed": 0}
+
+    stage = prefetch(extracted)
+    stage = prefetch(iter_batches(stage, split_fn, make_ids, batch_size, dedup=dedup))
+    if scheduler is not None:
+        stage = prefetch(scheduler.embed_batches(stage))
+    else:
+        stage = prefetch(embed_batches(stage, embeddings))
+
+    for batch in stage:
+        sources = {span[0]: metadata.get("source") for span, metadata in zip(batch["spans"], batch["metadatas"])}
+        for doc_id, text in batch["documents"].items():
+            add_document(vector_store, doc_id, text, source=sources.get(doc_id))
+        if batch["texts"]:
+            add_vectors(vector_store, batch["texts"], batch["vectors"], batch["metadatas"], batch["ids"],
+                        spans=batch["spans"])
+            stats["chunks_created"] += len(batch["texts"])
+        for res in batch["completed"]:
+            stats["documents_processed"] += 1
+            if on_file_done:
+                on_file_done(res)
+        for res in batch["failed"]:
+            stats["documents_failed"] += 1
+            if on_file_failed:
+                on_file_failed(res)
+        if dedup is not None:
+            stats["chunks_deduplicated"] = dedup.dropped
+        if on_progress:
+            on_progress(stats)
+
+    return stats
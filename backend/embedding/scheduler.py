@@ -0,0 +1,192 @@
+# scheduler.py
+# Concurrent embedding of batches with adaptive (AIMD) concurrency:
+# a 429 halves the number of in-flight requests and pauses new ones,
+# successes grow it back. Only the failed batch is retried.
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 8))
+EMBED_BACKOFF_BASE_S = float(os.getenv("EMBED_BACKOFF_BASE_S", 1.0))
+EMBED_BACKOFF_MAX_S = float(os.getenv("EMBED_BACKOFF_MAX_S", 60.0))
+
+
+class EmbeddingRateLimitError(Exception):
+    """Raised when a batch is still rate limited after all retries."""
+
+
+def _status_code(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_rate_limit_error(exc):
+    if isinstance(exc, EmbeddingRateLimitError) or _status_code(exc) == 429:
+        return True
+    msg = str(exc).lower()
+    return "429" in msg or "rate limit" in msg or "quota" in msg
+
+
+def _is_transient_error(exc):
+    code = _status_code(exc)
+    if code is not None:
+        return code >= 500
+    return type(exc).__name__ in ("TimeoutException", "ReadTimeout", "ConnectTimeout", "ConnectError")
+
+
+def _retry_after(exc):
+    """Seconds requested by a Retry-After header, if any."""
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class _AdaptiveLimiter:
+    """Semaphore whose size shrinks on throttling and grows back on success."""
+
+    def __init__(self, max_limit):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.active = 0
+        self.paused_until = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.active < self.limit:
+                    self.active += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, throttled_for=None):
+        with self._cond:
+            self.active -= 1
+            if throttled_for is not None:
+                self.limit = max(1, self.limit // 2)
+                self.paused_until = max(self.paused_until, time.monotonic() + throttled_for)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class EmbeddingScheduler:
+    """
+    Embed batches of texts concurrently against a rate-limited API.
+
+    Batches are yielded back in input order, so callers can rely on
+    ordering (e.g. a file's last chunk arriving after its first ones).
+    """
+
+    def __init__(self, embeddings, max_concurrency=EMBED_CONCURRENCY, max_retries=EMBED_MAX_RETRIES,
+                 backoff_base=EMBED_BACKOFF_BASE_S, backoff_max=EMBED_BACKOFF_MAX_S):
+        self.embeddings = embeddings
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiter = _AdaptiveLimiter(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.chunks_embedded = 0
+        self.batches_embedded = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._busy_seconds = 0.0
+        self._started = None
+
+    def _backoff(self, attempt, exc):
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)
+        return delay
+
+    def embed(self, texts):
+        """Embed one batch, retrying it alone on 429 / transient failures."""
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                if not (rate_limited or _is_transient_error(e)) or attempt >= self.max_retries:
+                    self._limiter.release()
+                    if rate_limited:
+                        raise EmbeddingRateLimitError(
+                            f"Embedding API still rate limited after {attempt} retries: {e}"
+                        ) from e
+                    raise
+                delay = self._backoff(attempt, e)
+                # Only throttling shrinks concurrency; a 5xx just retries this batch
+                self._limiter.release(throttled_for=delay if rate_limited else None)
+                with self._lock:
+                    self.retries += 1
+                    self.rate_limited += int(rate_limited)
+                if not rate_limited:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+            self._limiter.release()
+            with self._lock:
+                self.chunks_embedded += len(texts)
+                self.batches_embedded += 1
+            return vectors
+
+    def embed_batches(self, batches):
+        """
+        Pipeline stage: attach "vectors" to every batch dict ({"texts": [...], ...}),
+        keeping up to max_concurrency requests in flight.
+        """
+        self._started = time.monotonic()
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed") as pool:
+            try:
+                for batch in batches:
+                    future = pool.submit(self.embed, batch["texts"]) if batch["texts"] else None
+                    in_flight.append((batch, future))
+                    # Queue one batch beyond the worker count so no worker waits on input
+                    while len(in_flight) > self.max_concurrency:
+                        yield self._finish(*in_flight.popleft())
+                while in_flight:
+                    yield self._finish(*in_flight.popleft())
+            finally:
+                for _, future in in_flight:
+                    if future is not None:
+                        future.cancel()
+                self._busy_seconds += time.monotonic() - self._started
+                self._started = None
+
+    def _finish(self, batch, future):
+        batch["vectors"] = future.result() if future is not None else []
+        return batch
+
+    def stats(self):
+        elapsed = self._busy_seconds
+        if self._started is not None:
+            elapsed += time.monotonic() - self._started
+        return {
+            "chunks_embedded": self.chunks_embedded,
+            "batches_embedded": self.batches_embedded,
+            "chunks_per_second": round(self.chunks_embedded / elapsed, 2) if elapsed > 0 else 0.0,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "concurrency": self._limiter.limit,
+            "max_concurrency": self.max_concurrency
+        }
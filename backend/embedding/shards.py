@@ -0,0 +1,124 @@
+# shards.py
+# Sharded vector store: FAISS_SHARDS independent stores (index + docstore),
+# with every file's chunks in the shard picked by a hash of its name. A build
+# only rewrites the shards it changed (the others are hard-linked from the
+# previous snapshot) and searches fan out to all shards on a thread pool.
+
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FAISS_SHARDS = int(os.getenv("FAISS_SHARDS", 1))
+FAISS_SEARCH_THREADS = int(os.getenv("FAISS_SEARCH_THREADS", 0))  # 0 = one per shard, up to the CPU count
+
+SHARDS_DIR = "shards"
+
+if FAISS_SHARDS < 1:
+    raise ValueError(f"FAISS_SHARDS must be at least 1, got {FAISS_SHARDS}")
+
+_search_pool = None
+
+
+def search_pool(n_shards):
+    """Thread pool for fan-out searches (FAISS releases the GIL while searching)."""
+    global _search_pool
+    if _search_pool is None:
+        workers = FAISS_SEARCH_THREADS or min(n_shards, os.cpu_count() or 1)
+        _search_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="shard-search")
+    return _search_pool
+
+
+def shard_for(source, n_shards):
+    """Shard number of a file, from its name (the chunks' "source" metadata)."""
+    digest = hashlib.sha1(source.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n_shards
+
+
+def shard_dir(index_dir, i):
+    return os.path.join(index_dir, SHARDS_DIR, f"shard_{i:03d}")
+
+
+def is_sharded(vector_store):
+    return isinstance(vector_store, ShardedVectorStore)
+
+
+def iter_stores(vector_store):
+    """The plain FAISS stores behind a (possibly sharded) store."""
+    return vector_store.shards if is_sharded(vector_store) else [vector_store]
+
+
+class ShardedDocstore:
+    """
+    Docstore view over all shards. Writes keyed by chunk id go to every shard
+    and only touch the one holding the id; a shard whose rows changed is marked
+    dirty so the next save rewrites it.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _each(self):
+        return [(s, s.docstore) for s in self.store.shards]
+
+    def search(self, search):
+        for _, docstore in self._each():
+            doc = docstore.search(search)
+            if not isinstance(doc, str):
+                return doc
+        return f"ID {search} not found."
+
+    def update_metadata(self, id_, metadata):
+        for shard, docstore in self._each():
+            if docstore.update_metadata(id_, metadata):
+                shard.dirty = True
+
+    def add_signatures(self, signatures):
+        for shard, docstore in self._each():
+            if docstore.add_signatures(signatures):
+                shard.dirty = True
+
+    def signatures(self):
+        merged = {}
+        for _, docstore in self._each():
+            merged.update(docstore.signatures())
+        return merged
+
+    def ids_for_source(self, source):
+        return [id_ for _, docstore in self._each() for id_ in docstore.ids_for_source(source)]
+
+    def add_document(self, doc_id, text, source=None):
+        shard = self.store.shards[shard_for(source or "", len(self.store.shards))]
+        shard.docstore.add_document(doc_id, text)
+        shard.dirty = True
+
+
+class ShardedVectorStore:
+    """
+    A list of FAISS stores plus the shared embeddings. Functions in
+    vector_index / store / dedup accept it wherever they take a store.
+    Each shard carries `dirty` (changed since loading) and `source_dir`
+    (the snapshot folder it was loaded from, reused when not dirty).
+    """
+
+    def __init__(self, shards, embeddings, index_meta=None):
+        self.shards = shards
+        self.embeddings = embeddings
+        self.index_meta = index_meta
+        self.docstore = ShardedDocstore(self)
+        for shard in shards:
+            shard.dirty = getattr(shard, "dirty", False)
+            shard.source_dir = getattr(shard, "source_dir", None)
+
+    def shard_for(self, source):
+        return self.shards[shard_for(source, len(self.shards))]
+
+    @property
+    def ntotal(self):
+        return sum(s.index.ntotal for s in self.shards)
+
+    @property
+    def d(self):
+        return self.shards[0].index.d
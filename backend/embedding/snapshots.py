@@ -0,0 +1,175 @@
+# snapshots.py
+# Versioned, immutable index snapshots. Every build writes a new directory
+# under <index>/snapshots/ and then atomically repoints <index>/CURRENT at it,
+# so readers never see a half-written index and can switch versions while
+# serving. Superseded snapshots are deleted after a grace period, once
+# in-flight readers have moved on. A snapshot that fails to load is moved to
+# <index>/backups/ and CURRENT falls back to the previously published one.
+
+import os
+import time
+import shutil
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SNAPSHOTS_DIR = "snapshots"
+BACKUPS_DIR = "backups"
+CURRENT_FILE = "CURRENT"
+RETIRED_FILE = "RETIRED"
+SNAPSHOT_GRACE_S = int(os.getenv("SNAPSHOT_GRACE_S", 600))
+SNAPSHOT_POLL_S = float(os.getenv("SNAPSHOT_POLL_S", 2))
+
+# Files of an index saved directly in index_path, before snapshots
+LEGACY_FILES = ("index.faiss", "index.pkl", "docstore.sqlite3", "raw.faiss", "index_meta.json", "manifest.json")
+
+
+def current_snapshot(index_path):
+    """Name of the published snapshot, or None (no index, or legacy flat layout)."""
+    path = os.path.join(index_path, CURRENT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_dir(index_path, name):
+    """Directory of snapshot `name`; index_path itself for the legacy layout (None)."""
+    if name is None:
+        return index_path
+    return os.path.join(index_path, SNAPSHOTS_DIR, name)
+
+
+def current_index_dir(index_path):
+    """Directory holding the current index files."""
+    return snapshot_dir(index_path, current_snapshot(index_path))
+
+
+def new_snapshot_dir(index_path):
+    """Create an empty, unpublished snapshot directory and return (name, path)."""
+    root = os.path.join(index_path, SNAPSHOTS_DIR)
+    os.makedirs(root, exist_ok=True)
+    base = time.strftime("v%Y%m%d-%H%M%S")
+    name, n = base, 1
+    while True:
+        path = os.path.join(root, name)
+        try:
+            os.mkdir(path)
+            return name, path
+        except FileExistsError:
+            n += 1
+            name = f"{base}-{n}"
+
+
+def publish_snapshot(index_path, name):
+    """Atomically make `name` the current snapshot and mark the previous one retired."""
+    previous = current_snapshot(index_path)
+    path = os.path.join(index_path, CURRENT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp_path, path)
+
+    if previous is None:
+        # First snapshot over a legacy flat layout: retire those files
+        if any(os.path.isfile(os.path.join(index_path, f)) for f in LEGACY_FILES):
+            _mark_retired(index_path)
+    elif previous != name and os.path.isdir(os.path.join(index_path, SNAPSHOTS_DIR, previous)):
+        _mark_retired(os.path.join(index_path, SNAPSHOTS_DIR, previous))
+    print(f"📌 Published index snapshot {name}")
+
+
+def quarantine_current(index_path):
+    """
+    Move the current snapshot (or the legacy flat layout's files) to
+    <index>/backups/ and unpublish it. Returns the backup folder.
+    """
+    name = current_snapshot(index_path)
+    backup = os.path.join(index_path, BACKUPS_DIR, f"{name or 'legacy'}-{int(time.time())}")
+    os.makedirs(backup, exist_ok=True)
+    if name is None:
+        for file_name in LEGACY_FILES + (RETIRED_FILE,):
+            path = os.path.join(index_path, file_name)
+            if os.path.isfile(path):
+                shutil.move(path, os.path.join(backup, file_name))
+        return backup
+    shutil.move(snapshot_dir(index_path, name), os.path.join(backup, name))
+    os.remove(os.path.join(index_path, CURRENT_FILE))
+    return backup
+
+
+def restore_previous(index_path):
+    """
+    Make the most recently retired snapshot (one that was published, and not
+    yet deleted by gc_snapshots) current again. Returns its name, or None.
+    """
+    root = os.path.join(index_path, SNAPSHOTS_DIR)
+    if not os.path.isdir(root):
+        return None
+    retired = []
+    for name in os.listdir(root):
+        marker = os.path.join(root, name, RETIRED_FILE)
+        if os.path.exists(marker):
+            try:
+                retired.append((_retired_since(os.path.join(root, name)), name))
+            except (OSError, ValueError):
+                continue
+    if not retired:
+        return None
+    name = max(retired)[1]
+    os.remove(os.path.join(root, name, RETIRED_FILE))
+    publish_snapshot(index_path, name)
+    return name
+
+
+def _mark_retired(path):
+    with open(os.path.join(path, RETIRED_FILE), "w", encoding="utf-8") as f:
+        f.write(str(int(time.time())))
+
+
+def _retired_since(path):
+    """When the snapshot at path was retired (its mtime if it never was published)."""
+    retired = os.path.join(path, RETIRED_FILE)
+    if os.path.exists(retired):
+        with open(retired, "r", encoding="utf-8") as f:
+            return float(f.read().strip() or 0)
+    return os.path.getmtime(path)
+
+
+def gc_snapshots(index_path, grace_s=SNAPSHOT_GRACE_S):
+    """
+    Delete snapshots retired more than grace_s seconds ago, and abandoned
+    (never published) ones older than that. Returns the deleted names.
+    """
+    root = os.path.join(index_path, SNAPSHOTS_DIR)
+    if not os.path.isdir(root):
+        return []
+    current = current_snapshot(index_path)
+    now = time.time()
+    deleted = []
+
+    # A legacy flat layout is superseded by the first published snapshot
+    legacy_marker = os.path.join(index_path, RETIRED_FILE)
+    if current is not None and os.path.exists(legacy_marker) and now - _retired_since(index_path) >= grace_s:
+        for name in LEGACY_FILES:
+            path = os.path.join(index_path, name)
+            if os.path.isfile(path):
+                os.remove(path)
+                deleted.append(name)
+        os.remove(legacy_marker)
+
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name == current or not os.path.isdir(path):
+            continue
+        try:
+            since = _retired_since(path)
+        except (OSError, ValueError):
+            continue
+        if now - since >= grace_s:
+            shutil.rmtree(path, ignore_errors=True)
+            deleted.append(name)
+    if deleted:
+        print(f"🧹 Removed {len(deleted)} old index snapshots")
+    return deleted
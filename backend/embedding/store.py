@@ -0,0 +1,243 @@
+# store.py
+# Loading and saving the FAISS vector store: the FAISS index, the SQLite
+# docstore (chunk text, metadata and the position -> id map), the raw float32
+# vectors kept next to a compressed index for exact re-ranking, and the
+# index_meta.json sidecar describing how the index was built. A sharded store
+# keeps one such store per shard under shards/ and a sidecar at the top.
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import faiss
+from langchain_community.vectorstores import FAISS
+from embedding.docstore import DOCSTORE_FILE, SQLiteDocstore, SQLiteIdMap
+from embedding.shards import SHARDS_DIR, ShardedVectorStore, is_sharded, shard_dir
+from embedding.vector_index import FAISS_RERANK_FACTOR
+
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+RAW_INDEX_FILE = "raw.faiss"
+META_FILE = "index_meta.json"
+
+
+class IndexMismatchError(ValueError):
+    """The index on disk was built with a different embedding model or dimension."""
+
+
+def read_index_meta(index_path):
+    """The sidecar dict, or None for indexes saved before it existed."""
+    path = os.path.join(index_path, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_index_meta(index_path, meta):
+    path = os.path.join(index_path, META_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def check_index_meta(meta, embedding_model, dimension=None):
+    """Raise IndexMismatchError if the sidecar disagrees with the configured model."""
+    if not meta:
+        return
+    if meta.get("embedding_model") != embedding_model:
+        raise IndexMismatchError(
+            f"Index was built with embedding model {meta.get('embedding_model')!r} but "
+            f"{embedding_model!r} is configured; rebuild the index or change MISTRAL_EMBED_MODEL"
+        )
+    if dimension is not None and meta.get("dimension") != dimension:
+        raise IndexMismatchError(
+            f"Index dimension {meta.get('dimension')} does not match embedding dimension {dimension}"
+        )
+
+
+def read_only_flags(path):
+    """
+    faiss read flags that map the file instead of reading it: IVF inverted
+    lists are mapped by IO_FLAG_MMAP, flat / SQ / PQ codes (incl. HNSW storage
+    and raw.faiss) only by IO_FLAG_MMAP_IFC. The fourcc at the start of the
+    file tells which ("Iw.." / "Iv.." = IVF).
+    """
+    with open(path, "rb") as f:
+        fourcc = f.read(4)
+    if fourcc[:2] in (b"Iw", b"Iv"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def store_exists(index_path):
+    """Whether index_path holds a saved store (plain or sharded)."""
+    return (os.path.exists(os.path.join(index_path, INDEX_FILE))
+            or os.path.isdir(os.path.join(index_path, SHARDS_DIR)))
+
+
+def load_store(index_path, embeddings, read_only=False, embedding_model=None):
+    """
+    Load the vector store saved at index_path.
+    With read_only, the vector codes of the FAISS index and the raw vectors are
+    memory-mapped instead of read into RAM (see read_only_flags; an HNSW graph
+    is still read) and chunks are read from the SQLite docstore only when a
+    search returns them, so pages load on demand. The store must not be
+    modified in that mode.
+    Otherwise the docstore is copied to a scratch file that build steps modify
+    until save_store writes it back.
+    If embedding_model is given, the sidecar is checked first (no API call) and
+    IndexMismatchError is raised when the index was built with another model.
+    """
+    meta = read_index_meta(index_path)
+    if embedding_model is not None:
+        check_index_meta(meta, embedding_model)
+
+    if os.path.isdir(os.path.join(index_path, SHARDS_DIR)):
+        n_shards = meta["shards"] if meta else len(os.listdir(os.path.join(index_path, SHARDS_DIR)))
+        shards = []
+        for i in range(n_shards):
+            shard = load_store(shard_dir(index_path, i), embeddings, read_only=read_only)
+            shard.source_dir = shard_dir(index_path, i)
+            shards.append(shard)
+        return ShardedVectorStore(shards, embeddings, index_meta=meta)
+
+    index_file = os.path.join(index_path, INDEX_FILE)
+    flags = read_only_flags(index_file) if read_only else 0
+    docstore_path = os.path.join(index_path, DOCSTORE_FILE)
+    if os.path.exists(docstore_path):
+        index = faiss.read_index(index_file, flags)
+        if read_only:
+            docstore = SQLiteDocstore(docstore_path, read_only=True)
+            index_to_docstore_id = SQLiteIdMap(docstore)
+        else:
+            docstore = SQLiteDocstore.scratch(docstore_path)
+            index_to_docstore_id = docstore.load_positions()
+        vector_store = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id
+        )
+    else:
+        # Indexes saved before the SQLite docstore: read the pickle once, the
+        # next save_store converts them
+        print("⚠️ Loading legacy pickled docstore; it is converted on the next save")
+        vector_store = FAISS.load_local(
+            index_path, embeddings, allow_dangerous_deserialization=True, io_flags=flags
+        )
+        if not read_only:
+            # Builds always work on a SQLite docstore
+            vector_store.docstore = SQLiteDocstore.scratch().copy_from(
+                vector_store.docstore, vector_store.index_to_docstore_id.values()
+            )
+
+    raw_path = os.path.join(index_path, RAW_INDEX_FILE)
+    vector_store.raw_index = None
+    if os.path.exists(raw_path):
+        # Mapped when read-only: a re-rank only pages in its candidates' rows
+        vector_store.raw_index = faiss.read_index(raw_path, read_only_flags(raw_path) if read_only else 0)
+    vector_store.index_meta = meta
+    return vector_store
+
+
+def save_store(vector_store, index_path, meta=None):
+    """
+    Save the store; `meta` (embedding model, chunking settings, ...) is written
+    to the sidecar along with the dimension, metric and vector count.
+    Files are written to a temporary folder and renamed into place, so a process
+    that has the previous files memory-mapped keeps reading intact data.
+    """
+    if is_sharded(vector_store):
+        save_sharded_store(vector_store, index_path, meta)
+        return
+
+    os.makedirs(index_path, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".saving_", dir=index_path)
+    try:
+        faiss.write_index(vector_store.index, os.path.join(tmp_dir, INDEX_FILE))
+        save_docstore(vector_store, os.path.join(tmp_dir, DOCSTORE_FILE))
+        # raw.faiss only serves the exact re-rank; without it the file is left out
+        raw = getattr(vector_store, "raw_index", None) if FAISS_RERANK_FACTOR > 0 else None
+        if raw is not None:
+            faiss.write_index(raw, os.path.join(tmp_dir, RAW_INDEX_FILE))
+
+        sidecar = dict(getattr(vector_store, "index_meta", None) or {})
+        sidecar.update(meta or {})
+        sidecar.update({
+            "dimension": vector_store.index.d,
+            "metric": "l2",
+            "vector_count": vector_store.index.ntotal,
+            "saved_at": int(time.time())
+        })
+        write_index_meta(tmp_dir, sidecar)
+
+        for name in os.listdir(tmp_dir):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(index_path, name))
+        if raw is None and os.path.exists(os.path.join(index_path, RAW_INDEX_FILE)):
+            os.remove(os.path.join(index_path, RAW_INDEX_FILE))
+        if os.path.exists(os.path.join(index_path, LEGACY_DOCSTORE_FILE)):
+            os.remove(os.path.join(index_path, LEGACY_DOCSTORE_FILE))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    vector_store.index_meta = sidecar
+
+
+def save_docstore(vector_store, path):
+    """Write the store's chunks and position map to a SQLite docstore file at path."""
+    docstore = vector_store.docstore
+    positions = vector_store.index_to_docstore_id
+    if isinstance(docstore, SQLiteDocstore):
+        docstore.save_to(path, positions)
+        return
+    # In-memory (legacy) docstore: copy the documents over
+    converted = SQLiteDocstore(path).copy_from(docstore, positions.values())
+    try:
+        converted.write_positions(positions)
+    finally:
+        converted.close()
+
+
+def link_store_files(source_dir, index_path):
+    """Hard-link (or copy, across filesystems) the files of a saved store into index_path."""
+    os.makedirs(index_path, exist_ok=True)
+    for name in os.listdir(source_dir):
+        src = os.path.join(source_dir, name)
+        if not os.path.isfile(src):
+            continue
+        try:
+            os.link(src, os.path.join(index_path, name))
+        except OSError:
+            shutil.copy2(src, os.path.join(index_path, name))
+
+
+def save_sharded_store(vector_store, index_path, meta=None):
+    """
+    Save every shard under index_path/shards and the combined sidecar on top.
+    Shards not modified since they were loaded are linked from the snapshot
+    they came from instead of being written again.
+    """
+    written = 0
+    for i, shard in enumerate(vector_store.shards):
+        dest = shard_dir(index_path, i)
+        if not shard.dirty and shard.source_dir and os.path.abspath(shard.source_dir) != os.path.abspath(dest):
+            link_store_files(shard.source_dir, dest)
+        else:
+            save_store(shard, dest, meta=meta)
+            written += 1
+        shard.source_dir, shard.dirty = dest, False
+
+    sidecar = dict(vector_store.index_meta or {})
+    sidecar.update(meta or {})
+    sidecar.update({
+        "dimension": vector_store.d,
+        "metric": "l2",
+        "vector_count": vector_store.ntotal,
+        "shards": len(vector_store.shards),
+        "saved_at": int(time.time())
+    })
+    write_index_meta(index_path, sidecar)
+    vector_store.index_meta = sidecar
+    print(f"💾 Saved {written} of {len(vector_store.shards)} shards")
@@ -0,0 +1,451 @@
+# vector_index.py
+# FAISS index construction and maintenance for the vector store:
+# exact flat index (baseline), IVF (trained once enough vectors exist) and HNSW,
+# optionally with compressed vectors (8-bit scalar or product quantization)
+# re-ranked against the original float32 vectors kept in a raw flat index.
+
+import os
+import math
+import heapq
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from embedding.shards import is_sharded, search_pool
+
+load_dotenv()
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+VECTOR_CODECS = ("none", "sq8", "pq")
+
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", 0))  # 0 = derive from vector count
+FAISS_IVF_MIN_VECTORS = int(os.getenv("FAISS_IVF_MIN_VECTORS", 10000))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", 32))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", 200))
+FAISS_VECTOR_CODEC = os.getenv("FAISS_VECTOR_CODEC", "none").lower()
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", 64))  # sub-quantizers (bytes per vector at 8 bits)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", 8))
+FAISS_PQ_MIN_VECTORS = int(os.getenv("FAISS_PQ_MIN_VECTORS", 10000))
+FAISS_SQ_MIN_VECTORS = int(os.getenv("FAISS_SQ_MIN_VECTORS", 1000))
+FAISS_RERANK_FACTOR = int(os.getenv("FAISS_RERANK_FACTOR", 4))  # 0 disables exact re-rank
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 8))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+# Largest nprobe / ef_search a chat request may ask for
+FAISS_MAX_NPROBE = int(os.getenv("FAISS_MAX_NPROBE", 1024))
+FAISS_MAX_EF_SEARCH = int(os.getenv("FAISS_MAX_EF_SEARCH", 1024))
+
+if FAISS_INDEX_TYPE not in INDEX_TYPES:
+    raise ValueError(f"FAISS_INDEX_TYPE must be one of {INDEX_TYPES}, got {FAISS_INDEX_TYPE!r}")
+if FAISS_VECTOR_CODEC not in VECTOR_CODECS:
+    raise ValueError(f"FAISS_VECTOR_CODEC must be one of {VECTOR_CODECS}, got {FAISS_VECTOR_CODEC!r}")
+
+
+def index_kind(index):
+    """'flat', 'ivf' or 'hnsw' for a FAISS index."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def index_codec(index):
+    """'none', 'sq8' or 'pq': how the index stores its vectors."""
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "sq8"
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "none"
+
+
+def effective_config(n_vectors, index_type=FAISS_INDEX_TYPE, codec=FAISS_VECTOR_CODEC):
+    """
+    (type, codec) to use for n_vectors: structures that need training fall back
+    to exact storage until there are enough vectors to train them.
+    """
+    if index_type == "ivf" and n_vectors < FAISS_IVF_MIN_VECTORS:
+        index_type = "flat"
+    if codec == "pq" and n_vectors < FAISS_PQ_MIN_VECTORS:
+        codec = "none"
+    if codec == "sq8" and n_vectors < FAISS_SQ_MIN_VECTORS:
+        codec = "none"
+    return index_type, codec
+
+
+def ivf_nlist(n_vectors):
+    if FAISS_IVF_NLIST:
+        return FAISS_IVF_NLIST
+    # ~4*sqrt(n) lists, with at least 39 training points per list
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def pq_m(dim):
+    """Largest sub-quantizer count <= FAISS_PQ_M that divides the dimension."""
+    m = max(1, min(FAISS_PQ_M, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def create_faiss_index(dim, index_type="flat", codec="none", n_vectors=0):
+    """
+    New empty index for the effective (type, codec) at n_vectors
+    (see effective_config); a new store therefore starts exact and flat.
+    """
+    index_type, codec = effective_config(n_vectors, index_type, codec)
+    sq8 = faiss.ScalarQuantizer.QT_8bit
+
+    if index_type == "hnsw":
+        if codec == "sq8":
+            index = faiss.IndexHNSWSQ(dim, sq8, FAISS_HNSW_M)
+        elif codec == "pq":
+            index = faiss.IndexHNSWPQ(dim, pq_m(dim), FAISS_HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+        return index
+
+    if index_type == "ivf":
+        quantizer = faiss.IndexFlatL2(dim)
+        nlist = ivf_nlist(n_vectors)
+        if codec == "sq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, sq8)
+        elif codec == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m(dim), FAISS_PQ_NBITS)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        # Hashtable direct map keeps reconstruct() working (remove_ids: see _remove_ivf)
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    if codec == "sq8":
+        return faiss.IndexScalarQuantizer(dim, sq8)
+    if codec == "pq":
+        return faiss.IndexPQ(dim, pq_m(dim), FAISS_PQ_NBITS)
+    return faiss.IndexFlatL2(dim)
+
+
+def reconstruct_all(index):
+    """All stored vectors, in position order (lossy for compressed indexes)."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def exact_vectors(vector_store):
+    """Original vectors: from the raw index when the main one is compressed."""
+    if is_sharded(vector_store):
+        return np.vstack([exact_vectors(shard) for shard in vector_store.shards])
+    raw = getattr(vector_store, "raw_index", None)
+    return reconstruct_all(raw if raw is not None else vector_store.index)
+
+
+def rebuild_index(vector_store, index_type, codec="none", keep=None):
+    """
+    Re-create the store's index for (index_type, codec) from its own vectors
+    (no re-embedding). `keep` is an optional sorted list of positions to retain.
+    Returns the number of vectors in the new index.
+    """
+    old = vector_store.index
+    vectors = exact_vectors(vector_store)
+    if keep is not None:
+        vectors = vectors[keep]
+
+    index = create_faiss_index(old.d, index_type, codec, n_vectors=len(vectors))
+    if not index.is_trained:
+        kind, codec_used = index_kind(index), index_codec(index)
+        print(f"🏋️ Training {kind}/{codec_used} index on {len(vectors)} vectors...")
+        index.train(vectors)
+    if len(vectors):
+        index.add(vectors)
+
+    # Compressed indexes keep the originals aside for exact re-ranking (if enabled)
+    raw = None
+    if index_codec(index) != "none" and FAISS_RERANK_FACTOR > 0:
+        raw = faiss.IndexFlatL2(old.d)
+        if len(vectors):
+            raw.add(vectors)
+
+    if keep is not None:
+        ids = [vector_store.index_to_docstore_id[i] for i in keep]
+        vector_store.index_to_docstore_id = {i: id_ for i, id_ in enumerate(ids)}
+    vector_store.index = index
+    vector_store.raw_index = raw
+    return index.ntotal
+
+
+def ensure_index_type(vector_store, index_type=FAISS_INDEX_TYPE, codec=FAISS_VECTOR_CODEC):
+    """
+    Convert the store's index to the configured type/codec when it differs, e.g.
+    train IVF or PQ once the corpus is large enough. Returns True if rebuilt.
+    Shards are sized, and so converted, independently.
+    """
+    if is_sharded(vector_store):
+        rebuilt = False
+        for shard in vector_store.shards:
+            if ensure_index_type(shard, index_type, codec):
+                shard.dirty = rebuilt = True
+        return rebuilt
+    current = (index_kind(vector_store.index), index_codec(vector_store.index))
+    target = effective_config(vector_store.index.ntotal, index_type, codec)
+    if current == target:
+        return False
+    print(f"🔁 Converting index {'/'.join(current)} → {'/'.join(target)} ({vector_store.index.ntotal} vectors)")
+    rebuild_index(vector_store, index_type, codec)
+    return True
+
+
+def add_document(vector_store, doc_id, text, source=None):
+    """
+    Store a document's text once for span chunks (no-op for docstores without
+    spans). A sharded store puts it in the shard of its source file.
+    """
+    if is_sharded(vector_store):
+        vector_store.docstore.add_document(doc_id, text, source)
+    elif hasattr(vector_store.docstore, "add_document"):
+        vector_store.docstore.add_document(doc_id, text)
+
+
+def add_vectors(vector_store, texts, vectors, metadatas=None, ids=None, spans=None):
+    """
+    Add precomputed embeddings, mirroring them into the raw index if there is one.
+    With spans ((doc_id, start, end) per text, documents stored via add_document)
+    the docstore records offsets instead of a copy of every chunk's text.
+    A sharded store routes every chunk to the shard of its "source" metadata.
+    """
+    if is_sharded(vector_store):
+        metadatas = metadatas or [{} for _ in texts]
+        groups = {}
+        for j, metadata in enumerate(metadatas):
+            groups.setdefault(id(vector_store.shard_for(metadata.get("source") or "")), []).append(j)
+        added = []
+        for shard in vector_store.shards:
+            rows = groups.get(id(shard))
+            if not rows:
+                continue
+            added += add_vectors(
+                shard, [texts[j] for j in rows], [vectors[j] for j in rows], [metadatas[j] for j in rows],
+                [ids[j] for j in rows] if ids else None,
+                [spans[j] for j in rows] if spans is not None else None
+            )
+            shard.dirty = True
+        return added
+
+    raw = getattr(vector_store, "raw_index", None)
+    if spans is None or not hasattr(vector_store.docstore, "add_spans"):
+        added = vector_store.add_embeddings(
+            text_embeddings=list(zip(texts, vectors)),
+            metadatas=metadatas,
+            ids=ids
+        )
+    else:
+        x = np.asarray(vectors, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in texts]
+        vector_store.docstore.add_spans({
+            id_: (doc_id, start, end, metadata)
+            for id_, (doc_id, start, end), metadata in zip(ids, spans, metadatas)
+        })
+        start = len(vector_store.index_to_docstore_id)
+        vector_store.index.add(x)
+        vector_store.index_to_docstore_id.update({start + j: id_ for j, id_ in enumerate(ids)})
+        added = list(ids)
+    if raw is not None:
+        raw.add(np.asarray(vectors, dtype=np.float32))
+    return added
+
+
+def _remove_ivf(index, removed):
+    """
+    Remove positions from an IVF index without retraining, then shift the ids
+    left in the inverted lists down over them, so positions stay 0..ntotal-1
+    like a flat index. remove_ids is a no-op while a hashtable direct map is
+    set, so the map is dropped for the removal and rebuilt from the new ids.
+    """
+    removed = np.sort(np.asarray(removed, dtype=np.int64))
+    index.set_direct_map_type(faiss.DirectMap.NoMap)
+    index.remove_ids(removed)
+    invlists = index.invlists
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            list_ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            list_ids -= np.searchsorted(removed, list_ids)
+    index.set_direct_map_type(faiss.DirectMap.NoMap)
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def delete_vectors(vector_store, ids):
+    """
+    Remove docstore ids and their vectors; ids not in the store are ignored.
+    Flat indexes (also SQ/PQ-coded ones) compact on remove_ids; IVF removes
+    from its lists and renumbers them (_remove_ivf), so neither retrains.
+    HNSW cannot remove from its graph: it is reset (keeping the trained SQ/PQ
+    codec) and the kept vectors re-added.
+    """
+    if is_sharded(vector_store):
+        deleted = 0
+        for shard in vector_store.shards:
+            n = delete_vectors(shard, ids)
+            if n:
+                shard.dirty = True
+                deleted += n
+        return deleted
+
+    present = set(vector_store.index_to_docstore_id.values())
+    doomed = {id_ for id_ in ids if id_ in present}
+    if not doomed:
+        return 0
+
+    index = vector_store.index
+    kind = index_kind(index)
+    positions = sorted(i for i, id_ in vector_store.index_to_docstore_id.items() if id_ in doomed)
+    if kind == "hnsw":
+        dropped = set(positions)
+        keep = [i for i in sorted(vector_store.index_to_docstore_id) if i not in dropped]
+        vectors = exact_vectors(vector_store)[keep]
+        index.reset()
+        if len(vectors):
+            index.add(vectors)
+        raw = getattr(vector_store, "raw_index", None)
+        if raw is not None:
+            raw.remove_ids(np.asarray(positions, dtype=np.int64))
+        ids = [vector_store.index_to_docstore_id[i] for i in keep]
+        vector_store.index_to_docstore_id = {i: id_ for i, id_ in enumerate(ids)}
+        vector_store.docstore.delete(list(doomed))
+        return len(doomed)
+
+    raw = getattr(vector_store, "raw_index", None)
+    if raw is not None:
+        raw.remove_ids(np.asarray(positions, dtype=np.int64))
+    if kind == "ivf":
+        _remove_ivf(index, positions)
+        ids = [id_ for i, id_ in sorted(vector_store.index_to_docstore_id.items()) if id_ not in doomed]
+        vector_store.index_to_docstore_id = {i: id_ for i, id_ in enumerate(ids)}
+        vector_store.docstore.delete(list(doomed))
+        return len(doomed)
+    # Removes from the index and docstore and renumbers the position map
+    vector_store.delete(ids=list(doomed))
+    return len(doomed)
+
+
+def index_memory_bytes(index):
+    """
+    Size of the index (≈ as serialized) from its vector count and code size:
+    codes, plus PQ codebooks, IVF ids and centroids or HNSW links. Nothing is
+    read from a memory-mapped index.
+    """
+    n = index.ntotal
+    if isinstance(index, faiss.IndexHNSW):
+        # Neighbour lists (int32), plus a level (int32) and an offset (int64) per vector
+        return index_memory_bytes(faiss.downcast_index(index.storage)) + index.hnsw.neighbors.size() * 4 + n * 12
+    size = index.code_size * n
+    pq = getattr(index, "pq", None)
+    if pq is not None:
+        size += pq.M * pq.ksub * pq.dsub * 4
+    if isinstance(index, faiss.IndexIVF):
+        size += n * 8 + index.quantizer.ntotal * index.d * 4
+    return int(size)
+
+
+def store_summary(vector_store):
+    """Index type, codec, size and vector count of a store (summed over shards)."""
+    stores = vector_store.shards if is_sharded(vector_store) else [vector_store]
+    return {
+        "index_type": "+".join(sorted({index_kind(s.index) for s in stores})),
+        "vector_codec": "+".join(sorted({index_codec(s.index) for s in stores})),
+        "index_bytes": sum(index_memory_bytes(s.index) for s in stores),
+        "vector_count": sum(s.index.ntotal for s in stores),
+        "shards": len(stores)
+    }
+
+
+def search_params(index, nprobe=None, ef_search=None):
+    """Per-call FAISS search parameters (thread-safe, unlike setting them on the index)."""
+    kind = index_kind(index)
+    if kind == "ivf":
+        return faiss.SearchParametersIVF(nprobe=int(nprobe or FAISS_NPROBE))
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search or FAISS_EF_SEARCH))
+    return None
+
+
+def search_positions(vector_store, query_vector, k, nprobe=None, ef_search=None,
+                     rerank_factor=FAISS_RERANK_FACTOR):
+    """
+    Top-k (L2 distance, position) for a query vector, with nprobe / efSearch
+    applied to this search only. On compressed indexes, k * rerank_factor
+    candidates are re-scored exactly against the raw vectors.
+    """
+    return search_positions_batch(vector_store, [query_vector], k, nprobe, ef_search, rerank_factor)[0]
+
+
+def search_positions_batch(vector_store, query_vectors, k, nprobe=None, ef_search=None,
+                           rerank_factor=FAISS_RERANK_FACTOR):
+    """search_positions for several query vectors with one index.search call; one list per query."""
+    x = np.asarray(query_vectors, dtype=np.float32)
+    raw = getattr(vector_store, "raw_index", None)
+    fetch_k = k * rerank_factor if raw is not None and rerank_factor > 1 else k
+
+    params = search_params(vector_store.index, nprobe, ef_search)
+    if params is None:
+        all_scores, all_indices = vector_store.index.search(x, fetch_k)
+    else:
+        all_scores, all_indices = vector_store.index.search(x, fetch_k, params=params)
+
+    results = []
+    for q, scores, indices in zip(x, all_scores, all_indices):
+        if raw is not None and rerank_factor > 0:
+            found = indices[indices != -1]
+            if len(found):
+                candidates = raw.reconstruct_batch(found.astype(np.int64))
+                exact = ((candidates - q) ** 2).sum(axis=1)
+                order = np.argsort(exact)[:k]
+                scores, indices = exact[order], found[order]
+        results.append([(float(score), int(i)) for score, i in zip(scores[:k], indices[:k]) if i != -1])
+    return results
+
+
+def search_by_vector(vector_store, query_vector, k, nprobe=None, ef_search=None,
+                     rerank_factor=FAISS_RERANK_FACTOR):
+    """
+    Top-k (Document, L2 distance) for a query vector (see search_positions).
+    A sharded store is searched shard by shard on a thread pool and the
+    per-shard top-k lists merged by distance; only the final k chunks are read.
+    """
+    return search_by_vectors(vector_store, [query_vector], k, nprobe, ef_search, rerank_factor)[0]
+
+
+def search_by_vectors(vector_store, query_vectors, k, nprobe=None, ef_search=None,
+                      rerank_factor=FAISS_RERANK_FACTOR):
+    """search_by_vector for several query vectors: one index.search per shard, one result list per query."""
+    if not len(query_vectors):
+        return []
+    if is_sharded(vector_store):
+        shards = vector_store.shards
+        futures = [
+            search_pool(len(shards)).submit(
+                search_positions_batch, shard, query_vectors, k, nprobe, ef_search, rerank_factor
+            )
+            for shard in shards
+        ]
+        per_shard = [future.result() for future in futures]
+        tops = []
+        for q in range(len(query_vectors)):
+            hits = [(score, n, i) for n, found in enumerate(per_shard) for score, i in found[q]]
+            tops.append([(shards[n], score, i) for score, n, i in heapq.nsmallest(k, hits)])
+    else:
+        tops = [[(vector_store, score, i) for score, i in found]
+                for found in search_positions_batch(vector_store, query_vectors, k, nprobe, ef_search, rerank_factor)]
+
+    results = []
+    for top in tops:
+        docs = []
+        for store, score, i in top:
+            doc = store.docstore.search(store.index_to_docstore_id[i])
+            if isinstance(doc, Document):
+                docs.append((doc, score))
+        results.append(docs)
+    return results
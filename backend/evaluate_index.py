@@ -0,0 +1,85 @@
+"""
+Script to compare vector storage modes on the current FAISS index:
+memory per mode and recall@k against the exact flat baseline.
+
+Usage: python evaluate_index.py [k] [n_queries]
+"""
+
+import sys
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+from embedding.build_index import FAISS_INDEX_PATH
+from embedding.embedding_cache import get_embeddings
+from embedding.store import load_store
+from embedding.snapshots import current_index_dir
+from embedding.vector_index import (
+    VECTOR_CODECS, FAISS_RERANK_FACTOR, create_faiss_index, exact_vectors, index_memory_bytes
+)
+
+
+def evaluate_codecs(vectors, k=10, n_queries=200, rerank_factor=FAISS_RERANK_FACTOR, seed=0):
+    """
+    Build a flat index for every codec from the same vectors and measure
+    serialized size and recall@k (with and without exact re-rank) on
+    queries sampled from the stored vectors.
+    """
+    rng = np.random.default_rng(seed)
+    n, dim = vectors.shape
+    queries = vectors[rng.choice(n, size=min(n_queries, n), replace=False)]
+    # Perturb queries so they are not exact copies of stored vectors
+    queries = queries + rng.normal(scale=queries.std() * 0.1, size=queries.shape).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    def recall(found):
+        return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+    report = []
+    for codec in VECTOR_CODECS:
+        # Force the codec regardless of the corpus-size thresholds
+        index = create_faiss_index(dim, "flat", codec, n_vectors=10 ** 9)
+        try:
+            if not index.is_trained:
+                index.train(vectors)
+        except RuntimeError as e:
+            # e.g. PQ needs at least 2**nbits training vectors
+            report.append({"codec": codec, "error": str(e).split("failed: ")[-1]})
+            continue
+        index.add(vectors)
+
+        _, found = index.search(queries, k)
+        row = {
+            "codec": codec,
+            "index_bytes": index_memory_bytes(index),
+            "bytes_per_vector": round(index_memory_bytes(index) / n, 1),
+            f"recall@{k}": round(recall(found), 4),
+        }
+
+        if codec != "none" and rerank_factor > 1:
+            _, candidates = index.search(queries, k * rerank_factor)
+            reranked = []
+            for q, cand in zip(queries, candidates):
+                cand = cand[cand != -1]
+                dist = ((vectors[cand] - q) ** 2).sum(axis=1)
+                reranked.append(cand[np.argsort(dist)[:k]])
+            row[f"recall@{k}_reranked"] = round(recall(reranked), 4)
+            row["raw_bytes_on_disk"] = int(vectors.nbytes)
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    store = load_store(current_index_dir(FAISS_INDEX_PATH), get_embeddings())
+    vectors = np.ascontiguousarray(exact_vectors(store), dtype=np.float32)
+    print(f"📊 {len(vectors)} vectors, dimension {vectors.shape[1]}, k={k}\n")
+
+    for row in evaluate_codecs(vectors, k=k, n_queries=n_queries):
+        print("  " + ", ".join(f"{key}: {value}" for key, value in row.items()))
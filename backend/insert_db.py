@@ -8,12 +8,12 @@ import re
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
-from markitdown import MarkItDown
 from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from database.unified_db import db
+from embedding.extraction_cache import extract_cached
 
 load_dotenv()
 
@@ -25,11 +25,9 @@ if not MISTRAL_API_KEY:
 
 
 def extract_text_from_file(file_path: str) -> str:
-    """Extract text content from various file formats"""
+    """Extract text content from various file formats (shared cache with the index build)"""
     try:
-        md = MarkItDown(enable_plugins=True)
-        result = md.convert(file_path)
-        return result.text_content
+        return extract_cached(file_path)
     except Exception as e:
         print(f"❌ Error extracting text from {file_path}: {e}")
         raise
@@ -0,0 +1,33 @@
+# request_params.py
+# Checks for optional numeric and boolean fields of request bodies, shared by
+# the Flask routes (app.py) and the async chat routes (asgi.py). Each returns
+# the value and an error message for a 400 reply.
+
+from embedding.vector_index import FAISS_MAX_EF_SEARCH, FAISS_MAX_NPROBE
+
+
+def optional_positive_int(data, name, maximum=None):
+    """(value or None, error message or None) for an optional positive integer field"""
+    value = data.get(name)
+    if value is None:
+        return None, None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        return None, f"{name} must be a positive integer"
+    if maximum is not None and value > maximum:
+        return None, f"{name} must be at most {maximum}"
+    return value, None
+
+
+def optional_bool(data, name, default):
+    """(value, error message or None) for an optional JSON boolean field; strings like "false" are rejected"""
+    value = data.get(name, default)
+    if not isinstance(value, bool):
+        return None, f"{name} must be true or false"
+    return value, None
+
+
+def search_overrides(data):
+    """(nprobe, ef_search, error message or None): per-request IVF / HNSW search settings"""
+    nprobe, error = optional_positive_int(data, "nprobe", maximum=FAISS_MAX_NPROBE)
+    ef_search, ef_search_error = optional_positive_int(data, "ef_search", maximum=FAISS_MAX_EF_SEARCH)
+    return nprobe, ef_search, error or ef_search_error
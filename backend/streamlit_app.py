@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
 import os
+import time
+import json
 from dotenv import load_dotenv
 from datetime import datetime
 import shutil
@@ -339,20 +341,37 @@ with st.sidebar:
                         status_text.text("🔨 Construction de l'index...")
                         response = requests.post(
                             f"{BACKEND_URL}/api/build-index",
-                            json={"folder_path": temp_folder},
-                            timeout=120
+                            json={"folder_path": temp_folder, "prune_removed": False},
+                            timeout=30
                         )
 
+                        # The build runs in the background: poll the job until it finishes
+                        # (the temp folder must stay in place until then)
+                        job = None
+                        if response.status_code == 202:
+                            status_url = f"{BACKEND_URL}{response.json()['status_url']}"
+                            while True:
+                                job = requests.get(status_url, timeout=30).json()
+                                if job.get("state") in ("done", "failed"):
+                                    break
+                                status_text.text(
+                                    f"🔨 Construction de l'index ({job.get('stage') or 'en attente'}): "
+                                    f"{job.get('files_done', 0)}/{job.get('files_total', 0)} fichiers, "
+                                    f"{job.get('chunks_embedded', 0)} segments"
+                                )
+                                time.sleep(1)
+
                         progress_bar.progress(0.95)
 
-                        if response.status_code == 200:
-                            data = response.json()
+                        if job is not None and job.get("state") == "done":
+                            data = job.get("result") or {}
                             status_text.empty()
                             st.success(f"✅ {data.get('message', 'Index créé avec succès!')}")
                             st.balloons()
-                            st.info(f"📊 {data.get('chunks_created', 0)} segments créés")
+                            st.info(f"📊 {data.get('chunks_created', 0)} segments créés, {data.get('chunks_deduplicated', 0)} doublons ignorés")
                         else:
-                            st.error(f"❌ Erreur lors de la construction de l'index: {response.text}")
+                            error = job.get("error") if job is not None else response.text
+                            st.error(f"❌ Erreur lors de la construction de l'index: {error}")
                             # If only vector was requested and index failed, abort further actions
                             if not insert_db_needed:
                                 shutil.rmtree(temp_folder, ignore_errors=True)
@@ -507,22 +526,35 @@ with st.form(key="chat_form", clear_on_submit=True):
         # Add user message
         st.session_state.messages.append({"role": "user", "content": user_input})
         
-        # Show loading spinner
+        # Show loading spinner until the first tokens arrive
         with st.spinner("🔄 Recherche de la meilleure réponse..."):
             try:
-                # Send to backend
+                # Stream the answer (server-sent events) and show it as it is written
                 response = requests.post(
-                    f"{BACKEND_URL}/api/chat",
+                    f"{BACKEND_URL}/api/chat/stream",
                     json={"message": user_input, "user_id": "streamlit_user"},
+                    stream=True,
                     timeout=120
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
-                    bot_reply = data.get("reply", "Aucune réponse reçue")
+                    placeholder = st.empty()
+                    bot_reply = ""
+                    event = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                        elif line.startswith("data: "):
+                            payload = json.loads(line[len("data: "):])
+                            if event == "token":
+                                bot_reply += payload["text"]
+                                placeholder.markdown(bot_reply + "▌")
+                            elif event == "error":
+                                bot_reply = f"Error: {payload['error']}"
+                    response.close()
                     
                     # Add bot message
-                    st.session_state.messages.append({"role": "assistant", "content": bot_reply})
+                    st.session_state.messages.append({"role": "assistant", "content": bot_reply or "Aucune réponse reçue"})
                     
                     st.success("✅ Réponse reçue!")
                     st.rerun()
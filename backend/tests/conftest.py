@@ -0,0 +1,54 @@
+# conftest.py
+# Tests import the backend modules the way app.py does (backend/ on sys.path)
+# and never call Mistral: embeddings come from DeterministicFakeEmbedding.
+# Caches and indexes are written under temporary folders.
+
+import os
+import sys
+import random
+import tempfile
+
+import pytest
+
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+os.environ.setdefault("EMBEDDING_DIM", "16")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_scratch, "embedding_cache.sqlite3"))
+os.environ.setdefault("EXTRACTION_CACHE_DIR", os.path.join(_scratch, "extraction_cache"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("course exam credit room teacher student module semester project lab grade schedule library "
+         "campus thesis lecture internship report deadline office").split()
+
+
+def write_doc(path, seed, n_words=600):
+    """A text file of n_words random words (same seed, same text)."""
+    rng = random.Random(seed)
+    path.write_text(" ".join(rng.choice(WORDS) for _ in range(n_words)), encoding="utf-8")
+
+
+@pytest.fixture
+def builder(tmp_path, monkeypatch):
+    """embedding.build_index writing to tmp_path/faiss_index with fake 16-dim embeddings."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    import embedding.build_index as build_index
+
+    monkeypatch.setattr(build_index, "FAISS_INDEX_PATH", str(tmp_path / "faiss_index"))
+    monkeypatch.setattr(build_index, "init_embeddings", lambda: DeterministicFakeEmbedding(size=16))
+    (tmp_path / "docs").mkdir()
+    return build_index
+
+
+@pytest.fixture
+def chat_agent(builder, tmp_path, monkeypatch):
+    """An agent over a three-file index in tmp_path; tests replace its llm."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    import agent.agent_config as agent_config
+
+    for i in range(3):
+        write_doc(tmp_path / "docs" / f"f{i}.txt", i)
+    builder.build_index(str(tmp_path / "docs"))
+    monkeypatch.setattr(agent_config, "FAISS_INDEX_PATH", builder.FAISS_INDEX_PATH)
+    monkeypatch.setattr(agent_config, "SNAPSHOT_POLL_S", 0)
+    monkeypatch.setattr(agent_config, "get_embeddings", lambda *args, **kwargs: DeterministicFakeEmbedding(size=16))
+    return agent_config.build_agent()
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+QUESTION = "When is the deadline for the internship report this semester"
+
+
+class FakeLLM:
+    """Streams the given chunks, then raises if fail is set."""
+
+    def __init__(self, chunks, fail=False):
+        self.chunks = chunks
+        self.fail = fail
+
+    def stream(self, prompt):
+        for chunk in self.chunks:
+            yield AIMessageChunk(content=chunk)
+        if self.fail:
+            raise RuntimeError("LLM failed")
+
+    async def astream(self, prompt):
+        for chunk in self.stream(prompt):
+            yield chunk
+
+
+def cached_answers(agent):
+    return agent.answer_cache.stats()["entries"]
+
+
+def test_finished_stream_is_remembered_and_cached(chat_agent):
+    chat_agent.llm = FakeLLM(["The deadline ", "is in June."])
+    events = list(chat_agent.stream(QUESTION, user_id="u1"))
+    assert [e for e, _ in events] == ["retrieval", "token", "token", "done"]
+    assert chat_agent.memory.history("u1")[-1]["content"] == "The deadline is in June."
+    assert cached_answers(chat_agent) == 1
+
+
+def test_llm_error_is_not_reported_as_a_cancel_or_cached(chat_agent, capsys):
+    chat_agent.llm = FakeLLM(["The deadline "], fail=True)
+    stream = chat_agent.stream(QUESTION, user_id="u1")
+    with pytest.raises(RuntimeError):
+        list(stream)
+    out = capsys.readouterr().out
+    assert "Error in agent stream after 1 chunks" in out
+    assert "cancelled" not in out
+    assert chat_agent.memory.history("u1") == []
+    assert cached_answers(chat_agent) == 0
+
+
+def test_client_disconnect_stops_without_caching(chat_agent, capsys):
+    chat_agent.llm = FakeLLM(["The deadline ", "is in June."])
+    stream = chat_agent.stream(QUESTION, user_id="u1")
+    assert next(stream)[0] == "retrieval"
+    assert next(stream)[0] == "token"
+    stream.close()
+    assert "Generation cancelled after 1 chunks" in capsys.readouterr().out
+    assert cached_answers(chat_agent) == 0
+
+
+def test_empty_answer_is_not_cached(chat_agent):
+    chat_agent.llm = FakeLLM(["", "  "])
+    list(chat_agent.stream(QUESTION, user_id="u1"))
+    assert cached_answers(chat_agent) == 0
+
+
+def test_async_llm_error_is_not_cached(chat_agent, capsys):
+    chat_agent.llm = FakeLLM(["The deadline "], fail=True)
+
+    async def consume():
+        return [event async for event in chat_agent.astream(QUESTION, user_id="u1")]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(consume())
+    assert "Error in agent astream after 1 chunks" in capsys.readouterr().out
+    assert cached_answers(chat_agent) == 0
+
+    chat_agent.llm = FakeLLM(["The deadline ", "is in June."])
+    assert [e for e, _ in asyncio.run(consume())][-1] == "done"
+    assert cached_answers(chat_agent) == 1
@@ -0,0 +1,69 @@
+from langchain_core.messages import AIMessage
+
+from agent.answer_cache import ENTRY_OVERHEAD_BYTES, SemanticAnswerCache
+
+SCOPE = ("v1", None, None)
+
+
+def test_close_questions_get_the_stored_answer():
+    cache = SemanticAnswerCache(threshold=0.95, enabled=True)
+    cache.store(SCOPE, "exam dates", [1.0, 0.0, 0.0], "In June.")
+    answer, similarity = cache.lookup(SCOPE, [10.0, 0.5, 0.0])
+    assert answer == "In June." and similarity >= 0.95
+    assert cache.lookup(SCOPE, [1.0, 1.0, 0.0]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_answers_are_only_served_within_their_scope():
+    cache = SemanticAnswerCache(threshold=0.95, enabled=True)
+    cache.store(SCOPE, "exam dates", [1.0, 0.0], "In June.")
+    assert cache.lookup(("v1", 8, None), [1.0, 0.0]) is None
+    assert cache.lookup(("v2", None, None), [1.0, 0.0]) is None
+
+    cache.store(("v2", None, None), "exam dates", [1.0, 0.0], "In July.")
+    assert cache.invalidate("v2") == 1
+    assert cache.lookup(SCOPE, [1.0, 0.0]) is None
+    assert cache.lookup(("v2", None, None), [1.0, 0.0])[0] == "In July."
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_answers_are_evicted():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2, enabled=True)
+    cache.store(SCOPE, "a", [1.0, 0.0], "A")
+    cache.store(SCOPE, "b", [0.0, 1.0], "B")
+    assert cache.lookup(SCOPE, [1.0, 0.0])[0] == "A"
+    cache.store(SCOPE, "c", [-1.0, 0.0], "C")
+    assert cache.lookup(SCOPE, [0.0, 1.0]) is None
+    assert cache.lookup(SCOPE, [1.0, 0.0])[0] == "A"
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+
+def test_memory_bound_evicts_and_skips_oversized_answers():
+    entry_bytes = 8 + 1 + 100 + ENTRY_OVERHEAD_BYTES
+    cache = SemanticAnswerCache(threshold=0.99, max_bytes=2 * entry_bytes, enabled=True)
+    for i, vector in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+        cache.store(SCOPE, str(i), vector, "x" * 100)
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 2 * entry_bytes
+    cache.store(SCOPE, "big", [0.0, -1.0], "x" * 3 * entry_bytes)
+    assert cache.lookup(SCOPE, [0.0, -1.0]) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_agent_answers_a_repeated_question_from_the_cache(chat_agent):
+    calls = []
+
+    class FakeLLM:
+        def invoke(self, prompt):
+            calls.append(prompt)
+            return AIMessage(content="The deadline is in June.")
+
+    chat_agent.llm = FakeLLM()
+    question = "When is the deadline for the internship report this semester"
+    first = chat_agent.run(question)
+    second = chat_agent.run(question + "?")
+    assert not first.cached and second.cached
+    assert second.text == first.text
+    assert len(calls) == 1
+    # Other search params are another scope
+    assert not chat_agent.run(question, nprobe=4).cached
+    assert len(calls) == 2
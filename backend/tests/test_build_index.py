@@ -0,0 +1,47 @@
+import os
+
+from conftest import write_doc
+from embedding.manifest import MANIFEST_FILE, load_manifest
+from embedding.snapshots import current_index_dir
+
+
+def test_rebuild_only_embeds_new_and_changed_files(builder, tmp_path):
+    docs = tmp_path / "docs"
+    for i in range(3):
+        write_doc(docs / f"f{i}.txt", i)
+    first = builder.build_index(str(docs))
+    assert first["success"] and first["documents_processed"] == 3
+
+    write_doc(docs / "f1.txt", 100)
+    write_doc(docs / "new.txt", 4)
+    os.remove(docs / "f2.txt")
+    second = builder.build_index(str(docs))
+    assert second["documents_processed"] == 2
+    assert second["documents_skipped"] == 1
+    assert second["documents_removed"] == 1
+    assert set(load_manifest(current_index_dir(builder.FAISS_INDEX_PATH))["files"]) == {"f0.txt", "f1.txt", "new.txt"}
+
+    assert builder.build_index(str(docs))["message"] == "Index already up to date"
+
+
+def test_legacy_index_without_manifest_is_not_embedded_again(builder, tmp_path, monkeypatch):
+    # Without dedup nothing else would stop the files from being added twice
+    monkeypatch.setattr(builder, "DEDUP_ENABLED", False)
+    docs = tmp_path / "docs"
+    for i in range(3):
+        write_doc(docs / f"f{i}.txt", i)
+    vector_count = builder.build_index(str(docs))["vector_count"]
+    index_dir = current_index_dir(builder.FAISS_INDEX_PATH)
+    os.remove(os.path.join(index_dir, MANIFEST_FILE))
+
+    result = builder.build_index(str(docs))
+    assert result["chunks_created"] == 0
+    assert result["documents_skipped"] == 3
+    assert result["vector_count"] == vector_count
+    # The seeded manifest is published, so later builds use it
+    assert set(load_manifest(current_index_dir(builder.FAISS_INDEX_PATH))["files"]) == {"f0.txt", "f1.txt", "f2.txt"}
+
+    write_doc(docs / "f0.txt", 50)
+    result = builder.build_index(str(docs))
+    assert result["documents_processed"] == 1
+    assert result["vector_count"] == vector_count - result["chunks_removed"] + result["chunks_created"]
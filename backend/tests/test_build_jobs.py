@@ -0,0 +1,76 @@
+import time
+import threading
+
+from embedding.build_jobs import BuildQueue
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["state"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {queue.get(job_id)['state']}")
+
+
+def test_queued_requests_for_the_same_folder_join_one_job():
+    release = threading.Event()
+    runs = []
+
+    def run_build(params, progress):
+        release.wait(5)
+        progress(stage="embedding", files_total=1, files_done=1)
+        runs.append(params)
+        return {"success": True}
+
+    queue = BuildQueue(run_build)
+    running = queue.submit(folder="a")
+    while queue.get(running["job_id"])["state"] != "running":
+        time.sleep(0.01)
+
+    first = queue.submit(folder="a")
+    second = queue.submit(folder="a")
+    other = queue.submit(folder="b")
+    assert first["job_id"] == second["job_id"] != running["job_id"]
+    assert queue.get(first["job_id"])["requests"] == 2
+    assert other["job_id"] != first["job_id"]
+    assert queue.get(first["job_id"])["state"] == "queued"
+
+    release.set()
+    for job_id in (running["job_id"], first["job_id"], other["job_id"]):
+        job = wait_for(queue, job_id)
+        assert job["state"] == "done" and job["stage"] == "done"
+        assert job["files_done"] == 1 and job["finished_at"] >= job["started_at"]
+    assert runs == [{"folder": "a"}, {"folder": "a"}, {"folder": "b"}]
+
+
+def test_failed_results_and_exceptions_mark_the_job_failed():
+    def run_build(params, progress):
+        if params["mode"] == "raise":
+            raise MemoryError("out of memory")
+        if params["mode"] == "noop":
+            return {"success": False, "noop": True, "message": "Index not found"}
+        return {"success": False, "message": "No documents found", "error_kind": "no_documents"}
+
+    queue = BuildQueue(run_build, classify_error=lambda e: "oom" if isinstance(e, MemoryError) else "error")
+    failed = wait_for(queue, queue.submit(mode="fail")["job_id"])
+    assert failed["state"] == "failed"
+    assert failed["error"] == "No documents found" and failed["error_kind"] == "no_documents"
+
+    crashed = wait_for(queue, queue.submit(mode="raise")["job_id"])
+    assert crashed["state"] == "failed"
+    assert crashed["error"] == "out of memory" and crashed["error_kind"] == "oom"
+
+    noop = wait_for(queue, queue.submit(mode="noop")["job_id"])
+    assert noop["state"] == "done" and noop["error"] is None
+
+
+def test_history_keeps_the_newest_finished_jobs():
+    queue = BuildQueue(lambda params, progress: {"success": True}, history=2)
+    ids = []
+    for i in range(4):
+        ids.append(queue.submit(n=i)["job_id"])
+        wait_for(queue, ids[-1])
+    assert [job["job_id"] for job in queue.list()] == [ids[3], ids[2]]
+    assert queue.get(ids[0]) is None
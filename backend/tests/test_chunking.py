@@ -0,0 +1,45 @@
+import random
+
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from embedding.chunking import DEFAULT_SEPARATORS, SpanSplitter
+
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "a", "longerwordwithoutbreaks" * 3]
+SEPARATORS = [" ", " ", " ", ". ", "\n", "\n\n", "  ", "\n \n"]
+
+
+def random_text(seed, n_words):
+    rng = random.Random(seed)
+    return "".join(rng.choice(WORDS) + rng.choice(SEPARATORS) for _ in range(n_words))
+
+
+TEXTS = [
+    "",
+    "   ",
+    "short text",
+    "x" * 2500,
+    "Title\n\n" + "One sentence. " * 200 + "\n\nSecond part\n" + "word " * 300,
+] + [random_text(seed, n) for seed, n in [(0, 50), (1, 400), (2, 1200), (3, 3000)]]
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (300, 50), (120, 0), (50, 49)])
+@pytest.mark.parametrize("text", TEXTS, ids=range(len(TEXTS)))
+def test_spans_match_recursive_character_splitter(text, chunk_size, chunk_overlap):
+    reference = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=DEFAULT_SEPARATORS
+    )
+    spans = SpanSplitter(chunk_size, chunk_overlap).split_spans(text)
+    assert [text[start:end] for start, end in spans] == reference.split_text(text)
+
+
+def test_spans_are_ordered_offsets_into_the_text():
+    text = random_text(4, 800)
+    spans = SpanSplitter(200, 40).split_spans(text)
+    assert all(0 <= start < end <= len(text) for start, end in spans)
+    assert [start for start, _ in spans] == sorted(start for start, _ in spans)
+
+
+def test_overlap_larger_than_chunk_size_is_rejected():
+    with pytest.raises(ValueError):
+        SpanSplitter(chunk_size=100, chunk_overlap=200)
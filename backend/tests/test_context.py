@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from langchain_core.documents import Document
+
+from agent.context import SEPARATOR, estimate_tokens, pack_context
+from conftest import write_doc
+from embedding.snapshots import current_index_dir
+from embedding.store import load_store
+
+# A store whose docstore has no spans: chunks are merged by their text
+NO_SPANS = SimpleNamespace(docstore=object())
+
+HEADER = "University of Example - Student handbook - page header repeated on every page"
+
+
+def doc(text, source="a.txt"):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_overlapping_chunks_of_a_file_become_one_passage():
+    first = "The internship report is due at the end of the semester, "
+    second = "at the end of the semester, and is graded by the tutor."
+    other = "at the end of the semester, the exam period starts."
+    context, stats = pack_context(NO_SPANS, [doc(first), doc(other, source="b.txt"), doc(second)], budget=0)
+    assert context.split(SEPARATOR) == [first + "and is graded by the tutor.", other]
+    assert stats["chunks"] == 3 and stats["passages"] == 2
+    assert stats["context_tokens_after"] < stats["context_tokens_before"]
+
+
+def test_contained_passages_and_repeated_lines_are_dropped():
+    long_text = HEADER + "\nExams take place in June and in September for the resits."
+    docs = [doc(long_text), doc("exams take place in June", source="b.txt"),
+            doc(HEADER + "\nThe library opens at eight.", source="c.txt")]
+    context, stats = pack_context(NO_SPANS, docs, budget=0)
+    assert context == long_text + SEPARATOR + "The library opens at eight."
+    assert stats["dropped_chars"] == len("exams take place in June") + len(HEADER) + 1
+
+
+def test_passages_fill_the_budget_best_ranked_first():
+    docs = [doc(f"Passage {i}. " + "word " * 100, source=f"{i}.txt") for i in range(5)]
+    context, stats = pack_context(NO_SPANS, docs, budget=300)
+    assert stats["truncated"]
+    assert estimate_tokens(context) <= 300
+    assert context.startswith("Passage 0.") and "Passage 1." in context and "Passage 4." not in context
+
+    verbatim, stats = pack_context(NO_SPANS, docs, enabled=False)
+    assert verbatim == SEPARATOR.join(d.page_content for d in docs)
+    assert stats["context_tokens_after"] == stats["context_tokens_before"]
+
+
+def test_neighbouring_chunks_are_read_back_as_one_span(builder, tmp_path):
+    write_doc(tmp_path / "docs" / "f0.txt", 0, n_words=2000)
+    builder.build_index(str(tmp_path / "docs"))
+    store = load_store(current_index_dir(builder.FAISS_INDEX_PATH), builder.init_embeddings(), read_only=True)
+    ids = [store.index_to_docstore_id[i] for i in range(3)]
+    spans = store.docstore.spans(ids)
+    start = min(s[1] for s in spans.values())
+    end = max(s[2] for s in spans.values())
+    document = store.docstore.document(next(iter(spans.values()))[0])
+
+    context, stats = pack_context(store, [store.docstore.search(i) for i in reversed(ids)], budget=0)
+    assert stats["passages"] == 1
+    assert context == document[start:end].strip()
+    assert stats["context_tokens_after"] < stats["context_tokens_before"]
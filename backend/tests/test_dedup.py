@@ -0,0 +1,67 @@
+import os
+import shutil
+
+from conftest import write_doc
+from embedding.dedup import ChunkDeduper, SimHashIndex, max_distance, simhash
+from embedding.shards import iter_stores
+
+
+def _distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def test_simhash_is_close_for_near_duplicates_only():
+    text = " ".join(f"word{i}" for i in range(300))
+    edited = text.replace("word150", "changed", 1)
+    other = " ".join(f"other{i}" for i in range(300))
+    assert simhash(text) == simhash(text)
+    assert _distance(simhash(text), simhash(edited)) <= max_distance(0.9)
+    assert _distance(simhash(text), simhash(other)) > max_distance(0.9)
+
+
+def test_simhash_index_finds_hashes_within_the_distance():
+    index = SimHashIndex(distance=3)
+    index.add("a", 0b1011)
+    assert index.find(0b1011) == "a"
+    assert index.find(0b0100) is None
+    assert index.find(0b1011 ^ (1 << 40) ^ (1 << 2)) == "a"
+    assert index.find(0b1011 ^ 0b1111 << 20) is None
+
+
+def test_deduper_records_the_source_of_dropped_chunks():
+    dedup = ChunkDeduper(threshold=0.9, existing={"old": simhash("an old chunk of text already indexed")})
+    assert dedup.check("an old chunk of text already indexed", "new-1", "b.txt") == "old"
+    assert dedup.check("something else entirely different here", "new-2", "c.txt") is None
+    assert dedup.check("something else entirely different here", "new-3", "d.txt") == "new-2"
+    assert dedup.dropped == 2
+    assert dedup.extra_sources == {"old": {"b.txt"}, "new-2": {"d.txt"}}
+    assert set(dedup.new_signatures) == {"new-2"}
+
+
+def _chunks(builder):
+    store = builder.load_or_create_faiss_index(builder.init_embeddings())[0]
+    chunks = []
+    for part in iter_stores(store):
+        chunks += [part.docstore.search(i) for i in part.index_to_docstore_id.values()]
+    return chunks
+
+
+def test_copied_file_is_not_embedded_twice(builder, tmp_path):
+    docs = tmp_path / "docs"
+    write_doc(docs / "a.txt", 1)
+    first = builder.build_index(str(docs))
+    assert first["chunks_deduplicated"] == 0
+
+    shutil.copy(docs / "a.txt", docs / "copy.txt")
+    second = builder.build_index(str(docs))
+    assert second["chunks_created"] == 0
+    assert second["chunks_deduplicated"] == first["chunks_created"]
+    assert second["vector_count"] == first["vector_count"]
+    assert all(doc.metadata["sources"] == ["a.txt", "copy.txt"] for doc in _chunks(builder))
+
+    # Removing one copy keeps the chunks for the other
+    os.remove(docs / "a.txt")
+    third = builder.build_index(str(docs))
+    assert third["vector_count"] == first["vector_count"]
+    chunks = _chunks(builder)
+    assert all(doc.metadata["source"] == "copy.txt" and "sources" not in doc.metadata for doc in chunks)
@@ -0,0 +1,78 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import embedding.vector_index as vector_index
+from embedding.docstore import SQLiteDocstore
+from embedding.vector_index import add_vectors, delete_vectors, index_codec, index_kind, rebuild_index, search_by_vector
+
+DIM = 32
+N = 600
+
+CONFIGS = [(kind, codec) for kind in vector_index.INDEX_TYPES for codec in vector_index.VECTOR_CODECS]
+
+
+@pytest.fixture(autouse=True)
+def small_thresholds(monkeypatch):
+    # IVF and the codecs are only used above these counts; the tests build small indexes
+    monkeypatch.setattr(vector_index, "FAISS_IVF_MIN_VECTORS", 100)
+    monkeypatch.setattr(vector_index, "FAISS_PQ_MIN_VECTORS", 100)
+    monkeypatch.setattr(vector_index, "FAISS_SQ_MIN_VECTORS", 100)
+    monkeypatch.setattr(vector_index, "FAISS_PQ_M", 8)
+
+
+def make_store(kind, codec, vectors):
+    vector_store = FAISS(
+        embedding_function=DeterministicFakeEmbedding(size=DIM),
+        index=faiss.IndexFlatL2(DIM),
+        docstore=SQLiteDocstore.scratch(),
+        index_to_docstore_id={}
+    )
+    vector_store.raw_index = None
+    add_vectors(vector_store, [f"text {i}" for i in range(len(vectors))], vectors,
+                [{"source": f"file{i % 7}.txt"} for i in range(len(vectors))],
+                [f"id{i}" for i in range(len(vectors))])
+    rebuild_index(vector_store, kind, codec)
+    assert (index_kind(vector_store.index), index_codec(vector_store.index)) == (kind, codec)
+    return vector_store
+
+
+def assert_aligned(vector_store, vectors):
+    positions = vector_store.index_to_docstore_id
+    assert sorted(positions) == list(range(vector_store.index.ntotal))
+    assert set(positions.values()) == set(vector_store.docstore.ids())
+    raw = getattr(vector_store, "raw_index", None)
+    if raw is not None:
+        assert raw.ntotal == vector_store.index.ntotal
+    for id_ in list(positions.values())[::7]:
+        hits = search_by_vector(vector_store, vectors[int(id_[2:])], 1, nprobe=4096, ef_search=256)
+        assert hits[0][0].id == id_
+
+
+@pytest.mark.parametrize("kind,codec", CONFIGS)
+def test_delete_keeps_index_and_docstore_aligned(kind, codec):
+    vectors = np.random.RandomState(0).rand(N, DIM).astype("float32")
+    vector_store = make_store(kind, codec, vectors)
+    index = vector_store.index
+
+    assert delete_vectors(vector_store, [f"id{i}" for i in range(0, N, 5)] + ["missing"]) == N // 5
+    assert vector_store.index.ntotal == N - N // 5
+    assert_aligned(vector_store, vectors)
+
+    # Adding after a delete appends at the new end; a second delete still lines up
+    more = np.random.RandomState(1).rand(20, DIM).astype("float32")
+    add_vectors(vector_store, [f"text {N + i}" for i in range(20)], more, [{"source": "new.txt"}] * 20,
+                [f"id{N + i}" for i in range(20)])
+    assert delete_vectors(vector_store, [f"id{N + 3}", "id1"]) == 2
+    assert_aligned(vector_store, np.vstack([vectors, more]))
+    # Nothing is retrained: the trained index object is kept
+    assert vector_store.index is index
+
+
+def test_delete_of_unknown_ids_changes_nothing():
+    vectors = np.random.RandomState(0).rand(50, DIM).astype("float32")
+    vector_store = make_store("flat", "none", vectors)
+    assert delete_vectors(vector_store, ["missing"]) == 0
+    assert vector_store.index.ntotal == 50
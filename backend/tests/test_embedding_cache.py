@@ -0,0 +1,44 @@
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding.embedding_cache import CachedEmbeddings
+
+VECTOR_BYTES = 16 * 4
+
+
+def table_bytes(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+
+def test_repeated_texts_are_served_from_the_cache(tmp_path):
+    cache = CachedEmbeddings(DeterministicFakeEmbedding(size=16), "fake", str(tmp_path / "cache.sqlite3"))
+    first = cache.embed_documents(["a", "b", "a"])
+    # Stored as float32
+    np.testing.assert_allclose(cache.embed_documents(["b", "a"]), [first[1], first[0]], rtol=1e-6)
+    assert cache.embed_query("a") == cache.embed_documents(["a"])[0]
+    assert (cache.hits, cache.misses) == (5, 2)
+
+    # A new instance on the same file starts warm
+    reopened = CachedEmbeddings(DeterministicFakeEmbedding(size=16), "fake", str(tmp_path / "cache.sqlite3"))
+    np.testing.assert_allclose(reopened.embed_query("b"), first[1], rtol=1e-6)
+    assert reopened.stats()["size_bytes"] == 2 * VECTOR_BYTES
+
+
+def test_replacing_a_row_does_not_grow_the_size(tmp_path):
+    cache = CachedEmbeddings(DeterministicFakeEmbedding(size=16), "fake", str(tmp_path / "cache.sqlite3"))
+    vector = cache.embed_query("a")
+    for _ in range(5):
+        cache._store({cache._key("a"): vector})
+    assert cache.stats()["size_bytes"] == table_bytes(cache) == VECTOR_BYTES
+
+
+def test_least_recently_used_rows_are_evicted_over_the_cap(tmp_path):
+    cache = CachedEmbeddings(DeterministicFakeEmbedding(size=16), "fake", str(tmp_path / "cache.sqlite3"),
+                             max_bytes=10 * VECTOR_BYTES)
+    cache.embed_documents([f"text {i}" for i in range(10)])
+    cache.embed_query("text 0")  # most recently used: survives
+    cache.embed_query("text 10")
+    assert cache.evictions == 2
+    assert cache.stats()["size_bytes"] == table_bytes(cache) == 9 * VECTOR_BYTES
+    assert cache._lookup([cache._key("text 0")])
+    assert not cache._lookup([cache._key("text 1")])
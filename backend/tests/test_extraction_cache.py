@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import embedding.extraction as extraction
+import embedding.extraction_cache as extraction_cache
+from embedding.extraction_cache import extract_cached, extraction_cache_stats
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(extraction_cache, "_stats", {"hits": 0, "misses": 0})
+    monkeypatch.setattr(extraction, "_idle_workers", [])
+
+
+def test_extract_cached_reuses_one_worker(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"document {i}", encoding="utf-8")
+        paths.append(str(path))
+
+    assert extract_cached(paths[0]).strip() == "document 0"
+    assert len(extraction._idle_workers) == 1
+    pid = extraction._idle_workers[0].process.pid
+    assert [extract_cached(p).strip() for p in paths[1:]] == ["document 1", "document 2"]
+    assert [w.process.pid for w in extraction._idle_workers] == [pid]
+    assert extraction_cache_stats()["misses"] == 3
+
+
+def test_hit_counts_are_exact_across_threads(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("shared", encoding="utf-8")
+    extract_cached(str(path))
+
+    def read():
+        for _ in range(50):
+            extract_cached(str(path))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert extraction_cache_stats()["hits"] == 400
+    assert extraction_cache_stats()["misses"] == 1
+
+
+def test_concurrent_requests_for_a_file_convert_it_once(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("shared", encoding="utf-8")
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow_extract(files):
+        for key, file_path in files:
+            calls.append(key)
+            started.set()
+            release.wait(5)
+            yield {"key": key, "file_path": file_path, "content": "converted", "error": None}
+
+    results = {}
+
+    def convert(name):
+        results[name] = list(extraction_cache.iter_extracted_cached([(name, str(path))], extract=slow_extract))
+
+    first = threading.Thread(target=convert, args=("first",))
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=convert, args=("second",))
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()  # waiting for the first conversion
+
+    release.set()
+    first.join()
+    second.join()
+    assert calls == ["first"]
+    assert [r["content"] for r in results["first"] + results["second"]] == ["converted", "converted"]
+    assert extraction_cache_stats()["misses"] == 1
+    assert extraction_cache_stats()["hits"] == 1
+
+
+def test_waiter_converts_the_file_itself_when_the_other_conversion_fails(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("shared", encoding="utf-8")
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def flaky_extract(files):
+        for key, file_path in files:
+            calls.append(key)
+            if key == "first":
+                started.set()
+                release.wait(5)
+                yield {"key": key, "file_path": file_path, "content": None, "error": "converter crashed"}
+            else:
+                yield {"key": key, "file_path": file_path, "content": "converted", "error": None}
+
+    results = {}
+
+    def convert(name):
+        results[name] = list(extraction_cache.iter_extracted_cached([(name, str(path))], extract=flaky_extract))
+
+    first = threading.Thread(target=convert, args=("first",))
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=convert, args=("second",))
+    second.start()
+    second.join(0.2)
+    release.set()
+    first.join()
+    second.join()
+    assert calls == ["first", "second"]
+    assert results["first"][0]["error"] == "converter crashed"
+    assert results["second"][0]["content"] == "converted"
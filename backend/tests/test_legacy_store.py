@@ -0,0 +1,62 @@
+import os
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from embedding.docstore import DOCSTORE_FILE, SQLiteDocstore
+from embedding.store import LEGACY_DOCSTORE_FILE, load_store, save_store
+from embedding.vector_index import delete_vectors, search_by_vector
+
+TEXTS = [f"chunk number {i} about topic {i % 5}" for i in range(40)]
+
+
+def legacy_index(path):
+    """An index as saved before the SQLite docstore: index.faiss + pickled index.pkl."""
+    embeddings = DeterministicFakeEmbedding(size=64)
+    vector_store = FAISS.from_texts(TEXTS, embeddings, metadatas=[{"source": f"f{i % 3}.txt"} for i in range(40)],
+                                    ids=[f"id{i}" for i in range(40)])
+    vector_store.save_local(str(path))
+    return embeddings
+
+
+def top_hits(vector_store, embeddings, text, k=3):
+    hits = search_by_vector(vector_store, embeddings.embed_query(text), k)
+    return [(doc.id, doc.page_content, doc.metadata["source"]) for doc, _ in hits]
+
+
+def test_legacy_index_loads_and_converts_on_save(tmp_path):
+    embeddings = legacy_index(tmp_path)
+    assert os.path.exists(tmp_path / LEGACY_DOCSTORE_FILE)
+
+    vector_store = load_store(str(tmp_path), embeddings)
+    assert isinstance(vector_store.docstore, SQLiteDocstore)
+    expected = top_hits(vector_store, embeddings, TEXTS[7])
+    assert expected[0][0] == "id7"
+
+    save_store(vector_store, str(tmp_path))
+    assert os.path.exists(tmp_path / DOCSTORE_FILE)
+    assert not os.path.exists(tmp_path / LEGACY_DOCSTORE_FILE)
+
+    converted = load_store(str(tmp_path), embeddings, read_only=True)
+    assert len(converted.index_to_docstore_id) == len(TEXTS)
+    assert top_hits(converted, embeddings, TEXTS[7]) == expected
+
+
+def test_legacy_index_read_only(tmp_path):
+    embeddings = legacy_index(tmp_path)
+    vector_store = load_store(str(tmp_path), embeddings, read_only=True)
+    assert top_hits(vector_store, embeddings, TEXTS[12])[0][0] == "id12"
+    # Read-only loads leave the legacy files alone
+    assert os.path.exists(tmp_path / LEGACY_DOCSTORE_FILE)
+
+
+def test_converted_store_supports_deletes(tmp_path):
+    embeddings = legacy_index(tmp_path)
+    vector_store = load_store(str(tmp_path), embeddings)
+    assert delete_vectors(vector_store, ["id0", "id1"]) == 2
+    save_store(vector_store, str(tmp_path))
+
+    reloaded = load_store(str(tmp_path), embeddings)
+    assert reloaded.index.ntotal == len(TEXTS) - 2
+    assert set(reloaded.index_to_docstore_id.values()) == {f"id{i}" for i in range(2, 40)}
+    assert top_hits(reloaded, embeddings, TEXTS[5])[0][0] == "id5"
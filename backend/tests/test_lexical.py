@@ -0,0 +1,70 @@
+import os
+
+from langchain_core.documents import Document
+
+from conftest import write_doc
+from embedding.lexical import (
+    any_terms_query, identifier_query, is_keyword_query, keyword_lookup, lexical_search, reciprocal_rank_fusion
+)
+from embedding.snapshots import current_index_dir
+from embedding.store import load_store
+
+COURSE_TEXT = "The course CS101 meets in room B204. Questions go to cs101-staff@uni.example.org before the exam."
+
+
+def _store(builder):
+    return load_store(current_index_dir(builder.FAISS_INDEX_PATH), builder.init_embeddings(), read_only=True)
+
+
+def test_keyword_queries_are_short_and_contain_an_identifier():
+    assert is_keyword_query("CS101")
+    assert is_keyword_query("room B204")
+    assert not is_keyword_query("when is the exam")
+    assert not is_keyword_query("what do I need to know before taking CS101 this year")
+    assert identifier_query("CS101 in B204") == '"cs101" AND "b204"'
+    assert any_terms_query('exam "dates" exam') == '"exam" OR "dates"'
+
+
+def test_identifiers_are_found_without_embeddings(builder, tmp_path):
+    docs = tmp_path / "docs"
+    for i in range(3):
+        write_doc(docs / f"f{i}.txt", i)
+    (docs / "course.txt").write_text(COURSE_TEXT, encoding="utf-8")
+    builder.build_index(str(docs))
+    store = _store(builder)
+
+    for question in ("CS101", "room B204", "cs101-staff@uni.example.org"):
+        found = keyword_lookup(store, question, 4)
+        assert found and {doc.metadata["source"] for doc in found} == {"course.txt"}
+    assert keyword_lookup(store, "ZZ999", 4) is None
+
+    ranked = lexical_search(store, any_terms_query("meets questions"), 10)
+    assert ranked[0][0].metadata["source"] == "course.txt"
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+
+    # Removed files leave the lexical index as well
+    os.remove(docs / "course.txt")
+    builder.build_index(str(docs))
+    assert keyword_lookup(_store(builder), "CS101", 4) is None
+
+
+def test_rank_fusion_favours_chunks_in_both_rankings():
+    a, b, c, d = (Document(page_content=x, id=x) for x in "abcd")
+    fused = reciprocal_rank_fusion([[a, b, c], [c, d, b]], k=3)
+    assert [doc.id for doc in fused] == ["c", "b", "a"]
+    assert [doc.id for doc in reciprocal_rank_fusion([[a, b], []], k=5)] == ["a", "b"]
+
+
+def test_agent_answers_keyword_questions_from_the_lexical_index(chat_agent, builder, tmp_path):
+    (tmp_path / "docs" / "course.txt").write_text(COURSE_TEXT, encoding="utf-8")
+    builder.build_index(str(tmp_path / "docs"))
+    assert chat_agent.reload_index()
+
+    misses = chat_agent.query_cache.stats()["misses"]
+    prepared = chat_agent.prepare("CS101")
+    assert prepared["retrieval"] == "lexical"
+    assert [doc.metadata["source"] for doc in prepared["docs"]] == ["course.txt"]
+    assert prepared["query_vector"] is None
+    assert chat_agent.query_cache.stats()["misses"] == misses
+
+    assert chat_agent.prepare("when is the exam")["retrieval"] == "semantic"
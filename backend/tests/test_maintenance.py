@@ -0,0 +1,94 @@
+import os
+
+from langchain_core.documents import Document
+
+from conftest import write_doc
+from embedding.docstore import DOCSTORE_FILE, SQLiteDocstore
+from embedding.maintenance import find_backups, verify_store
+from embedding.snapshots import BACKUPS_DIR, current_snapshot, current_index_dir
+from embedding.store import load_store
+
+
+def test_unloadable_snapshot_falls_back_to_the_previous_one(builder, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    for i in range(3):
+        write_doc(docs / f"f{i}.txt", i)
+    builder.build_index(str(docs))
+    write_doc(docs / "f3.txt", 3)
+    builder.build_index(str(docs))
+    broken = current_snapshot(builder.FAISS_INDEX_PATH)
+    with open(os.path.join(current_index_dir(builder.FAISS_INDEX_PATH), "index.faiss"), "wb") as f:
+        f.write(b"not an index")
+
+    result = builder.build_index(str(docs))
+    assert result["success"]
+    # Only f3.txt, missing from the previous snapshot, is embedded again
+    assert result["documents_processed"] == 1
+    assert result["documents_skipped"] == 3
+
+    backups = os.listdir(os.path.join(builder.FAISS_INDEX_PATH, BACKUPS_DIR))
+    assert len(backups) == 1 and backups[0].startswith(broken)
+    # Found wherever the process runs from
+    monkeypatch.chdir(docs)
+    assert [os.path.basename(p) for p in find_backups(builder.FAISS_INDEX_PATH)] == backups
+
+
+def test_unloadable_only_snapshot_starts_a_new_index(builder, tmp_path):
+    docs = tmp_path / "docs"
+    write_doc(docs / "f0.txt", 0)
+    builder.build_index(str(docs))
+    with open(os.path.join(current_index_dir(builder.FAISS_INDEX_PATH), "index.faiss"), "wb") as f:
+        f.write(b"not an index")
+
+    result = builder.build_index(str(docs))
+    assert result["success"] and result["documents_processed"] == 1
+    assert len(os.listdir(os.path.join(builder.FAISS_INDEX_PATH, BACKUPS_DIR))) == 1
+
+
+def _damage_current_snapshot(builder):
+    """Drop one chunk of f0.txt (its vector dangles) and add a chunk without a vector."""
+    docstore = SQLiteDocstore(os.path.join(current_index_dir(builder.FAISS_INDEX_PATH), DOCSTORE_FILE))
+    lost = docstore.ids_for_source("f0.txt")[0]
+    docstore.delete([lost])
+    docstore.add({"orphan": Document(page_content="no vector", metadata={"source": "gone.txt"})})
+    docstore.close()
+    return lost
+
+
+def test_compaction_drops_dangling_vectors_and_orphaned_chunks(builder, tmp_path):
+    docs = tmp_path / "docs"
+    for i in range(3):
+        write_doc(docs / f"f{i}.txt", i)
+    built = builder.build_index(str(docs))
+    _damage_current_snapshot(builder)
+    damaged = load_store(current_index_dir(builder.FAISS_INDEX_PATH), builder.init_embeddings(), read_only=True)
+    assert "docstore chunks and mapped ids differ" in verify_store(damaged)
+
+    result = builder.compact_index()
+    assert result["success"] and result["snapshot"] == current_snapshot(builder.FAISS_INDEX_PATH)
+    assert result["dangling_vectors"] == 1 and result["orphaned_chunks"] == 1
+    assert result["vectors_before"] == built["vector_count"]
+    # f0.txt lost a chunk, so it is released and embedded again by the next build
+    assert result["reindex_files"] == ["f0.txt"]
+    compacted = load_store(current_index_dir(builder.FAISS_INDEX_PATH), builder.init_embeddings(), read_only=True)
+    assert verify_store(compacted) == []
+    assert compacted.index.ntotal == result["vectors_after"]
+    assert not compacted.docstore.ids_for_source("f0.txt")
+
+    rebuilt = builder.build_index(str(docs))
+    assert rebuilt["documents_processed"] == 1
+    assert rebuilt["vector_count"] == built["vector_count"]
+
+
+def test_dry_run_compaction_publishes_nothing(builder, tmp_path):
+    docs = tmp_path / "docs"
+    write_doc(docs / "f0.txt", 0)
+    builder.build_index(str(docs))
+    _damage_current_snapshot(builder)
+    snapshot = current_snapshot(builder.FAISS_INDEX_PATH)
+
+    result = builder.compact_index(dry_run=True)
+    assert result["success"] and result["dry_run"]
+    assert result["snapshot"] is None and result["bytes_after"] is None
+    assert result["dangling_vectors"] == 1
+    assert current_snapshot(builder.FAISS_INDEX_PATH) == snapshot
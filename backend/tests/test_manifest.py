@@ -0,0 +1,44 @@
+from embedding.manifest import (
+    diff_manifest, empty_manifest, forget_file, load_manifest, record_file, referenced_chunk_ids, save_manifest
+)
+
+
+def manifest_with(files):
+    manifest = empty_manifest()
+    for rel_path, (digest, chunk_ids) in files.items():
+        record_file(manifest, rel_path, digest, chunk_ids)
+    return manifest
+
+
+def test_diff_sorts_files_into_new_changed_unchanged_removed():
+    manifest = manifest_with({"a.txt": ("h1", ["a1"]), "b.txt": ("h2", ["b1"]), "c.txt": ("h3", ["c1"])})
+    diff = diff_manifest(manifest, {"a.txt": "h1", "b.txt": "changed", "d.txt": "h4"})
+    assert diff == {"new": ["d.txt"], "changed": ["b.txt"], "unchanged": ["a.txt"], "removed": ["c.txt"]}
+
+
+def test_diff_keeps_missing_files_without_prune():
+    manifest = manifest_with({"a.txt": ("h1", ["a1"]), "c.txt": ("h3", ["c1"])})
+    diff = diff_manifest(manifest, {"a.txt": "h1"}, prune_removed=False)
+    assert diff["removed"] == []
+    assert diff["unchanged"] == ["a.txt"]
+
+
+def test_forget_file_returns_its_chunks_and_keeps_shared_ones_referenced():
+    manifest = manifest_with({"a.txt": ("h1", ["a1", "shared"]), "b.txt": ("h2", ["b1", "shared"])})
+    assert forget_file(manifest, "a.txt") == ["a1", "shared"]
+    assert forget_file(manifest, "a.txt") == []
+    assert referenced_chunk_ids(manifest) == {"b1", "shared"}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    manifest = manifest_with({"dir/a.txt": ("h1", ["a1"])})
+    save_manifest(manifest, str(tmp_path))
+    assert load_manifest(str(tmp_path)) == manifest
+
+
+def test_unreadable_or_old_manifest_loads_empty(tmp_path):
+    assert load_manifest(str(tmp_path)) == empty_manifest()
+    (tmp_path / "manifest.json").write_text("{not json", encoding="utf-8")
+    assert load_manifest(str(tmp_path)) == empty_manifest()
+    (tmp_path / "manifest.json").write_text('{"version": 0, "files": {"a": {}}}', encoding="utf-8")
+    assert load_manifest(str(tmp_path)) == empty_manifest()
@@ -0,0 +1,83 @@
+import time
+
+from agent.memory import MESSAGE_OVERHEAD_BYTES, SESSION_OVERHEAD_BYTES, ConversationMemory
+
+
+def contents(memory, user_id):
+    return [m["content"] for m in memory.history(user_id)]
+
+
+def test_each_user_keeps_only_the_last_turns():
+    memory = ConversationMemory(max_turns=2, spill_path="")
+    for i in range(3):
+        memory.append("u1", f"q{i}", f"a{i}")
+    memory.append(None, "shared", "answer")
+    assert contents(memory, "u1") == ["q1", "a1", "q2", "a2"]
+    assert contents(memory, None) == ["shared", "answer"]
+    assert memory.history("nobody") == []
+    expected = 2 * SESSION_OVERHEAD_BYTES + sum(len(c) + MESSAGE_OVERHEAD_BYTES for c in
+                                                ("q1", "a1", "q2", "a2", "shared", "answer"))
+    assert memory.stats()["bytes"] == expected
+
+
+def test_least_recently_used_sessions_are_evicted():
+    memory = ConversationMemory(max_sessions=2, spill_path="")
+    memory.append("u1", "q", "a")
+    memory.append("u2", "q", "a")
+    memory.history("u1")
+    memory.append("u3", "q", "a")
+    assert memory.history("u2") == []
+    assert contents(memory, "u1") == ["q", "a"]
+    assert memory.stats()["sessions"] == 2 and memory.stats()["evictions"] == 1
+
+    small = ConversationMemory(max_bytes=2 * (SESSION_OVERHEAD_BYTES + 2 * MESSAGE_OVERHEAD_BYTES) + 100,
+                               spill_path="")
+    for user_id in ("u1", "u2", "u3"):
+        small.append(user_id, "q" * 10, "a" * 10)
+    assert small.stats()["sessions"] == 2
+    assert small.history("u1") == []
+
+
+def test_idle_sessions_expire():
+    memory = ConversationMemory(ttl_s=0.05, spill_path="")
+    memory.append("u1", "q", "a")
+    time.sleep(0.1)
+    assert memory.history("u1") == []
+    assert memory.stats()["expirations"] == 1
+
+
+def test_evicted_sessions_are_spilled_and_restored(tmp_path):
+    path = str(tmp_path / "memory.sqlite3")
+    memory = ConversationMemory(max_sessions=1, spill_path=path)
+    memory.append("u1", "q1", "a1")
+    memory.append("u2", "q2", "a2")
+    assert memory.stats()["spilled_sessions"] == 1
+    assert contents(memory, "u1") == ["q1", "a1"]
+    assert memory.stats()["restored"] == 1
+
+    # Sessions survive a restart
+    memory.close()
+    restarted = ConversationMemory(spill_path=path)
+    assert contents(restarted, "u1") == ["q1", "a1"]
+    assert contents(restarted, "u2") == ["q2", "a2"]
+
+    restarted.clear("u1")
+    restarted.close()
+    assert ConversationMemory(spill_path=path).history("u1") == []
+
+
+def test_old_spilled_sessions_are_purged(tmp_path):
+    memory = ConversationMemory(max_sessions=1, spill_path=str(tmp_path / "memory.sqlite3"),
+                                spill_max_sessions=2, spill_purge_s=0)
+    for user_id in ("u1", "u2", "u3", "u4"):
+        memory.append(user_id, "q", "a")
+    stats = memory.stats()
+    assert stats["spilled_sessions"] == 2 and stats["spill_purged"] == 1
+    assert memory.history("u1") == []
+    assert contents(memory, "u3") == ["q", "a"]
+
+    expiring = ConversationMemory(max_sessions=1, spill_path=str(tmp_path / "expiring.sqlite3"), spill_ttl_s=0.05)
+    expiring.append("u1", "q", "a")
+    expiring.append("u2", "q", "a")
+    time.sleep(0.1)
+    assert expiring.history("u1") == []
@@ -0,0 +1,62 @@
+import time
+
+from agent.query_cache import QueryEmbeddingCache, normalize_question
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.queries, self.batches = [], []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text))]
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+def test_spellings_of_a_question_share_one_entry():
+    assert normalize_question("  Exam   DATES?? ") == normalize_question("exam dates") == "exam dates"
+    cache, embeddings = QueryEmbeddingCache(capacity=8), CountingEmbeddings()
+    first = cache.embed_query(embeddings, "Exam dates?")
+    assert cache.embed_query(embeddings, "exam  dates") == first
+    assert embeddings.queries == ["Exam dates?"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(capacity=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0] and cache.get("c") == [3.0]
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_entries_expire_after_the_ttl():
+    cache = QueryEmbeddingCache(capacity=8, ttl_s=0.05)
+    cache.put("a", [1.0])
+    assert cache.get("a") == [1.0]
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["size"] == 0
+
+
+def test_zero_capacity_disables_the_cache():
+    cache, embeddings = QueryEmbeddingCache(capacity=0), CountingEmbeddings()
+    cache.embed_query(embeddings, "a")
+    cache.embed_query(embeddings, "a")
+    assert embeddings.queries == ["a", "a"]
+    assert cache.stats()["size"] == 0
+
+
+def test_uncached_questions_are_embedded_in_one_batch():
+    cache, embeddings = QueryEmbeddingCache(capacity=8), CountingEmbeddings()
+    cache.put("known", [0.0])
+    vectors = cache.embed_queries(embeddings, ["known", "new one", "other", "new one"])
+    assert vectors == [[0.0], [7.0], [5.0], [7.0]]
+    assert embeddings.batches == [["new one", "other"]]
+    assert cache.get("other") == [5.0]
@@ -0,0 +1,39 @@
+import pytest
+
+from embedding.vector_index import FAISS_MAX_EF_SEARCH, FAISS_MAX_NPROBE
+from request_params import optional_bool, optional_positive_int, search_overrides
+
+
+def test_missing_fields_are_none():
+    assert search_overrides({}) == (None, None, None)
+    assert optional_positive_int({"other": 1}, "concurrency") == (None, None)
+
+
+def test_valid_values_pass_through():
+    assert search_overrides({"nprobe": 16, "ef_search": 128}) == (16, 128, None)
+
+
+@pytest.mark.parametrize("value", [0, -1, 1.5, "8", "abc", True, [], {}])
+@pytest.mark.parametrize("name", ["nprobe", "ef_search"])
+def test_non_positive_integers_are_rejected(name, value):
+    *values, error = search_overrides({name: value})
+    assert values == [None, None]
+    assert error == f"{name} must be a positive integer"
+
+
+def test_values_above_the_maximum_are_rejected():
+    assert search_overrides({"nprobe": FAISS_MAX_NPROBE + 1})[2] == f"nprobe must be at most {FAISS_MAX_NPROBE}"
+    assert search_overrides({"ef_search": FAISS_MAX_EF_SEARCH + 1})[2] == \
+        f"ef_search must be at most {FAISS_MAX_EF_SEARCH}"
+    assert optional_positive_int({"concurrency": 9}, "concurrency", maximum=8)[1] == "concurrency must be at most 8"
+
+
+@pytest.mark.parametrize("value", ["false", "true", 0, 1, None])
+def test_booleans_must_be_json_booleans(value):
+    assert optional_bool({"prune_removed": value}, "prune_removed", True) == \
+        (None, "prune_removed must be true or false")
+
+
+def test_missing_boolean_takes_the_default():
+    assert optional_bool({}, "prune_removed", True) == (True, None)
+    assert optional_bool({"prune_removed": False}, "prune_removed", True) == (False, None)
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from embedding.scheduler import (
+    EmbeddingRateLimitError, EmbeddingScheduler, _AdaptiveLimiter, is_rate_limit_error
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {
+            "status_code": status_code,
+            "headers": {"retry-after": retry_after} if retry_after is not None else {}
+        })()
+
+
+class FlakyEmbeddings:
+    """Fails the listed batches (by first text) with the given errors, once each, then embeds."""
+
+    def __init__(self, failures=None):
+        self.failures = {key: list(errors) for key, errors in (failures or {}).items()}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(texts[0])
+            errors = self.failures.get(texts[0])
+            if errors:
+                raise errors.pop(0)
+        return [[float(len(t))] for t in texts]
+
+
+def batches(n):
+    return [{"texts": [f"batch{i}-a", f"batch{i}-bb"], "n": i} for i in range(n)]
+
+
+def test_limiter_halves_on_throttling_and_grows_back():
+    limiter = _AdaptiveLimiter(8)
+    limiter.acquire()
+    limiter.release(throttled_for=0)
+    assert limiter.limit == 4
+    limiter.acquire()
+    limiter.release(throttled_for=0)
+    assert limiter.limit == 2
+    # Additive increase: one step after `limit` successes in a row
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 4
+
+
+def test_only_the_failed_batch_is_retried_and_order_is_kept():
+    embeddings = FlakyEmbeddings({"batch2-a": [HTTPError(429, retry_after="0"), HTTPError(503)]})
+    scheduler = EmbeddingScheduler(embeddings, max_concurrency=3, backoff_base=0)
+    out = list(scheduler.embed_batches(batches(6)))
+
+    assert [b["n"] for b in out] == list(range(6))
+    assert all(b["vectors"] == [[float(len(t))] for t in b["texts"]] for b in out)
+    assert embeddings.calls.count("batch2-a") == 3
+    assert all(embeddings.calls.count(f"batch{i}-a") == 1 for i in range(6) if i != 2)
+    stats = scheduler.stats()
+    assert (stats["retries"], stats["rate_limited"], stats["chunks_embedded"]) == (2, 1, 12)
+
+
+def test_persistent_rate_limit_raises_after_max_retries():
+    embeddings = FlakyEmbeddings({"batch0-a": [HTTPError(429, retry_after="0")] * 3})
+    scheduler = EmbeddingScheduler(embeddings, max_concurrency=1, max_retries=2, backoff_base=0)
+    with pytest.raises(EmbeddingRateLimitError) as info:
+        list(scheduler.embed_batches(batches(1)))
+    assert is_rate_limit_error(info.value)
+
+
+def test_other_errors_are_not_retried():
+    embeddings = FlakyEmbeddings({"batch0-a": [ValueError("bad input")]})
+    scheduler = EmbeddingScheduler(embeddings, max_concurrency=1, backoff_base=0)
+    with pytest.raises(ValueError):
+        list(scheduler.embed_batches(batches(1)))
+    assert embeddings.calls == ["batch0-a"]
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import write_doc
+from embedding.shards import SHARDS_DIR, is_sharded, shard_dir, shard_for
+from embedding.snapshots import current_index_dir
+from embedding.store import load_store
+from embedding.vector_index import exact_vectors, search_by_vector
+
+
+@pytest.fixture
+def sharded(builder, tmp_path, monkeypatch):
+    monkeypatch.setattr(builder, "FAISS_SHARDS", 4)
+    for i in range(8):
+        write_doc(tmp_path / "docs" / f"f{i}.txt", i)
+    result = builder.build_index(str(tmp_path / "docs"))
+    assert result["success"] and result["shards"] == 4
+    return result
+
+
+def _load(builder):
+    return load_store(current_index_dir(builder.FAISS_INDEX_PATH), builder.init_embeddings(), read_only=True)
+
+
+def test_chunks_go_to_the_shard_of_their_file(builder, sharded):
+    store = _load(builder)
+    assert is_sharded(store)
+    assert sum(s.index.ntotal for s in store.shards) == sharded["vector_count"]
+    for i, shard in enumerate(store.shards):
+        for chunk_id in shard.index_to_docstore_id.values():
+            assert shard_for(shard.docstore.search(chunk_id).metadata["source"], 4) == i
+
+
+def test_search_merges_the_nearest_vectors_of_all_shards(builder, sharded):
+    store = _load(builder)
+    query = np.random.default_rng(0).random(16, dtype=np.float32)
+    distances = ((exact_vectors(store) - query) ** 2).sum(axis=1)
+    found = [score for _, score in search_by_vector(store, query, 5)]
+    np.testing.assert_allclose(found, np.sort(distances)[:5], rtol=1e-4)
+
+
+def test_unchanged_shards_are_hard_linked_into_the_next_snapshot(builder, sharded, tmp_path):
+    before = current_index_dir(builder.FAISS_INDEX_PATH)
+    write_doc(tmp_path / "docs" / "new.txt", 100)
+    assert builder.build_index(str(tmp_path / "docs"))["documents_processed"] == 1
+    after = current_index_dir(builder.FAISS_INDEX_PATH)
+    assert after != before
+
+    changed = shard_for("new.txt", 4)
+    for i in range(4):
+        old, new = (os.path.join(shard_dir(d, i), "index.faiss") for d in (before, after))
+        assert os.path.samefile(old, new) == (i != changed)
+
+
+def test_changing_the_shard_count_reshards_the_index(builder, sharded, tmp_path, monkeypatch):
+    monkeypatch.setattr(builder, "FAISS_SHARDS", 1)
+    result = builder.build_index(str(tmp_path / "docs"))
+    assert result["shards"] == 1
+    assert result["vector_count"] == sharded["vector_count"]
+    index_dir = current_index_dir(builder.FAISS_INDEX_PATH)
+    assert not os.path.exists(os.path.join(index_dir, SHARDS_DIR))
+    assert _load(builder).index.ntotal == sharded["vector_count"]
@@ -0,0 +1,94 @@
+import os
+
+from embedding.snapshots import (
+    CURRENT_FILE, RETIRED_FILE, SNAPSHOTS_DIR, current_index_dir, current_snapshot, gc_snapshots,
+    new_snapshot_dir, publish_snapshot, quarantine_current, restore_previous
+)
+
+
+def publish(index_path):
+    name, path = new_snapshot_dir(str(index_path))
+    with open(os.path.join(path, "index.faiss"), "w") as f:
+        f.write(name)
+    publish_snapshot(str(index_path), name)
+    return name
+
+
+def age(index_path, name, seconds):
+    """Pretend snapshot name was retired `seconds` ago."""
+    with open(os.path.join(index_path, SNAPSHOTS_DIR, name, RETIRED_FILE), "w") as f:
+        f.write(str(int(os.path.getmtime(os.path.join(index_path, SNAPSHOTS_DIR, name))) - seconds))
+
+
+def snapshots(index_path):
+    return sorted(os.listdir(os.path.join(index_path, SNAPSHOTS_DIR)))
+
+
+def test_publish_moves_current_and_retires_the_previous(tmp_path):
+    first = publish(tmp_path)
+    second = publish(tmp_path)
+    assert first != second
+    assert current_snapshot(str(tmp_path)) == second
+    assert current_index_dir(str(tmp_path)) == os.path.join(str(tmp_path), SNAPSHOTS_DIR, second)
+    assert os.path.exists(os.path.join(tmp_path, SNAPSHOTS_DIR, first, RETIRED_FILE))
+    assert not os.path.exists(os.path.join(tmp_path, SNAPSHOTS_DIR, second, RETIRED_FILE))
+
+
+def test_gc_keeps_current_and_recently_retired_snapshots(tmp_path):
+    old, recent, current = publish(tmp_path), publish(tmp_path), publish(tmp_path)
+    age(tmp_path, old, 3600)
+    assert gc_snapshots(str(tmp_path), grace_s=600) == [old]
+    assert snapshots(tmp_path) == sorted([recent, current])
+    assert gc_snapshots(str(tmp_path), grace_s=0) == [recent]
+    assert snapshots(tmp_path) == [current]
+
+
+def test_gc_removes_abandoned_unpublished_snapshots_after_the_grace(tmp_path):
+    current = publish(tmp_path)
+    abandoned, path = new_snapshot_dir(str(tmp_path))
+    assert gc_snapshots(str(tmp_path), grace_s=600) == []
+    os.utime(path, (0, 0))
+    assert gc_snapshots(str(tmp_path), grace_s=600) == [abandoned]
+    assert snapshots(tmp_path) == [current]
+
+
+def test_legacy_flat_layout_is_retired_by_the_first_snapshot(tmp_path):
+    for name in ("index.faiss", "index.pkl"):
+        (tmp_path / name).write_text("legacy")
+    assert current_index_dir(str(tmp_path)) == str(tmp_path)
+    publish(tmp_path)
+    assert gc_snapshots(str(tmp_path), grace_s=600) == []
+    assert gc_snapshots(str(tmp_path), grace_s=0) == ["index.faiss", "index.pkl"]
+    assert not (tmp_path / RETIRED_FILE).exists()
+
+
+def test_quarantine_then_restore_the_previous_snapshot(tmp_path):
+    previous = publish(tmp_path)
+    broken = publish(tmp_path)
+    backup = quarantine_current(str(tmp_path))
+    assert os.path.isdir(os.path.join(backup, broken))
+    assert not (tmp_path / CURRENT_FILE).exists()
+
+    assert restore_previous(str(tmp_path)) == previous
+    assert current_snapshot(str(tmp_path)) == previous
+    assert not os.path.exists(os.path.join(tmp_path, SNAPSHOTS_DIR, previous, RETIRED_FILE))
+    # Nothing retired is left to fall back to
+    quarantine_current(str(tmp_path))
+    assert restore_previous(str(tmp_path)) is None
+
+
+def test_agent_switches_to_a_new_build_and_drops_cached_answers(chat_agent, builder, tmp_path):
+    from conftest import write_doc
+
+    old_snapshot = chat_agent.snapshot
+    question = "When is the deadline for the internship report this semester"
+    vector = chat_agent.query_cache.embed_query(chat_agent.vector_store.embeddings, question)
+    chat_agent.answer_cache.store((old_snapshot, None, None), question, vector, "In June.")
+    assert chat_agent.reload_index() is False
+
+    write_doc(tmp_path / "docs" / "new.txt", 9)
+    builder.build_index(str(tmp_path / "docs"))
+    assert chat_agent.reload_index() is True
+    assert chat_agent.snapshot == current_snapshot(builder.FAISS_INDEX_PATH) != old_snapshot
+    assert chat_agent.answer_cache.stats()["entries"] == 0
+    assert chat_agent.vector_store.docstore.ids_for_source("new.txt")